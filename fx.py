@@ -8,34 +8,91 @@ This is a library of helper functions for xagg.
 
 Functions:
         lookupCMIPMetadata
+        readCMIPTable
+        readCMIP5TableFile
+        readCMIP6TableFile
+        listCMIPTables
+        tableChecksum
+        compileCMIPTables
+        checkCMIPTableIndex
+        getCMIPTableIndex
         produceCMIP5Activity
         ensure_dir
         createGridLabel
+        gridLabelLookup
+        parseCacheInfo
         parsePath
         scantree
-        toSQLtime
-        sqltimeToDatetime
-        findDiskPaths
-        getDBPaths
-        getInvalidDBPaths
-        getRetiredDBPaths
+        storedSubdirectories
+        createManifest
+        DBSession
+        getSession
+        closeSessions
+        checkFullCrawl
+        crawlWorker
+        PathRow
+        queryPaths
+        PathStore
+        loadPathStore
         initializeDB
+        createReadableViews
+        migrationEpochTimes
+        migrationQueryIndexes
+        migrationUniquePaths
+        migrationScanDurations
+        migrationManifestHashes
+        migrationManifestIndex
+        migrationErrorCategories
+        migrationScanRetries
+        migrationErrorCategoryDefaults
+        migrationPrevXmlFiles
+        migrateDB
+        initializeDirectoryTable
         parallelFindData
-        createLookupDictionary
-        getCMIPMeta
         createFilename
+        loadCdscan
+        cdscanArgs
         xmlWrite
+        cdscanProcess
+        parseFilemap
+        formatFilemap
+        getAxisValues
+        elementSignature
+        mergeXml
+        appendFiles
+        appendMerge
+        appendXml
+        copyXml
+        reuseXml
+        ErrorClassifier
+        loadErrorCategories
         errorLogic
         getWarnings
-        parseWarnings
         sqlUpdate
         sqlInsert
+        sqlMerge
         process_path
         updateDatabaseHoldings
+        scanListQuery
+        countScanList
         getScanList
+        getDuplicatePaths
+        fitScanCostModel
+        scanCost
+        orderScanList
         writeStats
-        scanChunk
+        processMemory
+        availableMemory
+        childMemory
+        MemoryGovernor
+        scanWorker
+        ScanPool
+        ScanSupervisor
         writeScanResults
+        resultWriter
+        streamScans
+        printScanProgress
+        removePrevXmlFiles
         resetXmlsByQuery
         removeDatabasePathsByQuery
         runLock
@@ -49,35 +106,80 @@ import numpy as np
 import re
 import json
 import datetime
-from joblib import Parallel, delayed
 import multiprocessing
-import pickle
+import multiprocessing.connection
 import re
 import os
-from subprocess import Popen,PIPE
+from subprocess import Popen,PIPE,TimeoutExpired
 import datetime
 import time
 import glob
-
-
+import tempfile
+import shutil
+import contextlib
+import functools
+import hashlib
+import traceback
+import warnings
+import sys
+import threading
+import queue
+import asyncio
+import collections
+import itertools
+import signal
+import xml.etree.ElementTree as ElementTree
+
+# xagg table definitions (timestamps are integer epoch seconds); columns added
+# after schema version 1 are created by their migration (see migrateDB)
+tableDefinitions = {'paths' : '(path varchar(255), keyid varchar(255), mip_era varchar(255), activity varchar(255), institute varchar(255), model varchar(255), experiment varchar(255), member varchar(255), cmipTable varchar(255), realm varchar(255), frequency varchar(255), variable varchar(255), grid varchar(255), gridLabel varchar(255), version varchar(255), created INTEGER, modified INTEGER, accessed INTEGER, xmlFile varchar(255), xmlwritedatetime INTEGER, error varchar(255), retired BOOLEAN, retire_datetime INTEGER, ignored BOOLEAN, ignored_datetime INTEGER)',
+                    'invalid_paths' : '(path varchar(255), datetime INTEGER)',
+                    'stats' : '(indicator varchar(255), value int, datetime INTEGER)',
+                    'runs' : '(datetime INTEGER, total INT, new INT, invalid INT, modified INT, missing INT, returned INT, deleted INT)',
+                    'directories' : '(path varchar(255), ctime REAL, mtime REAL, atime REAL, hasFiles BOOLEAN, nFiles INTEGER, nBytes INTEGER, manifest TEXT, manifestHash TEXT)',
+                    'errorCategories' : '(code INTEGER PRIMARY KEY, category varchar(255) UNIQUE, kind varchar(255), pattern TEXT, position INTEGER, transient BOOLEAN)'}
+epochColumns = {'paths' : ['created', 'modified', 'accessed', 'xmlwritedatetime', 'retire_datetime', 'ignored_datetime', 'nextScan'],
+                'invalid_paths' : ['datetime'],
+                'stats' : ['datetime'],
+                'runs' : ['datetime']}
+
+# precompiled regular expressions used to parse paths
+reBad = re.compile(r'bad[0-9]{1}')
+reDecadal = re.compile(r'decadal[0-9]{4}')
+reP = re.compile(r'p[0-9]')
+rePl = re.compile(r'pl[0-9]')
+rePlev = re.compile(r'plev[0-9]')
+
+# CMIP5 experiment -> activity lookup (see produceCMIP5Activity)
+cmip5ActivityTable = {'sst2030' : 'CFMIP', 'sstClim' : 'RFMIP', 'sstClim4xCO2' : 'RFMIP',
+                      'sstClimAerosol' : 'RFMIP', 'sstClimSulfate' : 'RFMIP',
+                      'amip4xCO2' : 'CFMIP', 'amipFuture' : 'CFMIP', 'aquaControl' : 'CFMIP',
+                      'aqua4xCO2' : 'CFMIP', 'aqua4K' : 'CFMIP', 'amip4K' : 'CFMIP',
+                      'piControl' : 'CMIP', 'historical' : 'CMIP', 'esmControl' : 'CMIP',
+                      'esmHistorical' : 'CMIP', '1pctCO2' : 'CMIP', 'abrupt4xCO2' : 'CMIP',
+                      'amip' : 'CMIP', 'historicalExt' : 'CMIP', 'esmrcp85' : 'C4MIP',
+                      'esmFixClim1' : 'C4MIP', 'esmFixClim2' : 'C4MIP', 'esmFdbk1' : 'C4MIP',
+                      'esmFdbk2' : 'C4MIP', 'historicalNat' : 'DAMIP', 'historicalGHG' : 'DAMIP',
+                      'historicalMisc' : 'DAMIP', 'midHolocene' : 'PMIP', 'lgm' : 'PMIP',
+                      'past1000' : 'PMIP', 'rcp45' : 'ScenarioMIP', 'rcp85' : 'ScenarioMIP',
+                      'rcp26' : 'ScenarioMIP', 'rcp60' : 'ScenarioMIP'}
 
 def lookupCMIPMetadata(mip_era, cmipTable, variable, dictObj={}):
     """
     frequency, realm, dimensions = lookupCMIPMetadata(mip_era, cmipTable, variable, dictObj={})
 
     This function helps gather CMIP5/6 metadata needed to create the grid label.
-    It will use a pickle dictionary if provided, otherwise it gets the information
-    from the CMIP tables. Using the pickle file is much faster.
+    It will use a dictionary of metadata if provided, otherwise it gets the
+    information from the compiled index of the CMIP tables (see readCMIPTable).
 
-    To create the pickle file, use: createLookupDictionary
-
-    To download the CMIP tables, use: ../tools/updateTables.sh
+    To download the CMIP tables (and compile the index), use: ../tools/updateTables.sh
 
     Inputs:
             mip_era: 'CMIP5' | 'CMIP6'
             cmipTable: e.g. 'Amon'
             variable: e.g. 'ta'
-            dictObj: pickle file (dictionary) that returns appropriate outputs for given inputs.
+            dictObj: dictionary ('mip_era.cmipTable.variable' -> [frequency, realm, dimensions])
+                     that is checked before the CMIP table index (optional)
 
     Returns (strings):
             frequency, realm, dimensions
@@ -86,43 +188,254 @@ def lookupCMIPMetadata(mip_era, cmipTable, variable, dictObj={}):
     if key in dictObj:
         frequency, realm, dimensions = dictObj[key]
         return frequency, realm, dimensions
-    # https://github.com/PCMDI/cmip6-cmor-tables
-    frequency = []
-    realm = []
-    dimensions = []
-    if mip_era == 'CMIP6':
-        fn = 'data/cmip6/CMIP6_' + cmipTable + '.json'
-        with open(fn) as f:
-            data = json.load(f)
-        frequency = data['variable_entry'][variable]['frequency']
-        realm = data['variable_entry'][variable]['modeling_realm'].split(' ')[0]
-        dimensions = data['variable_entry'][variable]['dimensions'].split(' ')
-    elif mip_era == 'CMIP5':
-        fn = 'data/cmip5/CMIP5_' + cmipTable
-        f = open(fn, "r")
+    frequency, realm, dimensions = readCMIPTable(mip_era, cmipTable, variable)
+    return frequency, realm, list(dimensions)
+
+@functools.lru_cache(maxsize=None)
+def readCMIPTable(mip_era, cmipTable, variable):
+    """
+    frequency, realm, dimensions = readCMIPTable(mip_era, cmipTable, variable)
+
+    Function looks up the frequency, realm, and dimensions for a variable in
+    the compiled CMIP table index (see getCMIPTableIndex). Results are cached.
+    A KeyError is raised if the variable is not in the CMIP tables (for CMIP5,
+    the table frequency is returned if the table exists, but not the variable).
+
+    Inputs:
+            mip_era: 'CMIP5' | 'CMIP6'
+            cmipTable: e.g. 'Amon'
+            variable: e.g. 'ta'
+
+    Returns:
+            frequency, realm, dimensions (tuple)
+    """
+    conn = getCMIPTableIndex()
+    q = 'SELECT frequency, realm, dimensions FROM entries WHERE mip_era = ? AND cmipTable = ? AND variable = ?;'
+    row = conn.execute(q, (mip_era, cmipTable, variable)).fetchone()
+    if (row is None) and (mip_era == 'CMIP5'):
+        # table exists, but the variable does not
+        row = conn.execute(q, (mip_era, cmipTable, '')).fetchone()
+        if row is not None:
+            return row[0], [], ()
+    if row is None:
+        raise KeyError(mip_era + '.' + cmipTable + '.' + variable)
+    frequency, realm, dimensions = row
+    return frequency, realm, tuple(dimensions.split(' '))
+
+def readCMIP5TableFile(fn):
+    """
+    entries = readCMIP5TableFile(fn)
+
+    Function parses a CMIP5 table (text) file and returns a list of table
+    entries in the form [variable, frequency, realm, dimensions]. The first
+    entry (variable '') holds the table frequency.
+
+    """
+    with open(fn, 'r') as f:
         lines = f.readlines()
-        f.close()
-        inVar = False
-        for line in lines:
-            if line.find('frequency:') >= 0:
-                frequency = line.split(' ')[1].split('\n')[0]
-            if line.find('variable_entry:') >= 0:
-                if line.find(variable + '\n') >= 0:
-                    inVar = True
-            if ((line.find('modeling_realm:') >= 0) & (inVar)):
-                realm = line.split(' ')[-1].split('\n')[0]
-            if ((line.find('dimensions:') >= 0) & (inVar)):
-                dimensions = line.split('  ')[-1].split('\n')[0].split(' ')
-                break
+    frequency = []
+    entries = []
+    variable = None
+    realm = None
+    for line in lines:
+        if line.find('frequency:') >= 0:
+            frequency = line.split(' ')[1].split('\n')[0]
+        if line.find('variable_entry:') >= 0:
+            variable = line.split()[-1]
+            realm = None
+        if (variable is not None) and (realm is None) and (line.find('modeling_realm:') >= 0):
+            realm = line.split(' ')[-1].split('\n')[0]
+        if (variable is not None) and (line.find('dimensions:') >= 0):
+            dimensions = line.split('  ')[-1].split('\n')[0]
+            entries.append([variable, frequency, realm, dimensions])
+            variable = None
+    if frequency != []:
+        entries.insert(0, ['', frequency, None, ''])
+    return entries
+
+def readCMIP6TableFile(fn):
+    """
+    entries = readCMIP6TableFile(fn)
+
+    Function parses a CMIP6 table (json) file and returns a list of table
+    entries in the form [variable, frequency, realm, dimensions]. Files
+    without variable entries (e.g., CMIP6_CV.json) return an empty list.
+
+    """
+    with open(fn) as f:
+        data = json.load(f)
+    entries = []
+    if 'variable_entry' not in data:
+        return entries
+    for variable, entry in data['variable_entry'].items():
+        try:
+            entries.append([variable, entry['frequency'], entry['modeling_realm'].split(' ')[0], entry['dimensions']])
+        except KeyError:
+            continue
+    return entries
+
+def listCMIPTables(tableDir='data'):
+    """
+    tables = listCMIPTables(tableDir='data')
+
+    Function returns the CMIP table files in tableDir (downloaded with
+    ../tools/updateTables.sh) in a dictionary: filename -> (mip_era, cmipTable).
+
+    """
+    tables = {}
+    # https://github.com/PCMDI/cmip6-cmor-tables
+    for fn in glob.glob(tableDir + '/cmip6/CMIP6_*.json'):
+        tables[fn] = ('CMIP6', fn.split('/')[-1].split('CMIP6_')[1].split('.json')[0])
+    # https://github.com/PCMDI/cmip5-cmor-tables
+    for fn in glob.glob(tableDir + '/cmip5/CMIP5_*'):
+        tables[fn] = ('CMIP5', fn.split('/')[-1].split('CMIP5_')[1])
+    return tables
+
+def tableChecksum(fn):
+    """
+    checksum = tableChecksum(fn)
+
+    Function returns the md5 checksum of a file.
+
+    """
+    with open(fn, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+# version of the CMIP table index format (a different version forces a full rebuild)
+cmipTableIndexVersion = 1
+
+def compileCMIPTables(tableDir='data', outfile='data/cmipTables.db'):
+    """
+    nUpdated = compileCMIPTables(tableDir='data', outfile='data/cmipTables.db')
+
+    Function compiles the CMIP5 and CMIP6 tables (see listCMIPTables) into a
+    single sqlite index with the frequency, realm, and dimensions of each
+    (mip_era, cmipTable, variable). The index stores the checksum of each
+    table file and is updated incrementally: only table files that have
+    changed (based on their checksum) are parsed again, entries from new
+    tables are added, and entries from tables that have been removed are
+    deleted. The index is updated in a temporary file and then moved into
+    place, so processes that are reading the old index are unaffected.
+
+    Inputs:
+            tableDir (string): directory containing the cmip5/ and cmip6/ table directories (default 'data')
+            outfile (string): filename of the index (default 'data/cmipTables.db')
+
+    Returns:
+            nUpdated (int): number of table files that were (re)parsed or removed
+
+    """
+    tables = listCMIPTables(tableDir)
+    ensure_dir(outfile)
+    tmpFile = outfile + '.' + str(os.getpid())
+    if os.path.exists(outfile):
+        shutil.copy(outfile, tmpFile)
+    elif os.path.exists(tmpFile):
+        os.remove(tmpFile)
+    conn = sqlite3.connect(tmpFile)
+    c = conn.cursor()
+    # start over if the index was written in a different format
+    c.execute('PRAGMA user_version;')
+    if c.fetchone()[0] != cmipTableIndexVersion:
+        c.execute('DROP TABLE IF EXISTS entries;')
+        c.execute('DROP TABLE IF EXISTS sources;')
+        c.execute('CREATE TABLE entries (mip_era TEXT, cmipTable TEXT, variable TEXT, frequency TEXT, realm TEXT, dimensions TEXT, source TEXT, PRIMARY KEY (mip_era, cmipTable, variable)) WITHOUT ROWID;')
+        c.execute('CREATE INDEX sourceIndex ON entries (source);')
+        c.execute('CREATE TABLE sources (source TEXT PRIMARY KEY, mtime REAL, checksum TEXT);')
+        c.execute('PRAGMA user_version = ' + str(cmipTableIndexVersion) + ';')
+    c.execute('SELECT source, mtime, checksum FROM sources;')
+    sources = {row[0] : row[1:] for row in c.fetchall()}
+    nUpdated = 0
+    for fn, (mip_era, cmipTable) in tables.items():
+        mtime = os.stat(fn).st_mtime
+        if (fn in sources) and (sources[fn][0] == mtime):
+            continue
+        checksum = tableChecksum(fn)
+        if (fn in sources) and (sources[fn][1] == checksum):
+            c.execute('UPDATE sources SET mtime = ? WHERE source = ?;', (mtime, fn))
+            continue
+        if mip_era == 'CMIP6':
+            entries = readCMIP6TableFile(fn)
+        else:
+            entries = readCMIP5TableFile(fn)
+        c.execute('DELETE FROM entries WHERE source = ?;', (fn,))
+        c.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?);', [[mip_era, cmipTable] + entry + [fn] for entry in entries])
+        c.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?);', (fn, mtime, checksum))
+        nUpdated += 1
+    # remove tables that no longer exist
+    for fn in sources:
+        if fn not in tables:
+            c.execute('DELETE FROM entries WHERE source = ?;', (fn,))
+            c.execute('DELETE FROM sources WHERE source = ?;', (fn,))
+            nUpdated += 1
+    conn.commit()
+    conn.close()
+    os.replace(tmpFile, outfile)
+    return nUpdated
+
+def checkCMIPTableIndex(tableDir='data', indexFile='data/cmipTables.db'):
+    """
+    current = checkCMIPTableIndex(tableDir='data', indexFile='data/cmipTables.db')
+
+    Function returns True if the CMIP table index exists and each table file
+    has the same modification time as when it was compiled (i.e., no table
+    files have been added, removed, or modified).
+
+    """
+    if not os.path.exists(indexFile):
+        return False
+    conn = sqlite3.connect('file:' + indexFile + '?mode=ro', uri=True)
+    try:
+        if conn.execute('PRAGMA user_version;').fetchone()[0] != cmipTableIndexVersion:
+            return False
+        sources = dict(conn.execute('SELECT source, mtime FROM sources;').fetchall())
+    finally:
+        conn.close()
+    tables = listCMIPTables(tableDir)
+    if set(tables.keys()) != set(sources.keys()):
+        return False
+    for fn in tables:
+        if os.stat(fn).st_mtime != sources[fn]:
+            return False
+    return True
+
+# open CMIP table indexes ((process id, index file) -> read-only connection)
+cmipTableIndexes = {}
+
+def getCMIPTableIndex(tableDir='data', indexFile='data/cmipTables.db'):
+    """
+    conn = getCMIPTableIndex(tableDir='data', indexFile='data/cmipTables.db')
 
-    return frequency, realm, dimensions
+    Function returns a read-only connection to the compiled CMIP table index
+    (see compileCMIPTables). The index is opened the first time it is needed
+    in each process and is memory mapped, so all processes (e.g., scan
+    workers) share the same pages. The index is updated first if the CMIP
+    tables have changed since it was compiled (see checkCMIPTableIndex).
 
+    Inputs:
+            tableDir (string): directory containing the cmip5/ and cmip6/ table directories (default 'data')
+            indexFile (string): filename of the index (default 'data/cmipTables.db')
+
+    Returns:
+            conn (sqlite3 connection)
+
+    """
+    key = (os.getpid(), indexFile)
+    if key not in cmipTableIndexes:
+        if not checkCMIPTableIndex(tableDir, indexFile):
+            compileCMIPTables(tableDir, indexFile)
+        conn = sqlite3.connect('file:' + indexFile + '?mode=ro&immutable=1', uri=True, check_same_thread=False)
+        conn.execute('PRAGMA mmap_size = 268435456;')
+        cmipTableIndexes[key] = conn
+    return cmipTableIndexes[key]
+
+@functools.lru_cache(maxsize=None)
 def produceCMIP5Activity(experiment):
     """
     activity = produceCMIP5Activity(experiment)
 
     This function returns the appropriate activity for a given experiment. This
-    is essentially a hardcoded dictionary.
+    is essentially a hardcoded dictionary (cmip5ActivityTable). Results are cached.
 
     Inputs:
             experiment (string): e.g. 'historical'
@@ -130,24 +443,10 @@ def produceCMIP5Activity(experiment):
     Returns:
             activity (string)
     """
-    activityTable = {'sst2030' : 'CFMIP', 'sstClim' : 'RFMIP', 'sstClim4xCO2' : 'RFMIP',
-                    'sstClimAerosol' : 'RFMIP', 'sstClimSulfate' : 'RFMIP',
-                    'amip4xCO2' : 'CFMIP', 'amipFuture' : 'CFMIP', 'aquaControl' : 'CFMIP',
-                    'aqua4xCO2' : 'CFMIP', 'aqua4K' : 'CFMIP', 'amip4K' : 'CFMIP',
-                    'piControl' : 'CMIP', 'historical' : 'CMIP', 'esmControl' : 'CMIP',
-                    'esmHistorical' : 'CMIP', '1pctCO2' : 'CMIP', 'abrupt4xCO2' : 'CMIP',
-                    'amip' : 'CMIP', 'historicalExt' : 'CMIP', 'esmrcp85' : 'C4MIP',
-                    'esmFixClim1' : 'C4MIP', 'esmFixClim2' : 'C4MIP', 'esmFdbk1' : 'C4MIP',
-                    'esmFdbk2' : 'C4MIP', 'historicalNat' : 'DAMIP', 'historicalGHG' : 'DAMIP',
-                    'historicalMisc' : 'DAMIP', 'midHolocene' : 'PMIP', 'lgm' : 'PMIP',
-                    'past1000' : 'PMIP', 'rcp45' : 'ScenarioMIP', 'rcp85' : 'ScenarioMIP',
-                    'rcp26' : 'ScenarioMIP', 'rcp60' : 'ScenarioMIP'}
-
-    reDec = re.compile(r'decadal[0-9]{4}')
-    if not not re.search(reDec, experiment):
+    if reDecadal.search(experiment) is not None:
         activity = 'DCPP'
-    elif experiment in activityTable.keys():
-        activity = activityTable[experiment]
+    elif experiment in cmip5ActivityTable:
+        activity = cmip5ActivityTable[experiment]
     else:
         activity = 'CMIP5'
 
@@ -185,6 +484,19 @@ def createGridLabel(mip_era, realm, cmipTable, grid, dimensions):
 
     Based on: https://docs.google.com/document/d/1bUwK6G_fVZO53UjLZbQUOuBP47PsT8lqKKhL1pjRnKg/edit
 
+    Grid labels are cached (see gridLabelLookup).
+
+    """
+    return gridLabelLookup(mip_era, realm, cmipTable, grid, tuple(dimensions))
+
+@functools.lru_cache(maxsize=None)
+def gridLabelLookup(mip_era, realm, cmipTable, grid, dimensions):
+    """
+
+    gridLabel = gridLabelLookup(mip_era, realm, cmipTable, grid, dimensions)
+
+    Cached implementation of createGridLabel (dimensions must be a tuple).
+
     """
     # get realm id
     realmIdLookup = {'aerosol' : 'ae', 'atmos' : 'ap', 'atmosChem' : 'ac',
@@ -195,12 +507,9 @@ def createGridLabel(mip_era, realm, cmipTable, grid, dimensions):
     # vert-id lookup information
     z1List = set(['height2m', 'height10m', 'depth0m', 'depth100m', 'olayer100m', 'sdepth1', 'sdepth10', 'height100m', 'depth300m', 'depth700m', 'depth2000m'])
     lList = set(['olevel', 'olevhalf', 'alevel', 'alevhalf'])
-    reP = re.compile(r'p[0-9]')
-    pCheck = [not not re.search(reP,i) for i in dimensions]
-    rePl = re.compile(r'pl[0-9]')
-    plCheck = [not not re.search(rePl,i) for i in dimensions]
-    rePlev = re.compile(r'plev[0-9]')
-    plevCheck = [not not re.search(rePlev,i) for i in dimensions]
+    pCheck = [reP.search(i) is not None for i in dimensions]
+    plCheck = [rePl.search(i) is not None for i in dimensions]
+    plevCheck = [rePlev.search(i) is not None for i in dimensions]
 
     # get vert id
     if  len(dimensions) == 0:
@@ -263,6 +572,22 @@ def createGridLabel(mip_era, realm, cmipTable, grid, dimensions):
 
     return gridLabel
 
+def parseCacheInfo():
+    """
+    info = parseCacheInfo()
+
+    Function returns the hit / miss statistics for the caches used to parse
+    paths (readCMIPTable, produceCMIP5Activity, and gridLabelLookup) in the
+    current process.
+
+    Returns:
+            info (dictionary): function name -> (hits, misses, cache size)
+    """
+    info = {}
+    for f in [readCMIPTable, produceCMIP5Activity, gridLabelLookup]:
+        ci = f.cache_info()
+        info[f.__name__] = (ci.hits, ci.misses, ci.currsize)
+    return info
 
 def parsePath(path, dictObj={}):
     """
@@ -271,14 +596,13 @@ def parsePath(path, dictObj={}):
     model, experiment, member, cmipTable, realm, \
     frequency, variable, grid, gridLabel, version = parsePath(path, dictObj={})
 
-    This function parses a directory path for CMIP metadata. A pickle file
-    can optionally be provided to lookup missing CMIP metadata. If this is not
-    provided it will search the CMIP table information for the necesary information,
-    which is much slower (see lookupCMIPMetadata).
+    This function parses a directory path for CMIP metadata. Metadata that
+    is not in the path (frequency, realm, and dimensions) is looked up in the
+    CMIP table index, unless it is provided in dictObj (see lookupCMIPMetadata).
 
     Inputs:
             path (string)
-            dictObj (string of filename)
+            dictObj (optional dictionary, see lookupCMIPMetadata)
 
     Returns:
             validPath, keyId, mip_era, activity, institute, model, experiment, ...
@@ -296,8 +620,7 @@ def parsePath(path, dictObj={}):
         meta.pop(-2)
     # check for 'bad' directories
     e = path.split('/')[-2]
-    bad = re.compile('bad[0-9]{1}')
-    check = re.match(bad, e)
+    check = reBad.match(e)
     checkBad = True
     if check != None:
         checkBad = False
@@ -380,334 +703,1740 @@ def parsePath(path, dictObj={}):
     return validPath, keyId, mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version
 
 
-def scantree(path):
+def scantree(path, conn=None, rmDir=set(), shareWork=None, manifest=False):
     """
-    scantree(path)
-
-    This is an iterator method that recursively scans for directories that meet the
-    following criteria:
-        1. The directory has no sub-directories
-        2. The directory contains files
+    scantree(path, conn=None, rmDir=set(), shareWork=None, manifest=False)
+
+    This is an iterator method that recursively walks a directory tree and
+    yields a record for every directory it finds:
+
+        (dirpath, ctime, mtime, atime, hasFiles, nFiles, nBytes, manifest, manifestHash, reused)
+
+    where hasFiles denotes that the directory contains files (these are the
+    paths that xagg tracks) and nFiles and nBytes are the number and total
+    size of the netCDF files in the directory (used to estimate scan costs,
+    see scanCost). Symbolic links to directories are not followed.
+
+    If manifest is True, the manifest of each directory with files lists the
+    [filename, size, mtime] of its netCDF files (see createManifest) and is
+    used to detect changes to the files (see updateDatabaseHoldings).
+    Otherwise the manifest and manifestHash are None.
+
+    If a (read-only) connection to the xagg database is provided, the walk is
+    incremental: a directory whose mtime matches the mtime stored in the
+    directories table is not read. Its stored record is yielded instead (with
+    reused = True) and its subdirectories are taken from the directories
+    table (see storedSubdirectories). A directory mtime only changes when its
+    immediate entries change, so each subdirectory is still checked (and
+    read if its own mtime has changed). Files that are modified in place do
+    not change the directory mtime and are only found by a full crawl (see
+    checkFullCrawl).
+
+    Directories in rmDir (and their subdirectories) are skipped. If a
+    shareWork function is provided, it is called with the stack of unexplored
+    directories before each directory is processed so that part of the stack
+    can be handed off to other workers (see crawlWorker).
 
     It is based on:
         https://stackoverflow.com/questions/33135038/how-do-i-use-os-scandir-to-return-direntry-objects-recursively-on-a-directory
 
     """
+    if not path.endswith('/'):
+        path = path + '/'
+    stack = [path]
+    while stack:
+        if shareWork is not None:
+            shareWork(stack)
+        dpath = stack.pop()
+        if dpath in rmDir:
+            continue
+        try:
+            ts = scandir.stat(dpath)
+        except OSError:
+            continue
+        if conn is not None:
+            q = 'select ctime, mtime, atime, hasFiles, nFiles, nBytes, manifest, manifestHash from directories where path = ?;'
+            r = conn.execute(q, (dpath,)).fetchone()
+            if (r is not None) and (r[1] == ts.st_mtime):
+                # entries are unchanged (but subdirectories may have changed)
+                stack.extend(storedSubdirectories(conn, dpath))
+                yield dpath, r[0], r[1], r[2], bool(r[3]), r[4], r[5], r[6], r[7], True
+                continue
+        hasFiles = False
+        nFiles = 0
+        nBytes = 0
+        files = []
+        try:
+            for entry in scandir.scandir(dpath):
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        stack.append(dpath + entry.name + '/')
+                else:
+                    hasFiles = True
+                    if entry.name.endswith('.nc'):
+                        try:
+                            fs = entry.stat()
+                        except OSError:
+                            continue
+                        nFiles += 1
+                        nBytes += fs.st_size
+                        files.append([entry.name, fs.st_size, int(fs.st_mtime)])
+        except OSError:
+            continue
+        dirManifest, manifestHash = None, None
+        if manifest and hasFiles:
+            dirManifest, manifestHash = createManifest(files)
+        yield dpath, ts.st_ctime, ts.st_mtime, ts.st_atime, hasFiles, nFiles, nBytes, dirManifest, manifestHash, False
 
-    for entry in scandir.walk(path):
-        # yield directory if there are any files in it
-        if (entry[2] != []):
-            yield entry[0] + '/'
+def storedSubdirectories(conn, dpath):
+    """
+    subdirectories = storedSubdirectories(conn, dpath)
 
-def toSQLtime(time):
-    '''
-    sqlTime = toSQLtime(time)
+    Function returns the immediate subdirectories of dpath that are stored in
+    the directories table (from the last crawl). The directories table is
+    ordered by path, so each subdirectory is found with one index lookup and
+    the rest of its subtree is skipped (note '0' follows '/').
 
-    Function takes a datetime object and returns a SQL-like datestring
-    '''
-    time = "{:02d}".format(time.year) + '-' + "{:02d}".format(time.month) + '-' + "{:02d}".format(time.day) + ' ' + "{:02d}".format(time.hour) + ':' + "{:02d}".format(time.minute) + ':' + "{:02d}".format(time.second)
+    Inputs:
+        conn (sqlite3 connection): connection to the xagg database
+        dpath (string): directory (ending in '/')
+
+    Returns:
+        subdirectories (list): list of directories (ending in '/')
+
+    """
+    q = 'select path from directories where path > ? and path < ? order by path limit 1;'
+    end = dpath[:-1] + '0'
+    subdirectories = []
+    lower = dpath
+    while True:
+        row = conn.execute(q, (lower, end)).fetchone()
+        if row is None:
+            break
+        subdirectory = dpath + row[0][len(dpath):].split('/')[0] + '/'
+        subdirectories.append(subdirectory)
+        lower = subdirectory[:-1] + '0'
+    return subdirectories
+
+def createManifest(files):
+    """
+    manifest, manifestHash = createManifest(files)
+
+    Function returns the manifest of a directory (a compact json list of
+    [filename, size, mtime] sorted by filename) and its md5 checksum, which
+    is used to determine whether the files in a directory have changed.
+
+    Inputs:
+        files (list): list of [filename, size, mtime]
+
+    Returns:
+        manifest (string)
+        manifestHash (string)
+
+    """
+    manifest = json.dumps(sorted(files), separators=(',', ':'))
+    return manifest, hashlib.md5(manifest.encode()).hexdigest()
+
+# sqlite settings used for all xagg database sessions (see DBSession)
+sessionPragmas = {'journal_mode' : 'WAL',
+                  'synchronous' : 'NORMAL',
+                  'cache_size' : -262144,
+                  'mmap_size' : 1073741824}
+
+class DBSession(object):
+    """
+    session = DBSession(sqlDB, busyTimeout=60, retries=5)
+
+    Reusable connection to an xagg database (normally obtained with
+    getSession). The connection is configured with sessionPragmas (WAL
+    journaling lets the cron jobs and retract.py read while another process
+    writes) and waits up to busyTimeout seconds for a lock held by another
+    process. A statement that still fails because the database is locked is
+    retried (retries times, with an increasing delay).
+
+    The connection is in autocommit mode, so writes that belong together
+    should be grouped in a transaction, which is committed once when the
+    block exits (or rolled back if there is an error). Transactions can be
+    nested; only the outermost block commits:
+
+        with session.transaction():
+            session.executemany(q, datalist)
+
+    Inputs:
+        sqlDB (string): filename of sqlite file
+        busyTimeout (optional, float): seconds to wait for a lock (default 60)
+        retries (optional, int): number of retries for locked statements (default 5)
+
+    """
+
+    def __init__(self, sqlDB, busyTimeout=60, retries=5):
+        self.sqlDB = sqlDB
+        self.retries = retries
+        self.depth = 0
+        self.conn = sqlite3.connect(sqlDB, timeout=busyTimeout, isolation_level=None)
+        for pragma, value in sessionPragmas.items():
+            self.conn.execute('PRAGMA ' + pragma + ' = ' + str(value) + ';')
+
+    def execute(self, q, params=()):
+        for i in range(self.retries + 1):
+            try:
+                return self.conn.execute(q, params)
+            except sqlite3.OperationalError as e:
+                if (i == self.retries) or ('locked' not in str(e)):
+                    raise
+                time.sleep(2 ** i)
+
+    def executemany(self, q, datalist):
+        with self.transaction():
+            return self.conn.executemany(q, datalist)
+
+    def query(self, q, params=()):
+        return self.execute(q, params).fetchall()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # take the write lock up front so the transaction cannot fail part way
+        if self.depth == 0:
+            self.execute('BEGIN IMMEDIATE;')
+        self.depth += 1
+        try:
+            yield self
+        except:
+            self.depth -= 1
+            if self.depth == 0:
+                self.conn.execute('ROLLBACK;')
+            raise
+        self.depth -= 1
+        if self.depth == 0:
+            self.execute('COMMIT;')
+
+    def close(self):
+        self.conn.close()
+
+# open database sessions ((process id, thread id, database) -> DBSession)
+dbSessions = {}
+
+def getSession(sqlDB):
+    """
+    session = getSession(sqlDB)
+
+    Function returns the database session (see DBSession) for sqlDB, which is
+    opened on first use and then shared by all functions in this thread.
+    Sessions are never shared between processes (e.g., crawl workers) or
+    threads (e.g., the scan result writer, see streamScans).
+
+    Inputs:
+        sqlDB (string): filename of sqlite file
+
+    Returns:
+        session (DBSession)
+
+    """
+    key = (os.getpid(), threading.get_ident(), os.path.abspath(sqlDB))
+    if key not in dbSessions:
+        dbSessions[key] = DBSession(sqlDB)
+    return dbSessions[key]
 
-    return time
+def closeSessions():
+    """
+    closeSessions()
+
+    Function closes all database sessions opened by this thread (see getSession).
+
+    """
+    for key in list(dbSessions.keys()):
+        if key[:2] == (os.getpid(), threading.get_ident()):
+            dbSessions.pop(key).close()
 
-def sqltimeToDatetime(sqltime):
+def checkFullCrawl(sqlDB, fullCrawlInterval):
+    """
+    fullCrawl = checkFullCrawl(sqlDB, fullCrawlInterval)
+
+    Function determines whether the current run should walk every directory
+    (True) or run an incremental crawl that does not read unchanged
+    directories (False). A full crawl is forced every fullCrawlInterval runs
+    (based on the number of entries in the runs table) to catch files that
+    are modified in place (which does not change the directory mtime). An
+    interval of 1 (or less) always forces a full crawl.
+
+    Inputs:
+        sqlDB (string): filename of sqlite file
+        fullCrawlInterval (int): number of runs between full crawls
+
+    Returns:
+        fullCrawl (boolean)
+
+    """
+    if fullCrawlInterval <= 1:
+        return True
+    nRuns = getSession(sqlDB).query('select count(*) from runs;')[0][0]
+    return np.mod(nRuns, fullCrawlInterval) == 0
+
+def crawlWorker(taskQueue, resultQueue, pending, idle, shardFile, sqlDB=None, rmDir=set(), batchSize=10000, manifest=False):
     '''
-    time = sqltimeToDatetime(sqltime)
+    crawlWorker(taskQueue, resultQueue, pending, idle, shardFile, sqlDB=None, rmDir=set(), batchSize=10000, manifest=False)
+
+    Worker process for parallelFindData. The worker takes directories from a
+    shared queue (taskQueue) and uses the scantree iterator to check all
+    directories that fall under each one for their created (ctime), modified
+    (mtime), and accessed (atime) times. Whenever another worker is idle, the
+    worker hands off the oldest (shallowest) half of its unexplored directories
+    to the shared queue, so that large subtrees are split across all workers.
+
+    The directory records are streamed (in batches of batchSize) to a
+    directories table in a shard sqlite file (shardFile) so that the crawl
+    results are never held in memory. If sqlDB is provided, the crawl is
+    incremental and directories with an unchanged mtime are not read (see
+    scantree).
+
+    When the worker receives None from the task queue, it puts the following
+    on the result queue and exits:
+
+        shardFile, nDirs, nLeaves, nUnchanged, elapsed
+
+    Inputs:
+        taskQueue (multiprocessing.Queue): directories to crawl
+        resultQueue (multiprocessing.Queue): queue for worker summaries
+        pending (multiprocessing.Value): number of queued or in-progress directories
+        idle (multiprocessing.Value): number of workers waiting for work
+        shardFile (string): sqlite file to write directory records to
+        sqlDB (string): xagg database for incremental crawls (default None)
+        rmDir (set): directories to ignore while crawling
+        batchSize (int): number of records per shard write (default 10000)
+        manifest (boolean): record the file manifest of each directory (default False, see scantree)
 
-    Function takes a SQL-like datestring and returns a datetime object
     '''
-    d = sqltime.split(' ')[0]
-    t = sqltime.split(' ')[1]
-    y = int(d.split('-')[0])
-    mth = int(d.split('-')[1])
-    d = int(d.split('-')[2])
-    h = int(t.split(':')[0])
-    m = int(t.split(':')[1])
-    s = int(t.split(':')[2])
-    return datetime.datetime(y,mth,d,h,m,s)
-
-def findDiskPaths(path):
+    conn = None
+    if sqlDB is not None:
+        conn = sqlite3.connect('file:' + sqlDB + '?mode=ro', uri=True)
+    shard = sqlite3.connect(shardFile)
+    shard.execute('PRAGMA journal_mode = OFF;')
+    shard.execute('PRAGMA synchronous = OFF;')
+    shard.execute('CREATE TABLE directories ' + tableDefinitions['directories'])
+    q = 'INSERT INTO directories (path, ctime, mtime, atime, hasFiles, nFiles, nBytes, manifest, manifestHash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);'
+
+    def shareWork(stack):
+        # hand off the shallowest directories if another worker is waiting
+        if (len(stack) > 1) and (idle.value > 0):
+            n = len(stack) // 2
+            with pending.get_lock():
+                pending.value += n
+            for d in stack[:n]:
+                taskQueue.put(d)
+            del stack[:n]
+
+    batch = []
+    nDirs = 0
+    nLeaves = 0
+    nUnchanged = 0
+    busy = 0.
+    while True:
+        with idle.get_lock():
+            idle.value += 1
+        path = taskQueue.get()
+        with idle.get_lock():
+            idle.value -= 1
+        if path is None:
+            break
+        s = time.time()
+        for record in scantree(path, conn, rmDir, shareWork, manifest):
+            hasFiles, reused = record[4], record[-1]
+            batch.append(record[:-1])
+            nDirs += 1
+            if hasFiles:
+                nLeaves += 1
+            if reused:
+                nUnchanged += 1
+            if len(batch) >= batchSize:
+                shard.executemany(q, batch)
+                batch = []
+        busy += time.time() - s
+        with pending.get_lock():
+            pending.value -= 1
+    shard.executemany(q, batch)
+    shard.commit()
+    shard.close()
+    if conn is not None:
+        conn.close()
+    resultQueue.put((shardFile, nDirs, nLeaves, nUnchanged, busy))
+
+class PathRow(object):
+    """
+    row = PathRow(index, values)
+
+    Compact (slotted) row object returned by queryPaths and getScanList.
+    Columns can be accessed as attributes (row.xmlFile) or like a dictionary
+    (row['xmlFile']), so rows can be used in place of dictionaries (e.g., as
+    pathMeta in createFilename). The column index is shared by all rows from
+    the same query.
+
+    Inputs:
+        index (dict): column name -> position in values
+        values (tuple): column values
+
+    """
+    __slots__ = ('_index', '_values')
+
+    def __init__(self, index, values):
+        self._index = index
+        self._values = values
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._values[self._index[name]]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return self._values[self._index[name]]
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __reduce__(self):
+        return (PathRow, (self._index, self._values))
+
+    def __repr__(self):
+        return 'PathRow(' + repr(self._asdict()) + ')'
+
+    def keys(self):
+        return self._index.keys()
+
+    def _asdict(self):
+        return {k : self._values[i] for k, i in self._index.items()}
+
+def queryPaths(sqlDB, columns=['path'], facets={}, stream=False):
     '''
-    dpaths = findDiskPaths(path)
+    rows = queryPaths(sqlDB, columns=['path'], facets={}, stream=False)
+
+    Function returns the requested columns from the paths table for all
+    paths that match the facets. Only the requested columns are read from
+    the database and each row is returned as a compact PathRow (see
+    loadPathStore to load the columns into numpy arrays instead).
 
-    Function uses the scantree iterator to check all eligible paths
-    that fall under a parent path (input: path) for their created (ctime),
-    modified (mtime), and accessed (atime) times. It returns this in a dictionary
-    object:
+    Input:
+        sqlDb (string): filename of sqlite file
+        columns (list): columns to return (e.g., ['path', 'modified', 'xmlFile'])
+        facets (dictionary): column constraints, where each value can be a
+                             single value, a list of values, or None (NULL), e.g.,
+                             {'variable' : ['tas', 'pr'], 'retired' : 0, 'xmlFile' : None}
+        stream (boolean): return a generator that reads rows from the database
+                          as they are consumed instead of a list (default False)
 
     Returns:
-        dbPaths[childPath] = {'ctime' : ctime, 'mtime' : mtime, 'atime' : atime}
+        rows (list or generator of PathRow objects)
 
     '''
-    x = scantree(path)
-    dpaths = {}
-    s = time.time()
-    for file_path in x:
-        ts = scandir.stat(file_path)
-        ctime = toSQLtime(datetime.datetime.fromtimestamp(ts.st_ctime))
-        mtime = toSQLtime(datetime.datetime.fromtimestamp(ts.st_mtime))
-        atime = toSQLtime(datetime.datetime.fromtimestamp(ts.st_atime))
-        dpaths[file_path] = {'ctime' : ctime, 'mtime' : mtime, 'atime' : atime}
-    e = time.time()
-    print(path, e-s)
-    return dpaths
-
-def getDBPaths(sqlDB):
+    session = getSession(sqlDB)
+    # check column names (these are inserted directly into the query)
+    validColumns = set([row[1].lower() for row in session.query('PRAGMA table_info(paths);')])
+    for col in list(columns) + list(facets.keys()):
+        if col.lower() not in validColumns:
+            raise ValueError('Invalid column: ' + col)
+    # build query
+    q = 'SELECT ' + ', '.join(columns) + ' FROM paths'
+    constraints = []
+    params = []
+    for col, value in facets.items():
+        if value is None:
+            constraints.append(col + ' IS NULL')
+        elif isinstance(value, (list, tuple, set)):
+            constraints.append(col + ' IN (' + ', '.join(['?'] * len(value)) + ')')
+            params.extend(value)
+        else:
+            constraints.append(col + ' = ?')
+            params.append(value)
+    if len(constraints) > 0:
+        q += ' WHERE ' + ' AND '.join(constraints)
+    c = session.execute(q + ';', params)
+    index = {col : i for i, col in enumerate(columns)}
+
+    def rowGenerator():
+        try:
+            for row in c:
+                yield PathRow(index, row)
+        finally:
+            c.close()
+
+    if stream:
+        return rowGenerator()
+    rows = [PathRow(index, row) for row in c.fetchall()]
+    return rows
+
+class PathStore(object):
+    """
+    store = PathStore(paths, **columns)
+
+    Compact in-memory store for a large number of paths (or other unique
+    keys, e.g., keyids). The paths are held in a sorted numpy bytes array and
+    each column is held in a numpy array (e.g., bytes, int64 timestamps, or
+    boolean flags) that is aligned with the paths. This uses a fraction of
+    the memory of a dictionary of dictionaries and allows vectorized lookups
+    (with searchsorted) and comparisons between stores.
+
+    Inputs:
+        paths (numpy bytes array): utf-8 encoded paths (must be unique)
+        columns (numpy arrays): one array for each column (same length as paths)
+
+    Usage:
+        store.mtime                 # column array
+        store.find(other.paths)     # index of each path in store (-1 if absent)
+        store.contains(other.paths) # boolean array
+        '/a/b/c/' in store          # membership test for a single path
+        store['/a/b/c/']            # dictionary of column values for a path
+
+    """
+
+    def __init__(self, paths, **columns):
+        if (len(paths) > 1) and (not np.all(paths[:-1] <= paths[1:])):
+            order = np.argsort(paths)
+            paths = paths[order]
+            columns = {k : v[order] for k, v in columns.items()}
+        self.paths = paths
+        self.columns = list(columns.keys())
+        for k, v in columns.items():
+            setattr(self, k, v)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def find(self, paths):
+        n = len(self.paths)
+        if n == 0:
+            return np.full(len(paths), -1, dtype=np.int64)
+        idx = np.searchsorted(self.paths, paths)
+        idx[idx == n] = 0
+        idx[self.paths[idx] != paths] = -1
+        return idx
+
+    def contains(self, paths):
+        return self.find(paths) >= 0
+
+    def index(self, path):
+        return self.find(np.array([path.encode('utf-8')]))[0]
+
+    def __contains__(self, path):
+        return self.index(path) >= 0
+
+    def __getitem__(self, path):
+        i = self.index(path)
+        if i < 0:
+            raise KeyError(path)
+        return {k : getattr(self, k)[i] for k in self.columns}
+
+def loadPathStore(sqlDB, columns=[], dtypes=[], facets={}, chunkSize=100000):
+    """
+    store = loadPathStore(sqlDB, columns=[], dtypes=[], facets={}, chunkSize=100000)
+
+    Function loads the requested columns of the paths that match the facets
+    (see queryPaths) into a PathStore. The rows are read in chunks and each
+    chunk is converted to numpy arrays, so only one chunk of rows is held as
+    python objects at a time. Columns with dtype 'S' are utf-8 encoded (with
+    b'' for NULL) into a bytes array that is as wide as the longest value.
+
+    Inputs:
+        sqlDB (string): filename of sqlite file
+        columns (list): columns to load (in addition to path), e.g., ['keyid', 'xmlFile']
+        dtypes (list): numpy dtype for each column (e.g., 'S', object, np.int64, bool)
+        facets (dictionary): column constraints (see queryPaths)
+        chunkSize (int): number of rows converted at a time (default 100000)
+
+    Returns:
+        store (PathStore)
+
+    """
+    def toArray(values, dtype):
+        if dtype == 'S':
+            return np.array([v.encode('utf-8') if v is not None else b'' for v in values], dtype='S')
+        return np.array(values, dtype=dtype)
+
+    rows = queryPaths(sqlDB, ['path'] + list(columns), facets, stream=True)
+    chunks = []
+    while True:
+        chunk = [row._values for row in itertools.islice(rows, chunkSize)]
+        if len(chunk) == 0:
+            break
+        chunks.append([toArray([row[i] for row in chunk], dtype) for i, dtype in enumerate(['S'] + list(dtypes))])
+    if len(chunks) == 0:
+        chunks = [[toArray([], dtype) for dtype in ['S'] + list(dtypes)]]
+    arrays = [np.concatenate([chunk[i] for chunk in chunks]) for i in range(len(columns) + 1)]
+    return PathStore(arrays[0], **dict(zip(columns, arrays[1:])))
+
+def initializeDB(sqlDB):
     '''
-    db = getDBPaths(sqlDB)
+    initializeDB(sqlDB)
 
-    Function uses the specified sql database and returns all information
-    about each path in the database in a dictionary. The dictionary key
-    is the path.
+    Function initialized a sqlite database with the correct
+    tables to be used with xagg software. All timestamps are stored
+    as integer epoch seconds. The database is then brought up to the
+    current schema version (views, indexes, see migrateDB).
 
     Input:
         sqlDb (string): filename of sqlite file
 
-    Returns:
-        db[path]
+    '''
+    session = getSession(sqlDB)
+    # Create tables
+    with session.transaction():
+        c = session.conn.cursor()
+        c.execute('''drop table if exists paths;''')
+        c.execute('CREATE TABLE paths ' + tableDefinitions['paths'])
+        c.execute('''CREATE INDEX pathIndex ON paths (path);''')
+        c.execute('''drop table if exists invalid_paths;''')
+        c.execute('CREATE TABLE invalid_paths ' + tableDefinitions['invalid_paths'])
+        c.execute('''drop table if exists stats;''')
+        c.execute('CREATE TABLE stats ' + tableDefinitions['stats'])
+        c.execute('''drop table if exists runs;''')
+        c.execute('CREATE TABLE runs ' + tableDefinitions['runs'])
+        c.execute('PRAGMA user_version = 0;')
+    migrateDB(sqlDB, quiet=True)
+    initializeDirectoryTable(sqlDB)
+
+def createReadableViews(c):
+    '''
+    createReadableViews(c)
 
-    db[path] is then a sub-dictionary that contains all columns in the database:
+    Function (re-)creates views of the paths, invalid_paths, stats, and runs
+    tables (paths_readable, invalid_paths_readable, stats_readable, and
+    runs_readable) in which the integer epoch timestamps are displayed as
+    local SQL-like datestrings (e.g., '2019-05-09 12:00:00').
 
-        keyid, mip_era, activity, institute, model, experiment, member, cmipTable, realm, ...
-        frequency, variable, grid, gridLabel, version, created, modified, accessed, xmlFile, ...
-        xmlwritedatetime, error, retired, retire_datetime, ignored, ignored_datetime
+    Input:
+        c: sqlite cursor
 
     '''
-    conn = sqlite3.connect(sqlDB)
-    c = conn.cursor()
-    # Get all paths
-    c.execute('select * from paths;')
-    a = c.fetchall()
-    conn.close()
-    db = {}
-    for row in a:
-        db[row[0]] = {'keyid' : row[1], 'mip_era' : row[2], 'activity' : row[3], 'institute' : row[4], 'model' : row[5], 'experiment' : row[6], 'member' : row[7], 'cmipTable' : row[8], 'realm' : row[9], 'frequency' : row[10], 'variable' : row[11], 'grid' : row[12], 'gridLabel' : row[13], 'version' : row[14], 'created' : row[15], 'modified' : row[16], 'accessed' : row[17], 'xmlFile' : row[18], 'xmlwritedatetime' : row[19], 'error' : row[20], 'retired' : row[21], 'retire_datetime' : row[22], 'ignored' : row[23], 'ignored_datetime' : row[23]}
-    return db
+    for table, columns in epochColumns.items():
+        c.execute('PRAGMA table_info(' + table + ');')
+        selection = []
+        for row in c.fetchall():
+            if row[1] in columns:
+                selection.append("datetime(" + row[1] + ", 'unixepoch', 'localtime') AS " + row[1])
+            else:
+                selection.append(row[1])
+        c.execute('DROP VIEW IF EXISTS ' + table + '_readable;')
+        c.execute('CREATE VIEW ' + table + '_readable AS SELECT ' + ', '.join(selection) + ' FROM ' + table + ';')
 
-def getInvalidDBPaths(sqlDB):
+def migrationEpochTimes(c):
     '''
-    db = getInvalidDBPaths(sqlDB)
+    migrationEpochTimes(c)
 
-    Function uses the specified sql database and returns a list
-    of paths that are known to be invalid.
+    Schema migration 1: migrates a database that stores timestamps as SQL-like
+    datestrings (e.g., '2019-05-09 12:00:00') to integer epoch columns. The
+    paths, invalid_paths, stats, and runs tables are rebuilt with INTEGER
+    timestamp columns and existing datestrings are converted (paths,
+    invalid_paths, and runs were written in local time, stats in UTC).
+    Tables that already have INTEGER timestamps are left as they are.
+    Human-readable views are also created (see createReadableViews).
 
     Input:
-        sqlDb (string): filename of sqlite file
+        c: sqlite cursor
 
-    Returns:
-        invalidPaths (list)
+    '''
+    c.execute('PRAGMA table_info(paths);')
+    types = {row[1] : row[2].upper() for row in c.fetchall()}
+    if types['modified'] != 'INTEGER':
+        for table, columns in epochColumns.items():
+            c.execute('PRAGMA table_info(' + table + ');')
+            selection = []
+            for row in c.fetchall():
+                col = row[1]
+                if col in columns:
+                    if table == 'stats':
+                        selection.append("CASE WHEN typeof(" + col + ") = 'text' THEN CAST(strftime('%s', " + col + ") AS INTEGER) ELSE " + col + " END")
+                    else:
+                        selection.append("CASE WHEN typeof(" + col + ") = 'text' THEN CAST(strftime('%s', " + col + ", 'utc') AS INTEGER) ELSE " + col + " END")
+                else:
+                    selection.append(col)
+            c.execute('ALTER TABLE ' + table + ' RENAME TO ' + table + '_old;')
+            c.execute('CREATE TABLE ' + table + ' ' + tableDefinitions[table])
+            c.execute('INSERT INTO ' + table + ' SELECT ' + ', '.join(selection) + ' FROM ' + table + '_old;')
+            c.execute('DROP TABLE ' + table + '_old;')
+        c.execute('''CREATE INDEX IF NOT EXISTS pathIndex ON paths (path);''')
+    createReadableViews(c)
+
+def migrationQueryIndexes(c):
+    '''
+    migrationQueryIndexes(c)
+
+    Schema migration 2: adds the indexes used by the most frequent queries:
+        keyIdIndex      paths (keyid)           scan list anti-join, retract.py
+        scanIndex       paths (variable, experiment, frequency, retired, ignored)
+                                                scan list selection
+        xmlFileIndex    paths (xmlFile)         writeStats, scan list anti-join
+        errorIndex      paths (error)           writeStats, retract.py
+
+    Input:
+        c: sqlite cursor
 
     '''
-    conn = sqlite3.connect(sqlDB)
-    c = conn.cursor()
-    # Create table
-    c.execute('select path from invalid_paths;')
-    a = c.fetchall()
-    conn.close()
-    db = []
-    for row in a:
-        db.append(row[0])
-    return db
+    c.execute('''CREATE INDEX IF NOT EXISTS keyIdIndex ON paths (keyid);''')
+    c.execute('''CREATE INDEX IF NOT EXISTS scanIndex ON paths (variable, experiment, frequency, retired, ignored);''')
+    c.execute('''CREATE INDEX IF NOT EXISTS xmlFileIndex ON paths (xmlFile);''')
+    c.execute('''CREATE INDEX IF NOT EXISTS errorIndex ON paths (error);''')
+    c.execute('''ANALYZE paths;''')
 
-def getRetiredDBPaths(sqlDB):
+def migrationUniquePaths(c):
     '''
-    db = getRetiredDBPaths(sqlDB)
+    migrationUniquePaths(c)
 
-    Function uses the specified sql database and returns a list
-    of paths that are known to be retired.
+    Schema migration 3: replaces the path index with a unique index (used
+    to merge bulk updates, see sqlMerge). If a path is listed more than
+    once, only the most recently inserted row is kept.
 
     Input:
-        sqlDb (string): filename of sqlite file
+        c: sqlite cursor
 
-    Returns:
-        retiredPaths (list)
+    '''
+    c.execute('''DELETE FROM paths WHERE rowid NOT IN (SELECT max(rowid) FROM paths GROUP BY path);''')
+    c.execute('''DROP INDEX IF EXISTS pathIndex;''')
+    c.execute('''CREATE UNIQUE INDEX pathIndex ON paths (path);''')
 
+def migrationScanDurations(c):
     '''
-    conn = sqlite3.connect(sqlDB)
-    c = conn.cursor()
-    # Create table
-    c.execute('select path from paths where retired = 1;')
-    a = c.fetchall()
-    conn.close()
-    db = []
-    for row in a:
-        db.append(row[0])
-    return db
+    migrationScanDurations(c)
+
+    Schema migration 4: adds a scanDuration column to the paths table, which
+    records how long (seconds) the last scan of each path took. Past scan
+    durations are used to fit the scan cost model (see fitScanCostModel).
+
+    Input:
+        c: sqlite cursor
 
-def initializeDB(sqlDB):
     '''
-    initializeDB(sqlDB)
+    c.execute('PRAGMA table_info(paths);')
+    if 'scanDuration' not in [row[1] for row in c.fetchall()]:
+        c.execute('''ALTER TABLE paths ADD COLUMN scanDuration REAL;''')
+    createReadableViews(c)
 
-    Function initialized a sqlite database with the correct
-    tables to be used with xagg software.
+def migrationManifestHashes(c):
+    '''
+    migrationManifestHashes(c)
+
+    Schema migration 5: adds a manifestHash column to the paths table, which
+    records the checksum of the file manifest of each path when it was last
+    found to be modified (see createManifest and updateDatabaseHoldings).
 
     Input:
-        sqlDb (string): filename of sqlite file
+        c: sqlite cursor
 
     '''
-    conn = sqlite3.connect(sqlDB)
-    c = conn.cursor()
-    # Create table
-    c.execute('''drop table if exists paths;''')
-    c.execute('''CREATE TABLE paths
-                 (path varchar(255), keyid varchar(255), mip_era varchar(255), activity varchar(255), institute varchar(255), model varchar(255), experiment varchar(255), member varchar(255), cmipTable varchar(255), realm varchar(255), frequency varchar(255), variable varchar(255), grid varchar(255), gridLabel varchar(255), version varchar(255), created datetime, modified datetime, accessed datetime, xmlFile varchar(255), xmlwritedatetime datetime, error varchar(255), retired BOOLEAN, retire_datetime datetime, ignored BOOLEAN, ignored_datetime DATETIME)''')
-    c.execute('''CREATE INDEX pathIndex ON paths (path);''')
-    c.execute('''drop table if exists invalid_paths;''')
-    c.execute('''CREATE TABLE invalid_paths (path varchar(255), datetime DATETIME)''')
-    c.execute('''drop table if exists stats;''')
-    c.execute('''CREATE TABLE stats (indicator varchar(255), value int, datetime DATETIME)''')
-    c.execute('''drop table if exists runs;''')
-    c.execute('''CREATE TABLE runs (datetime DATETIME, total INT, new INT, invalid INT, modified INT, missing INT, returned INT, deleted INT)''')
-    # Save (commit) the changes
-    conn.commit()
-    # We can also close the connection if we are done with it.
-    # Just be sure any changes have been committed or they will be lost.
-    conn.close()
+    c.execute('PRAGMA table_info(paths);')
+    if 'manifestHash' not in [row[1] for row in c.fetchall()]:
+        c.execute('''ALTER TABLE paths ADD COLUMN manifestHash TEXT;''')
+    createReadableViews(c)
 
-def parallelFindData(data_directories, numProcessors=20, split=[], rmDir=[]):
+def migrationManifestIndex(c):
     '''
-    diskStat = parallelFindData(data_directories, numProcessors=20, split=[], rmDir=[])
+    migrationManifestIndex(c)
 
-    Function simply parallelizes findDiskPaths to speed up the search for eligible paths.
+    Schema migration 6: adds an index on the manifest checksum of each path,
+    which is used to find paths with identical files (see getScanList and
+    getDuplicatePaths).
 
     Input:
+        c: sqlite cursor
+
+    '''
+    c.execute('''CREATE INDEX IF NOT EXISTS manifestIndex ON paths (manifestHash);''')
+
+def migrationErrorCategories(c):
+    '''
+    migrationErrorCategories(c)
+
+    Schema migration 7: adds the errorCategories table (seeded with
+    errorCategoryDefaults), which defines the categories used to classify
+    scan errors (see ErrorClassifier), and an errorCode column in the paths
+    table with the category of each error. Existing errors are categorized
+    by their error message or the warning code in their xml filename.
+
+    Input:
+        c: sqlite cursor
+
+    '''
+    c.execute('CREATE TABLE IF NOT EXISTS errorCategories ' + tableDefinitions['errorCategories'])
+    c.executemany('INSERT OR IGNORE INTO errorCategories (code, category, kind, pattern, position) VALUES (?, ?, ?, ?, ?);', [row[:5] for row in errorCategoryDefaults])
+    c.execute('PRAGMA table_info(paths);')
+    if 'errorCode' not in [row[1] for row in c.fetchall()]:
+        c.execute('''ALTER TABLE paths ADD COLUMN errorCode INTEGER;''')
+    c.execute('''UPDATE paths
+                 SET errorCode = (SELECT code FROM errorCategories WHERE category = paths.error)
+                 WHERE errorCode IS NULL AND error IS NOT NULL;''')
+    # xml filenames end in .nnnnnnn.0.xml (one digit per warning position)
+    c.execute('''SELECT code, position FROM errorCategories WHERE kind = 'warning' AND position IS NOT NULL ORDER BY code;''')
+    for code, position in c.fetchall():
+        c.execute('''UPDATE paths SET errorCode = ?
+                     WHERE errorCode IS NULL AND xmlFile LIKE '%.0.xml'
+                     AND substr(xmlFile, ?, 1) = '1';''', (code, position - 13))
+    c.execute('''CREATE INDEX IF NOT EXISTS errorCodeIndex ON paths (errorCode);''')
+    createReadableViews(c)
+
+def migrationScanRetries(c):
+    '''
+    migrationScanRetries(c)
+
+    Schema migration 8: adds scanAttempts (the number of failed scans) and
+    nextScan (the time after which the path may be scanned again) columns
+    to the paths table and a transient column to the errorCategories table.
+    Paths whose errors are transient are scanned again with an exponential
+    backoff (see scanListQuery and writeScanResults).
+
+    Input:
+        c: sqlite cursor
+
+    '''
+    c.execute('PRAGMA table_info(paths);')
+    columns = [row[1] for row in c.fetchall()]
+    for col in ['scanAttempts', 'nextScan']:
+        if col not in columns:
+            c.execute('ALTER TABLE paths ADD COLUMN ' + col + ' INTEGER;')
+    c.execute('PRAGMA table_info(errorCategories);')
+    if 'transient' not in [row[1] for row in c.fetchall()]:
+        c.execute('''ALTER TABLE errorCategories ADD COLUMN transient BOOLEAN;''')
+    c.executemany('UPDATE errorCategories SET transient = ? WHERE code = ? AND transient IS NULL;', [[row[5], row[0]] for row in errorCategoryDefaults])
+    c.execute('''UPDATE errorCategories SET transient = 0 WHERE transient IS NULL;''')
+    createReadableViews(c)
+
+def migrationErrorCategoryDefaults(c):
+    '''
+    migrationErrorCategoryDefaults(c)
+
+    Schema migration 9: adds any categories in errorCategoryDefaults that
+    are missing from the errorCategories table (e.g., the transient 'Scan
+    worker exited unexpectedly' category for scan workers that crash or are
+    killed). Existing categories are not changed.
+
+    Input:
+        c: sqlite cursor
+
+    '''
+    c.executemany('INSERT OR IGNORE INTO errorCategories (code, category, kind, pattern, position, transient) VALUES (?, ?, ?, ?, ?, ?);', errorCategoryDefaults)
+
+def migrationPrevXmlFiles(c):
+    '''
+    migrationPrevXmlFiles(c)
+
+    Schema migration 10: adds a prevXmlFile column to the paths table with
+    the xml file that was set aside for a modified path (see
+    updateDatabaseHoldings and appendXml), so that it can be removed if the
+    path is retired, reset, or ignored before it is scanned again (see
+    removePrevXmlFiles).
+
+    Input:
+        c: sqlite cursor
+
+    '''
+    c.execute('PRAGMA table_info(paths);')
+    if 'prevXmlFile' not in [row[1] for row in c.fetchall()]:
+        c.execute('''ALTER TABLE paths ADD COLUMN prevXmlFile varchar(255);''')
+    createReadableViews(c)
+
+# schema migrations (the list position + 1 is the schema version)
+migrations = [migrationEpochTimes,
+              migrationQueryIndexes,
+              migrationUniquePaths,
+              migrationScanDurations,
+              migrationManifestHashes,
+              migrationManifestIndex,
+              migrationErrorCategories,
+              migrationScanRetries,
+              migrationErrorCategoryDefaults,
+              migrationPrevXmlFiles]
+
+def migrateDB(sqlDB, quiet=False):
+    '''
+    version = migrateDB(sqlDB, quiet=False)
+
+    Function upgrades an existing database in place to the current schema.
+    The schema version of a database is stored in PRAGMA user_version and
+    each migration (see migrations) that has not yet been applied is run
+    in its own transaction (along with the version update), so a failed
+    migration leaves the database at the previous version.
+
+    New migrations should be appended to the migrations list.
+
+    Input:
+        sqlDb (string): filename of sqlite file
+        quiet (optional, boolean): suppress display information if True (default False)
+
+    Returns:
+        version (int): schema version of the database
+
+    '''
+    session = getSession(sqlDB)
+    version = session.query('PRAGMA user_version;')[0][0]
+    for i in range(version, len(migrations)):
+        if not quiet:
+            print('Applying schema migration ' + str(i + 1) + ': ' + migrations[i].__name__)
+            print(time.ctime())
+            print()
+        with session.transaction():
+            c = session.conn.cursor()
+            migrations[i](c)
+            c.execute('PRAGMA user_version = ' + str(i + 1) + ';')
+        version = i + 1
+    return version
+
+def initializeDirectoryTable(sqlDB):
+    '''
+    initializeDirectoryTable(sqlDB)
+
+    Function creates the directories table (if it does not exist), which
+    stores the stat information for every directory (interior and leaf)
+    found during the last disk crawl. It is used to prune unchanged subtrees
+    during incremental crawls (see scantree) and to estimate scan costs (see
+    scanCost). Columns missing from a directories table written by an older
+    version of xagg are added (and filled in by the next crawl).
+
+    Input:
+        sqlDb (string): filename of sqlite file
+
+    '''
+    session = getSession(sqlDB)
+    with session.transaction():
+        session.execute('CREATE TABLE IF NOT EXISTS directories ' + tableDefinitions['directories'])
+        session.execute('''CREATE UNIQUE INDEX IF NOT EXISTS directoryIndex ON directories (path);''')
+        existing = [row[1] for row in session.query('PRAGMA table_info(directories);')]
+        for col in tableDefinitions['directories'].strip('()').split(', '):
+            if col.split()[0] not in existing:
+                session.execute('ALTER TABLE directories ADD COLUMN ' + col + ';')
+
+def parallelFindData(sqlDB, data_directories, numProcessors=20, rmDir=[], fullCrawl=True, manifest=False):
+    '''
+    nLeaves = parallelFindData(sqlDB, data_directories, numProcessors=20, rmDir=[], fullCrawl=True, manifest=False)
+
+    Function crawls all directories under data_directories in parallel to
+    search for eligible paths (see crawlWorker). Directories are shared between
+    workers as they are discovered, so that no worker sits idle while another
+    is still crawling a large subtree.
+
+    Each worker streams its directory records to a shard file, which are
+    merged into a staging table (crawl_staging) one at a time. Once the crawl
+    is complete, the staging table replaces the directories table, which then
+    holds the stat information for every directory on disk (see
+    updateDatabaseHoldings). The full crawl is therefore never held in
+    memory. If fullCrawl is False, the previous directories table is used to
+    skip reading directories whose mtime has not changed since the last crawl
+    (see scantree and checkFullCrawl).
+
+    Input:
+        sqlDB (string): filename of sqlite file
         data_directories (list): list of parent directories to search
         num_processors (int): number of processors to use (default 20)
-        split (list): list of parent directories that should be split apart into separate threads
-                      e.g., '/parent/' -> ['parent/child1', 'parent/child2']
         rmDir (list): list of directories to ignore while scanning
+        fullCrawl (boolean): walk all directories even if a prior crawl exists (default True)
+        manifest (boolean): record the file manifest of each directory (default False, see scantree)
 
     Returns:
-        dbPaths[childPath] = {'ctime' : ctime, 'mtime' : mtime, 'atime' : atime}
+        nLeaves (int): number of directories containing files
 
     '''
-    # grab the right number of processors
-    for d in split:
-        dlist = glob.glob(d + '/*/')
-        data_directories = data_directories + dlist
-    for d in rmDir:
-        data_directories.remove(d)
-    if len(data_directories) > numProcessors:
-        nfscan = numProcessors
+    rmDir = set([d.rstrip('/') + '/' for d in rmDir])
+
+    # only provide prior crawl information for incremental crawls
+    initializeDirectoryTable(sqlDB)
+    if fullCrawl:
+        priorDB = None
+        print('Full crawl', end='\n \n')
+    else:
+        priorDB = sqlDB
+        print('Incremental crawl', end='\n \n')
+
+    print('Using ' + str(numProcessors) + ' processors to check ' + str(len(data_directories)) + ' directories...', end='\n \n')
+
+    # start workers (each worker writes to its own shard file)
+    shardDir = tempfile.mkdtemp(prefix='crawl_', dir=os.path.dirname(os.path.abspath(sqlDB)))
+    taskQueue = multiprocessing.Queue()
+    resultQueue = multiprocessing.Queue()
+    pending = multiprocessing.Value('i', len(data_directories))
+    idle = multiprocessing.Value('i', 0)
+    workers = []
+    for i in range(numProcessors):
+        shardFile = shardDir + '/' + str(i) + '.db'
+        w = multiprocessing.Process(target=crawlWorker, args=(taskQueue, resultQueue, pending, idle, shardFile, priorDB, rmDir), kwargs={'manifest' : manifest})
+        w.start()
+        workers.append(w)
+    for d in data_directories:
+        taskQueue.put(d)
+
+    # wait until all directories have been crawled
+    while pending.value > 0:
+        for w in workers:
+            if w.exitcode is not None:
+                for w in workers:
+                    w.terminate()
+                shutil.rmtree(shardDir)
+                raise ValueError('Crawl worker exited unexpectedly')
+        time.sleep(0.5)
+    for w in workers:
+        taskQueue.put(None)
+    results = [resultQueue.get() for w in workers]
+    for w in workers:
+        w.join()
+    for shardFile, n, nl, nu, busy in results:
+        print(shardFile.split('/')[-1] + ': ' + str(n) + ' directories (' + str(int(busy)) + 's)')
+
+    # merge shards into staging table
+    session = getSession(sqlDB)
+    with session.transaction():
+        session.execute('DROP TABLE IF EXISTS crawl_staging;')
+        session.execute('CREATE TABLE crawl_staging ' + tableDefinitions['directories'])
+        session.execute('CREATE UNIQUE INDEX crawlStagingIndex ON crawl_staging (path);')
+    nDirs = 0
+    nUnchanged = 0
+    for shardFile, n, nl, nu, busy in results:
+        nDirs += n
+        nUnchanged += nu
+        session.execute('ATTACH DATABASE ? AS shard;', (shardFile,))
+        with session.transaction():
+            session.execute('INSERT OR REPLACE INTO crawl_staging SELECT * FROM shard.directories;')
+        session.execute('DETACH DATABASE shard;')
+        os.remove(shardFile)
+    shutil.rmtree(shardDir)
+
+    # replace directories table with staging table
+    with session.transaction():
+        session.execute('DROP TABLE directories;')
+        session.execute('ALTER TABLE crawl_staging RENAME TO directories;')
+        session.execute('DROP INDEX crawlStagingIndex;')
+        session.execute('CREATE UNIQUE INDEX directoryIndex ON directories (path);')
+    nLeaves = session.query('select count(*) from directories where hasFiles = 1;')[0][0]
+
+    print()
+    print('Directories     : ' + str(nDirs))
+    print('Unchanged dirs  : ' + str(nUnchanged))
+    print()
+
+    return nLeaves
+
+def createFilename(xmlOutputDir, pathMeta):
+    """
+    fn = createFilename(xmlOutputDir, pathMeta)
+
+    Function contains the logic to create output filenames for a given output
+    directory and path metadata.
+
+    Inputs:
+        xmlOutputDir (string): directory which contains the xml file tree (e.g., '/data/goes/here/')
+        pathMeta (dictionary): dictionary object containing necesary metadata to create filename (specified below)
+
+    Returns:
+        fn (string)
+
+    pathMeta contains the following keys:
+        mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version
+
+    """
+    reDec = re.compile(r'decadal[0-9]{4}')
+    if not not re.search(reDec, pathMeta['experiment']):
+        experimentPath = 'decadal'
+    else:
+        experimentPath = pathMeta['experiment']
+    # output filename
+    if pathMeta['frequency'] == 'fx':
+        fn = xmlOutputDir + '/' + pathMeta['mip_era'] + '/' + pathMeta['frequency'] + '/' + pathMeta['variable'] + '/' + pathMeta['mip_era'] + '.' + pathMeta['activity'] + '.' + pathMeta['experiment'] + '.' + pathMeta['institute'] + '.' + pathMeta['model'] + '.' + pathMeta['member'] + '.' + pathMeta['frequency'] + '.' + pathMeta['variable'] + '.' + pathMeta['realm'] + '.' + pathMeta['gridLabel'] + '.' + pathMeta['version'] + '.0000000.0.xml'
     else:
-        nfscan = len(data_directories)
+        fn = xmlOutputDir + '/' + pathMeta['mip_era'] + '/' + pathMeta['activity'] + '/' + experimentPath + '/' + pathMeta['realm'] + '/' + pathMeta['frequency'] + '/' + pathMeta['variable'] + '/' + pathMeta['mip_era'] + '.' + pathMeta['activity'] + '.' + pathMeta['experiment'] + '.' + pathMeta['institute'] + '.' + pathMeta['model'] + '.' + pathMeta['member'] + '.' + pathMeta['frequency'] + '.' + pathMeta['variable'] + '.' + pathMeta['realm'] + '.' + pathMeta['gridLabel'] + '.' + pathMeta['version'] + '.0000000.0.xml'
+    fn = fn.replace('//','/')
 
-    print('Using ' + str(nfscan) + ' processors to check ' + str(len(data_directories)) + ' directories...', end='\n \n')
+    return fn
 
-    results = Parallel(n_jobs=nfscan)(delayed(findDiskPaths)(parent)\
-           for (parent) in data_directories)
-    diskStat = {}
-    for d in results:
-        keys = d.keys()
-        for key in keys:
-            diskStat[key] = d[key]
-    return diskStat
+# cdscan entry point used for in-process scans (see loadCdscan)
+cdscanMain = None
 
-def createLookupDictionary(paths, outfile='data/cmipMeta.pkl'):
+def loadCdscan():
     """
-    createLookupDictionary(paths, outfile='data/cmipMeta.pkl')
+    cdscanMain = loadCdscan()
 
-    Function processes a bunch of paths and stores a dictionary file with
-    metadata lookup information. This allows you to quickly determine a path's
-    frequency, realm, and dimensions (which are not contained in the directory
-    structure).
+    Function imports the cdscan entry point from cdms2 so that xml files can
+    be written in the current process (see xmlWrite). This is done once in
+    each scan worker (see scanWorker) so that the cost of starting python and
+    importing cdms2 is not paid for every directory. If cdms2 is not
+    available, None is returned and xmlWrite will call the cdscan script.
+
+    Returns:
+        cdscanMain (function or None)
+
+    """
+    global cdscanMain
+    try:
+        from cdms2.cdscan import main
+        cdscanMain = main
+    except ImportError:
+        cdscanMain = None
+    return cdscanMain
+
+# longest list of file names (characters) passed to the cdscan script as
+# arguments (longer lists are written to a file and passed with cdscan -f)
+cdscanMaxArgLength = 100000
+
+def cdscanArgs(outfile, files):
+    """
+    args, listFile = cdscanArgs(outfile, files)
+
+    Function returns the argument list used to call the cdscan script for a
+    list of files (no shell is used, so file names are never expanded or
+    split). If the file names are longer than cdscanMaxArgLength, they are
+    written to a file (outfile + '.files'), which is passed to cdscan with
+    the -f option and should be removed after the scan.
 
     Inputs:
-            paths (list)
-            outfile (string filename), default 'data/cmipMeta.pkl'
-            variable: e.g. 'ta'
-            dictObj: pickle file (dictionary) that returns appropriate outputs for given inputs.
-    """
-    dictObj = {}
-    for i, p in enumerate(paths):
-        if np.mod(i,10000) == 0:
-            print(str(i) + '/' + str(len(paths)))
-        validPath, keyId, mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version = parsePath(p)
-        if validPath:
-            key = '.'.join([mip_era, cmipTable, variable])
-        else:
-            continue
-        if key in dictObj:
-            continue
-        else:
+        outfile (string): xml file to write
+        files (list): files to scan
+
+    Returns:
+        args (list): cdscan command and arguments
+        listFile (string): file listing the files to scan (or None)
+
+    """
+    if sum([len(fn) + 1 for fn in files]) <= cdscanMaxArgLength:
+        return ['cdscan', '-x', outfile] + files, None
+    listFile = outfile + '.files'
+    with open(listFile, 'w') as f:
+        f.write('\n'.join(files) + '\n')
+    return ['cdscan', '-x', outfile, '-f', listFile], listFile
+
+def xmlWrite(inpath, outfile, files=None, timeout=None):
+    """
+    xmlWrite(inpath, outfile, files=None, timeout=None)
+
+    Function calls cdscan to create an xml file (outfile) for a given
+    directory of CMIP data (inpath). If the cdscan entry point has been
+    loaded (see loadCdscan), cdscan is run in the current process and its
+    output (including any python traceback, warnings, and messages written
+    by the netCDF / HDF5 libraries) is captured. Otherwise, the
+    cdscan script is called in a subprocess (see cdscanArgs), which is
+    killed if it runs for more than timeout seconds. If the subprocess is
+    killed by a signal (e.g., when the system is out of memory), this is
+    noted in err so that the path is scanned again (see errorCategoryDefaults).
+
+    Inputs:
+        inpath (string): directory containing input files
+        outfile (string): xml file to write
+        files (optional, list): files to scan (default is all netCDF files in inpath)
+        timeout (optional, float): seconds before a cdscan subprocess is killed (default None)
+
+    Returns:
+        out, err: command output and error message strings
+
+    """
+    if files is None:
+        files = glob.glob((inpath + '/*.nc').replace('//', '/'))
+    files = sorted(files)
+    if cdscanMain is None:
+        args, listFile = cdscanArgs(outfile, files)
+        try:
+            p = Popen(args, stdout=PIPE, stderr=PIPE)
             try:
-                frequency, realm, dimensions = lookupCMIPMetadata(mip_era, cmipTable, variable)
-                dictObj[key] = [frequency, realm, dimensions]
-            except:
-                continue
-    with open(outfile, 'wb') as f:
-        pickle.dump(dictObj, f, pickle.HIGHEST_PROTOCOL)
+                out, err = p.communicate(timeout=timeout)
+                timedOut = False
+            except TimeoutExpired:
+                p.kill()
+                out, err = p.communicate()
+                timedOut = True
+        finally:
+            if listFile is not None:
+                os.remove(listFile)
+        out = out.decode(errors='replace')
+        err = err.decode(errors='replace')
+        if timedOut:
+            if os.path.exists(outfile):
+                os.remove(outfile)
+            err += '\nScan timed out after ' + str(int(timeout)) + 's'
+        elif p.returncode < 0:
+            # e.g., killed by the kernel when the system is out of memory
+            err += '\nScan worker exited unexpectedly (signal ' + str(-p.returncode) + ')'
+        return out, err
+    # redirect the stdout / stderr file descriptors (which the netCDF / HDF5
+    # libraries write to) as well as sys.stdout / sys.stderr, and always show
+    # warnings (which are otherwise only shown once per worker process)
+    outFile = tempfile.TemporaryFile(mode='w+', errors='replace')
+    errFile = tempfile.TemporaryFile(mode='w+', errors='replace')
+    sys.stdout.flush()
+    sys.stderr.flush()
+    savedFds = [os.dup(1), os.dup(2)]
+    try:
+        os.dup2(outFile.fileno(), 1)
+        os.dup2(errFile.fileno(), 2)
+        with contextlib.redirect_stdout(outFile), contextlib.redirect_stderr(errFile), warnings.catch_warnings():
+            warnings.simplefilter('always')
+            try:
+                cdscanMain(['cdscan', '-x', outfile] + files)
+            except SystemExit:
+                pass
+            except Exception:
+                traceback.print_exc()
+            outFile.flush()
+            errFile.flush()
+    finally:
+        os.dup2(savedFds[0], 1)
+        os.dup2(savedFds[1], 2)
+        os.close(savedFds[0])
+        os.close(savedFds[1])
+    outFile.seek(0)
+    errFile.seek(0)
+    out = outFile.read()
+    err = errFile.read()
+    outFile.close()
+    errFile.close()
+    return out, err
 
-def getCMIPMeta(outfile='data/cmipMeta.pkl'):
+async def cdscanProcess(outfile, files, timeout=None, maxMemory=None, pollInterval=1.):
     """
-    dictObj = getCMIPMeta(outfile='data/cmipMeta.pkl')
+    out, err = await cdscanProcess(outfile, files, timeout=None, maxMemory=None, pollInterval=1.)
 
-    Function reads the CMIP Metadata pickle file and returns the information
-    as an in-memory dictionary.
+    Coroutine that runs the cdscan script in a subprocess (started with
+    asyncio.create_subprocess_exec, see cdscanArgs) to write an xml file
+    for a list of files. Every pollInterval seconds the subprocess is
+    checked and it is killed if it has run for more than timeout seconds or
+    its resident memory exceeds maxMemory bytes. The reason is appended to
+    err and any partial xml file is removed (a subprocess that is killed by
+    any other signal is also noted in err). If the coroutine is cancelled,
+    the subprocess is killed.
+
+    Inputs:
+        outfile (string): xml file to write
+        files (list): files to scan
+        timeout (optional, float): seconds before the subprocess is killed (default None)
+        maxMemory (optional, float): memory (bytes) above which the subprocess is killed (default None)
+        pollInterval (optional, float): seconds between checks of the subprocess (default 1)
+
+    Returns:
+        out, err: command output and error message strings
 
     """
-    with open(outfile, 'rb') as f:
-        dictObj = pickle.load(f)
-    return dictObj
+    args, listFile = cdscanArgs(outfile, sorted(files))
+    proc = None
+    communicate = None
+    try:
+        proc = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        communicate = asyncio.ensure_future(proc.communicate())
+        start = time.time()
+        killed = None
+        while not communicate.done():
+            await asyncio.wait([communicate], timeout=pollInterval)
+            if communicate.done():
+                break
+            if (timeout is not None) and (time.time() - start > timeout):
+                killed = 'Scan timed out after ' + str(int(timeout)) + 's'
+            elif (maxMemory is not None) and (processMemory(proc.pid) > maxMemory):
+                killed = 'Scan exceeded memory limit (' + str(np.round(maxMemory / 1e9, 1)) + ' GB)'
+            if killed is not None:
+                proc.kill()
+                break
+        out, err = await communicate
+    finally:
+        if (communicate is not None) and (not communicate.done()):
+            communicate.cancel()
+        if (proc is not None) and (proc.returncode is None):
+            proc.kill()
+            await proc.wait()
+        if listFile is not None:
+            os.remove(listFile)
+    out = out.decode(errors='replace')
+    err = err.decode(errors='replace')
+    if killed is not None:
+        if os.path.exists(outfile):
+            os.remove(outfile)
+        err += '\n' + killed
+    elif proc.returncode < 0:
+        err += '\nScan worker exited unexpectedly (signal ' + str(-proc.returncode) + ')'
+    return out, err
 
-def createFilename(xmlOutputDir, pathMeta):
+def parseFilemap(filemap):
     """
-    fn = createFilename(xmlOutputDir, pathMeta)
+    filemap = parseFilemap(filemap)
 
-    Function contains the logic to create output filenames for a given output
-    directory and path metadata.
+    Function parses the cdms_filemap attribute of a cdscan xml file, e.g.,
+
+        [[[tas],[[0,1200,-,-,-,f1.nc],[1200,1872,-,-,-,f2.nc]]],[[lat_bnds],[[-,-,-,-,-,f1.nc]]]]
+
+    into nested lists of strings: [[variables, entries], ...] where each
+    entry is [timeStart, timeEnd, levelStart, levelEnd, ensemble, filename]
+    (with '-' for dimensions that are not split across files).
+
+    """
+    stack = [[]]
+    for token in re.findall(r'\[|\]|[^\[\],]+', filemap):
+        if token == '[':
+            stack.append([])
+        elif token == ']':
+            item = stack.pop()
+            stack[-1].append(item)
+        else:
+            stack[-1].append(token.strip())
+    return stack[0][0]
+
+def formatFilemap(filemap):
+    """
+    filemap = formatFilemap(filemap)
+
+    Function writes a parsed cdms_filemap (see parseFilemap) back to a string.
+
+    """
+    if isinstance(filemap, list):
+        return '[' + ','.join([formatFilemap(item) for item in filemap]) + ']'
+    return filemap
+
+def getAxisValues(axis):
+    """
+    values = getAxisValues(axis)
+
+    Function returns the values of an axis element from a cdscan xml file as
+    a list of strings. Axes can list their values explicitly (e.g.,
+    [ 15.5 45. 74.5]) or as a <linear start= delta= length=/> element.
+
+    """
+    linear = axis.find('linear')
+    if linear is not None:
+        start = float(linear.get('start'))
+        delta = float(linear.get('delta'))
+        return [repr(start + i * delta) for i in range(int(linear.get('length')))]
+    return (axis.text or '').replace('[', ' ').replace(']', ' ').split()
+
+def elementSignature(element):
+    """
+    signature = elementSignature(element)
+
+    Function returns the tag, attributes, text, and children of an xml
+    element (ignoring whitespace) so that elements can be compared.
+
+    """
+    return (element.tag, sorted(element.attrib.items()), (element.text or '').split(), [elementSignature(child) for child in element])
+
+def mergeXml(oldFile, newFile, outfile):
+    """
+    mergeXml(oldFile, newFile, outfile)
+
+    Function combines a cdscan xml file (oldFile) with a cdscan xml file of
+    files that continue its time axis (newFile) and writes the result to
+    outfile. The time axis (the axis with a partition) is extended and the
+    new files are added to the file map (with their time indices offset by
+    the length of the old time axis). The datasets must have the same
+    variables and non-time axes, the same time units and calendar, and the
+    new time values must follow the old values, otherwise a ValueError is
+    raised (and outfile is not written).
 
     Inputs:
-        xmlOutputDir (string): directory which contains the xml file tree (e.g., '/data/goes/here/')
-        pathMeta (dictionary): dictionary object containing necesary metadata to create filename (specified below)
+        oldFile (string): xml file of the existing files
+        newFile (string): xml file of the new files
+        outfile (string): xml file to write
+
+    """
+    with open(oldFile) as f:
+        raw = f.read()
+    header = raw[:raw.find('<dataset')]
+    old = ElementTree.fromstring(raw)
+    new = ElementTree.parse(newFile).getroot()
+    if (old.get('directory') or '').rstrip('/') != (new.get('directory') or '').rstrip('/'):
+        raise ValueError('Datasets are in different directories')
+
+    # axes
+    oldAxes = {axis.get('id') : axis for axis in old.findall('axis')}
+    newAxes = {axis.get('id') : axis for axis in new.findall('axis')}
+    timeIds = [aid for aid, axis in oldAxes.items() if axis.get('partition') is not None]
+    if (len(timeIds) != 1) or (set(oldAxes) != set(newAxes)):
+        raise ValueError('Datasets have different axes')
+    tid = timeIds[0]
+    oldTime = oldAxes[tid]
+    newTime = newAxes[tid]
+    for attr in ['units', 'calendar', 'datatype']:
+        if oldTime.get(attr) != newTime.get(attr):
+            raise ValueError('Time axis ' + attr + ' differs')
+    for aid in oldAxes:
+        if (aid != tid) and (elementSignature(oldAxes[aid]) != elementSignature(newAxes[aid])):
+            raise ValueError('Axis ' + aid + ' differs')
+    oldValues = getAxisValues(oldTime)
+    newValues = getAxisValues(newTime)
+    nOld = len(oldValues)
+    if (nOld == 0) or (len(newValues) == 0) or (float(newValues[0]) <= float(oldValues[-1])):
+        raise ValueError('New time values do not follow the existing time values')
+
+    # variables
+    oldVars = {var.get('id') : var for var in old.findall('variable')}
+    newVars = {var.get('id') : var for var in new.findall('variable')}
+    if set(oldVars) != set(newVars):
+        raise ValueError('Datasets have different variables')
+    for vid, var in oldVars.items():
+        oldDomain = var.findall('domain/domElem')
+        newDomain = newVars[vid].findall('domain/domElem')
+        if (var.get('datatype') != newVars[vid].get('datatype')) or ([e.get('name') for e in oldDomain] != [e.get('name') for e in newDomain]):
+            raise ValueError('Variable ' + vid + ' differs')
+        for oldElem, newElem in zip(oldDomain, newDomain):
+            if oldElem.get('name') == tid:
+                oldElem.set('length', str(int(oldElem.get('length')) + int(newElem.get('length'))))
+            elif oldElem.get('length') != newElem.get('length'):
+                raise ValueError('Variable ' + vid + ' differs')
+
+    # file map
+    oldMap = parseFilemap(old.get('cdms_filemap'))
+    newMap = parseFilemap(new.get('cdms_filemap'))
+    oldGroups = {tuple(group[0]) : group[1] for group in oldMap}
+    newGroups = {tuple(group[0]) : group[1] for group in newMap}
+    if set(oldGroups) != set(newGroups):
+        raise ValueError('Datasets have different file maps')
+    for key, entries in newGroups.items():
+        timeSplit = entries[0][0] != '-'
+        if timeSplit != (oldGroups[key][0][0] != '-'):
+            raise ValueError('Datasets have different file maps')
+        if timeSplit:
+            for entry in entries:
+                oldGroups[key].append([str(int(entry[0]) + nOld), str(int(entry[1]) + nOld)] + entry[2:])
+    old.set('cdms_filemap', formatFilemap(oldMap))
+
+    # time axis
+    oldLinear = oldTime.find('linear')
+    newLinear = newTime.find('linear')
+    if (oldLinear is not None) and (newLinear is not None) and (oldLinear.get('delta') == newLinear.get('delta')) \
+       and np.isclose(float(newValues[0]), float(oldValues[-1]) + float(oldLinear.get('delta'))):
+        oldLinear.set('length', str(nOld + len(newValues)))
+    else:
+        if oldLinear is not None:
+            oldTime.remove(oldLinear)
+        oldTime.text = '[' + ' '.join(oldValues + newValues) + ']'
+    partition = [int(p) for p in oldTime.get('partition').strip('[]').split()]
+    partition += [int(p) + nOld for p in newTime.get('partition').strip('[]').split()]
+    oldTime.set('partition', '[' + ' '.join([str(p) for p in partition]) + ']')
+    oldTime.set('length', str(nOld + len(newValues)))
+    if (oldTime.get('partition_length') is not None) and (newTime.get('partition_length') is not None):
+        oldTime.set('partition_length', str(int(oldTime.get('partition_length')) + int(newTime.get('partition_length'))))
+
+    with open(outfile, 'w') as f:
+        f.write(header + ElementTree.tostring(old, encoding='unicode') + '\n')
+
+def appendFiles(inpath, outfile):
+    """
+    newFiles = appendFiles(inpath, outfile)
+
+    Function finds the files to scan to update the xml file of a directory
+    that has only gained new files since its last scan (see appendXml). The
+    previous xml file (outfile + '.prev', set aside by
+    updateDatabaseHoldings) can be used if every file it maps is still
+    present and has not been modified since it was written. If no files
+    were added, the previous xml file is moved to outfile and an empty list
+    is returned. None is returned (and the previous xml file is removed) if
+    the previous xml file cannot be used.
+
+    Inputs:
+        inpath (string): directory containing input files
+        outfile (string): xml file to write
 
     Returns:
-        fn (string)
+        newFiles (list): files to scan (see appendMerge) or None
 
-    pathMeta contains the following keys:
-        mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version
+    """
+    prevFile = outfile + '.prev'
+    if not os.path.exists(prevFile):
+        return None
+    newFiles = None
+    try:
+        root = ElementTree.parse(prevFile).getroot()
+        if (root.get('directory') or '').rstrip('/') != inpath.rstrip('/'):
+            return None
+        # all previous files must be present and unmodified
+        prevTime = os.stat(prevFile).st_mtime
+        oldFiles = set([entry[-1] for group in parseFilemap(root.get('cdms_filemap')) for entry in group[1]])
+        files = {os.path.basename(fn) : fn for fn in glob.glob((inpath + '/*.nc').replace('//', '/'))}
+        for fn in oldFiles:
+            if (fn not in files) or (os.stat(files[fn]).st_mtime > prevTime):
+                return None
+        newFiles = [files[fn] for fn in files if fn not in oldFiles]
+        if len(newFiles) == 0:
+            os.replace(prevFile, outfile)
+        return newFiles
+    except (ValueError, KeyError, TypeError, IndexError, OSError, ElementTree.ParseError):
+        newFiles = None
+        return None
+    finally:
+        if (newFiles is None) and os.path.exists(prevFile):
+            os.remove(prevFile)
+
+def appendMerge(outfile, err):
+    """
+    appended = appendMerge(outfile, err)
+
+    Function merges the previous xml file of a directory (outfile + '.prev')
+    with the xml file of its new files (outfile + '.new', see appendFiles)
+    into outfile (see mergeXml). False is returned (and the directory
+    should be scanned in full) if the scan of the new files failed (err is
+    None) or has warnings (see ErrorClassifier), or the xml files cannot be
+    merged. The previous and new xml files are always removed.
+
+    Inputs:
+        outfile (string): xml file to write
+        err: error message returned by the scan of the new files (or None)
+
+    Returns:
+        appended (boolean): True if outfile was written
+
+    """
+    prevFile = outfile + '.prev'
+    newFile = outfile + '.new'
+    try:
+        if (err is None) or (not os.path.exists(prevFile)) or (not os.path.exists(newFile)):
+            return False
+        codes = errorClassifier.classify(err)
+        if any([errorClassifier.categories[code][1] == 'warning' for code in codes]):
+            return False
+        mergeXml(prevFile, newFile, outfile)
+        return True
+    except (ValueError, KeyError, TypeError, IndexError, OSError, ElementTree.ParseError):
+        return False
+    finally:
+        for fn in [prevFile, newFile]:
+            if os.path.exists(fn):
+                os.remove(fn)
+
+def appendXml(inpath, outfile, timeout=None):
+    """
+    appended = appendXml(inpath, outfile, timeout=None)
+
+    Function updates the xml file of a directory that has only gained new
+    files since its last scan. The previous xml file (outfile + '.prev', set
+    aside by updateDatabaseHoldings) is used if every file it maps is still
+    present and has not been modified since it was written (see
+    appendFiles). Only the new files are scanned (see xmlWrite) and the
+    result is merged with the previous xml file (see appendMerge). If no
+    files were added, the previous xml file is reused.
+
+    False is returned (and the directory should be scanned in full) if there
+    is no previous xml file, existing files were removed or modified, the
+    scan of the new files has warnings (see ErrorClassifier), or the xml
+    files cannot be merged. The previous xml file is always removed.
+
+    Inputs:
+        inpath (string): directory containing input files
+        outfile (string): xml file to write
+        timeout (optional, float): seconds before a cdscan subprocess is killed (see xmlWrite)
+
+    Returns:
+        appended (boolean): True if outfile was written
+
+    """
+    newFiles = appendFiles(inpath, outfile)
+    if newFiles is None:
+        return False
+    if len(newFiles) == 0:
+        return True
+    err = None
+    try:
+        out, err = xmlWrite(inpath, outfile + '.new', files=newFiles, timeout=timeout)
+    finally:
+        appended = appendMerge(outfile, err)
+    return appended
+
+def copyXml(sourceXml, inpath, outfile):
+    """
+    copied = copyXml(sourceXml, inpath, outfile)
+
+    Function writes the xml file of a directory (inpath) that has the same
+    files (the same manifest, see createManifest) as the directory of an
+    existing xml file (sourceXml). The existing xml file is copied with its
+    directory pointed at inpath, so no files need to be scanned. False is
+    returned (and the directory should be scanned) if sourceXml cannot be
+    read or any file it maps is not in inpath.
+
+    Inputs:
+        sourceXml (string): existing xml file
+        inpath (string): directory containing input files
+        outfile (string): xml file to write
+
+    Returns:
+        copied (boolean): True if outfile was written
+
+    """
+    try:
+        with open(sourceXml) as f:
+            raw = f.read()
+        root = ElementTree.fromstring(raw)
+        for group in parseFilemap(root.get('cdms_filemap')):
+            for entry in group[1]:
+                if not os.path.exists(os.path.join(inpath, entry[-1])):
+                    return False
+        root.set('directory', inpath)
+        with open(outfile, 'w') as f:
+            f.write(raw[:raw.find('<dataset')] + ElementTree.tostring(root, encoding='unicode') + '\n')
+        return True
+    except (ValueError, KeyError, TypeError, IndexError, OSError, ElementTree.ParseError):
+        return False
+
+def reuseXml(pathMeta, inpath, fn, timeout=None, append=True):
+    """
+    reused = reuseXml(pathMeta, inpath, fn, timeout=None, append=True)
+
+    Function writes the xml file (fn) of a directory without scanning all
+    of its files, if possible. The xml file of another directory with
+    identical files (pathMeta['sourceXml']) is copied (see copyXml) or, if
+    append is True, the previous xml file of the directory is updated with
+    any new files (see appendXml). None is returned if the directory needs
+    a full scan (or an append, if append is False).
+
+    Inputs:
+        pathMeta (dictionary): path metadata (see getScanList)
+        inpath (string): directory which contains the netCDF data to process
+        fn (string): xml file to write
+        timeout (optional, float): seconds before a cdscan subprocess is killed (see xmlWrite)
+        append (optional, boolean): update the previous xml file if it is not copied (default True)
+
+    Returns:
+        reused (string): 'copied', 'appended', or None
+
+    """
+    sourceXml = pathMeta['sourceXml'] if 'sourceXml' in pathMeta else None
+    if sourceXml and copyXml(sourceXml, inpath, fn):
+        if os.path.exists(fn + '.prev'):
+            os.remove(fn + '.prev')
+        return 'copied'
+    if append and appendXml(inpath, fn, timeout=timeout):
+        return 'appended'
+    return None
+
+# default error categories (see ErrorClassifier), used to seed the
+# errorCategories table (see migrationErrorCategories). Each row is
+# [code, category, kind, pattern, position, transient]: kind is 'error' (the
+# xml file was not written) or 'warning' (the xml file was written), pattern
+# is a regular expression searched for in the cdscan output (None for
+# categories that are assigned directly), position is the digit of the
+# warning code in the xml filename that the warning sets (or None), and
+# transient errors are scanned again later (see scanListQuery).
+errorCategoryDefaults = [[1, 'No write', 'error', None, None, 0],
+                         [2, 'No write: filesize of zero', 'error', None, None, 0],
+                         [3, 'No write: CDMS I/O Error', 'error', r'CDMS I/O error: End of file', None, 1],
+                         [4, 'RuntimeError: Dimension time in files', 'error', r'RuntimeError: Dimension time in files', None, 0],
+                         [5, 'CDMS I/O error: Determining type of file', 'error', r'CDMS I/O error: Determining type of file', None, 0],
+                         [6, 'Cannot allocate memory', 'error', r'Cannot allocate memory', None, 1],
+                         [7, 'Invalid relative time units', 'error', r'Invalid relative time units', None, 0],
+                         [8, 'Scan timed out', 'error', r'Scan timed out', None, 1],
+                         [9, 'Scan exceeded memory limit', 'error', r'Scan exceeded memory limit', None, 1],
+                         [10, 'Python Error', 'error', None, None, 1],
+                         [11, 'retracted', 'error', None, None, 0],
+                         [12, 'Scan worker exited unexpectedly', 'error', r'Scan worker exited unexpectedly', None, 1],
+                         [101, 'Warning: dimension time contains values in file', 'warning', r'dimension time contains values in file', 0, 0],
+                         [102, 'Warning: axis values for axis time are not monotonic', 'warning', r'Warning: Axis values for axis time are not monotonic', 1, 0],
+                         [103, 'Warning: resetting latitude values', 'warning', r'Warning: resetting latitude values', 2, 0],
+                         [104, 'Warning: zero infile size', 'warning', r'zero infile size', 3, 0],
+                         [105, 'Warning: dimension time overlaps file', 'warning', r'dimension time overlaps file', 4, 0],
+                         [106, 'Warning: first bounds', 'warning', r'Your first bounds', 5, 0],
+                         [107, 'Warning: python error', 'warning', r'Traceback \(most recent call last\)', 6, 0]]
+
+class ErrorClassifier(object):
+    """
+    classifier = ErrorClassifier(categories)
+
+    Classifies cdscan output (see errorLogic) using a table of error
+    categories (see errorCategoryDefaults). The patterns of all categories
+    are compiled into a single regular expression (one named group per
+    distinct pattern), so each error stream is searched once, no matter how
+    many categories there are. Patterns should not overlap (if they do,
+    only the first category in code order is matched at that position).
+
+        codes = classifier.classify(err)
+
+    Inputs:
+        categories (list): rows of [code, category, kind, pattern, position, transient]
+
+    """
+
+    def __init__(self, categories):
+        self.categories = {}
+        self.codes = {}
+        self.groups = {}
+        patterns = []
+        for code, category, kind, pattern, position, transient in sorted(categories, key=lambda row: row[0]):
+            self.categories[code] = (category, kind, position, bool(transient))
+            self.codes[category] = code
+            if not pattern:
+                continue
+            if pattern not in patterns:
+                patterns.append(pattern)
+            self.groups.setdefault('g' + str(patterns.index(pattern)), []).append(code)
+        if len(patterns) > 0:
+            self.regex = re.compile('|'.join(['(?P<g' + str(i) + '>' + pattern + ')' for i, pattern in enumerate(patterns)]))
+        else:
+            self.regex = None
+
+    def classify(self, err):
+        """
+        codes = classifier.classify(err)
+
+        Returns the sorted codes of the categories matched in err.
+
+        """
+        codes = set()
+        if self.regex is not None:
+            for match in self.regex.finditer(str(err)):
+                codes.update(self.groups[match.lastgroup])
+        return sorted(codes)
+
+    def code(self, category):
+        """
+        code = classifier.code(category)
+
+        Returns the code of a category (or None).
+
+        """
+        return self.codes.get(category)
+
+    def category(self, code):
+        """
+        category = classifier.category(code)
+
+        Returns the name of a category (or None).
+
+        """
+        if code not in self.categories:
+            return None
+        return self.categories[code][0]
+
+    def transient(self, code):
+        """
+        transient = classifier.transient(code)
+
+        Returns True if errors in a category are transient (i.e., the path
+        should be scanned again later).
 
-    """
-    reDec = re.compile(r'decadal[0-9]{4}')
-    if not not re.search(reDec, pathMeta['experiment']):
-        experimentPath = 'decadal'
-    else:
-        experimentPath = pathMeta['experiment']
-    # output filename
-    if pathMeta['frequency'] == 'fx':
-        fn = xmlOutputDir + '/' + pathMeta['mip_era'] + '/' + pathMeta['frequency'] + '/' + pathMeta['variable'] + '/' + pathMeta['mip_era'] + '.' + pathMeta['activity'] + '.' + pathMeta['experiment'] + '.' + pathMeta['institute'] + '.' + pathMeta['model'] + '.' + pathMeta['member'] + '.' + pathMeta['frequency'] + '.' + pathMeta['variable'] + '.' + pathMeta['realm'] + '.' + pathMeta['gridLabel'] + '.' + pathMeta['version'] + '.0000000.0.xml'
-    else:
-        fn = xmlOutputDir + '/' + pathMeta['mip_era'] + '/' + pathMeta['activity'] + '/' + experimentPath + '/' + pathMeta['realm'] + '/' + pathMeta['frequency'] + '/' + pathMeta['variable'] + '/' + pathMeta['mip_era'] + '.' + pathMeta['activity'] + '.' + pathMeta['experiment'] + '.' + pathMeta['institute'] + '.' + pathMeta['model'] + '.' + pathMeta['member'] + '.' + pathMeta['frequency'] + '.' + pathMeta['variable'] + '.' + pathMeta['realm'] + '.' + pathMeta['gridLabel'] + '.' + pathMeta['version'] + '.0000000.0.xml'
-    fn = fn.replace('//','/')
+        """
+        return (code in self.categories) and self.categories[code][3]
 
-    return fn
+# error classifier used by errorLogic (see loadErrorCategories)
+errorClassifier = ErrorClassifier(errorCategoryDefaults)
 
-def xmlWrite(inpath, outfile):
+def loadErrorCategories(sqlDB):
     """
-    xmlWrite(inpath, outfile)
+    classifier = loadErrorCategories(sqlDB)
 
-    Function calls cdscan to create an xml file (outfile) for a given
-    directory of CMIP data (inpath).
+    Function loads the error categories from the errorCategories table (so
+    new categories can be added without changing the code) and uses them
+    to classify scan errors (see errorLogic). This should be called before
+    the scan workers are started (see ScanPool), so that they inherit the
+    categories. The default categories are kept if the table does not exist.
 
     Inputs:
-        inpath (string): directory containing input files
-        outfile (string): xml file to write
+        sqlDB: string filename
 
     Returns:
-        out, err: command output and error message strings
+        classifier (ErrorClassifier)
 
     """
-    cmd = 'cdscan -x ' + outfile + ' ' + inpath + '/*.nc'
-    cmd = cmd.replace('//', '/')
-    p = Popen(cmd,shell=True,stdout=PIPE,stderr=PIPE)
-    out,err = p.communicate()
-    return out, err
+    global errorClassifier
+    try:
+        rows = getSession(sqlDB).query('SELECT code, category, kind, pattern, position, transient FROM errorCategories;')
+    except sqlite3.OperationalError:
+        rows = []
+    if len(rows) > 0:
+        errorClassifier = ErrorClassifier(rows)
+    return errorClassifier
 
 def errorLogic(fn, inpath, err):
     """
-    fn, err = errorLogic(fn, inpath, err)
+    fn, error, errorCode = errorLogic(fn, inpath, err)
 
-    Function processes error messages and groups the errors into a subset of categories. It then
-    renames the xmlFile (if present) to reflect these errors.
+    Function classifies the output of a scan (see ErrorClassifier). If the xml
+    file was not written, the error is the first matching error category
+    (in code order). If it was written, the xmlFile is renamed to reflect
+    any warnings (each warning category sets one digit of the seven digit
+    code in the filename, e.g., '.0010000.0.xml').
 
     Inputs:
         fn (string): xml filename
@@ -717,45 +2446,50 @@ def errorLogic(fn, inpath, err):
     Returns:
         fn: final filename
         error: processed error message
+        errorCode (int): code of the error (or first warning) category (None if there are no errors)
 
     """
-    # check for zero sized files and other no write errors (if there xml did not write)
-    zeroSize = False
+    err = str(err)
+    codes = errorClassifier.classify(err)
     error = None
+    errorCode = None
+    # check for zero sized files and other no write errors (if there xml did not write)
     if not os.path.exists(fn):
         fiter = glob.glob(inpath + '/*.nc')
         fn = None
+        zeroSize = False
         for fnc in fiter:
             fsize = os.path.getsize(fnc)
             if fsize == 0:
                 zeroSize = True
                 break
+        errors = [code for code in codes if errorClassifier.categories[code][1] == 'error']
         if zeroSize:
-            error = 'No write: filesize of zero'
-        elif str(err).find('CDMS I/O error: End of file') >= 0:
-            error = 'No write: CDMS I/O Error'
-        elif str(err).find('RuntimeError: Dimension time in files') >= 0:
-            error = 'RuntimeError: Dimension time in files'
-        elif str(err).find('CDMS I/O error: Determining type of file') >= 0:
-            error = 'CDMS I/O error: Determining type of file'
-        elif str(err).find('Cannot allocate memory') >= 0:
-            error = 'Cannot allocate memory'
-        elif str(err).find('Invalid relative time units') >= 0:
-            error = 'Invalid relative time units'
+            errorCode = errorClassifier.code('No write: filesize of zero')
+        elif len(errors) > 0:
+            errorCode = errors[0]
         else:
-            error = 'No write'
+            errorCode = errorClassifier.code('No write')
+        error = errorClassifier.category(errorCode)
     else:
         # if xml wrote to disk, update error codes in filename
-        errors = getWarnings(str(err))
-        if len(errors) > 0:
-            errorCode = parseWarnings(errors)
-            fnNew = fn.replace('0000000',errorCode)
-            os.rename(fn, fnNew)
-            fn = fnNew
+        warnings = [code for code in codes if errorClassifier.categories[code][1] == 'warning']
+        if len(warnings) > 0:
+            errorCode = warnings[0]
+            flags = list('0000000')
+            for code in warnings:
+                position = errorClassifier.categories[code][2]
+                if position is not None:
+                    flags[position] = '1'
+            fnNew = fn.replace('0000000', ''.join(flags))
+            if fnNew != fn:
+                os.rename(fn, fnNew)
+                fn = fnNew
+            errors = getWarnings(err)
             if len(errors) > 255:
                 errors = errors[0:255]
                 error = errors
-    return fn, error
+    return fn, error, errorCode
 
 def getWarnings(err):
     """
@@ -789,46 +2523,6 @@ def getWarnings(err):
 
     return errorCode
 
-def parseWarnings(err):
-    """
-    errorCode = parseWarnings(err)
-
-    Function parses subsetted warning messages for exact error code [0-6].
-
-    Inputs:
-        err: Subsetted warning from getWarning.
-
-    Returns:
-        errorCode: string specifying error category (details below)
-
-    '0000000'   - no warnings
-     1          - dimension time contains values...
-      1         - Warning, Axis values for axis are not monotonic...
-       1        - Warning: resetting latitude values...
-        1       - Zero infile size
-         1      - Dimension time overlaps...
-          1     - Your first bounds...
-           1    - Python error ...
-
-    """
-    errorCode = list('0000000')
-    if err.find('dimension time contains values in file') >= 0:
-        errorCode[0] = '1'
-    if err.find('Warning: Axis values for axis time are not monotonic') >= 0:
-        errorCode[1] = '1'
-    if err.find('Warning: resetting latitude values') >= 0:
-        errorCode[2] = '1'
-    if err.find('zero infile size') >= 0:
-        errorCode[3] = '1'
-    if err.find('dimension time overlaps file') + err.find('dimension time contains values in file') >= 0:
-        errorCode[4] = '1'
-    if err.find('Your first bounds') >= 0:
-        errorCode[5] = '1'
-    if err.find('Python Error') >= 0:
-        errorCode[6] = '1'
-    errorCode = "".join(errorCode)
-    return errorCode
-
 def sqlUpdate(sqlDB, table, columns, constraint, datalist):
     """
     sqlUpdate(sqlDB, table, columns, constraint, datalist)
@@ -849,23 +2543,14 @@ def sqlUpdate(sqlDB, table, columns, constraint, datalist):
     5 is the constraint. This could correspond to a constraint like 'number'
     and columns like ['color', 'animal', 'model_car'].
 
+    All rows are updated in a single transaction.
+
     """
     if type(columns) == str:
         columns = [columns]
     q = 'UPDATE ' + table + ' SET ' + '=?, '.join(columns) + '=? WHERE ' + constraint + '=?;'
-    # connect to db
-    conn = sqlite3.connect(sqlDB)
-    c = conn.cursor()
     # update data
-    if len(datalist) > 1000:
-        for i in range(int(np.ceil(len(datalist)/1000))):
-            ro = datalist[i*1000:i*1000+1000]
-            c.executemany(q, ro)
-            conn.commit()
-    else:
-        c.executemany(q, datalist)
-        conn.commit()
-    conn.close() # close connection
+    getSession(sqlDB).executemany(q, datalist)
 
 def sqlInsert(sqlDB, table, columns, datalist):
     """
@@ -886,31 +2571,75 @@ def sqlInsert(sqlDB, table, columns, datalist):
 
     """
     q = 'INSERT INTO ' + table + '(' + ', '.join(columns) + ') VALUES(' + '?,' * (len(columns) - 1) + '?);'
-    # connect to db
-    conn = sqlite3.connect(sqlDB)
-    c = conn.cursor()
-    # update data
-    c.executemany(q, datalist)
-    conn.commit() # commit changes
-    conn.close() # close connection
+    # insert data
+    getSession(sqlDB).executemany(q, datalist)
+
+def sqlMerge(sqlDB, table, columns, constraint, datalist, quiet=True):
+    """
+    n = sqlMerge(sqlDB, table, columns, constraint, datalist, quiet=True)
+
+    Function will update rows in sqlite database with new information (like
+    sqlUpdate), but is much faster for large updates. The data is loaded
+    into a temporary staging table and then applied to the table with a
+    single UPDATE statement (joined on the constraint column, which should
+    have a unique index, e.g., path), in one transaction. If a constraint
+    value appears more than once in datalist, the last row is used.
+
+    Inputs:
+        sqlDB: string filename
+        table (string): table to update
+        columns (list): columns to update
+        constraint (string): column which is used as a constraint
+        dataList: list containing new data (in the same form as sqlUpdate)
+        quiet (optional, boolean): suppress display information if True (default True)
+
+    Returns:
+        n (int): number of rows updated
+
+    """
+    if type(columns) == str:
+        columns = [columns]
+    s = time.time()
+    session = getSession(sqlDB)
+    staging = 'temp.' + table + '_staging'
+    with session.transaction():
+        session.execute('DROP TABLE IF EXISTS ' + staging + ';')
+        session.execute('CREATE TABLE ' + staging + ' (' + ', '.join(columns) + ', ' + constraint + ' PRIMARY KEY);')
+        session.executemany('INSERT OR REPLACE INTO ' + staging + ' (' + ', '.join(columns) + ', ' + constraint + ') VALUES(' + '?, ' * len(columns) + '?);', datalist)
+        if sqlite3.sqlite_version_info >= (3, 33, 0):
+            q = 'UPDATE ' + table + ' SET ' + ', '.join([col + ' = s.' + col for col in columns]) + ' FROM ' + staging + ' s WHERE ' + table + '.' + constraint + ' = s.' + constraint + ';'
+        else:
+            q = 'UPDATE ' + table + ' SET ' + ', '.join([col + ' = (SELECT s.' + col + ' FROM ' + staging + ' s WHERE s.' + constraint + ' = ' + table + '.' + constraint + ')' for col in columns]) + ' WHERE ' + constraint + ' IN (SELECT ' + constraint + ' FROM ' + staging + ');'
+        n = session.execute(q).rowcount
+        session.execute('DROP TABLE ' + staging + ';')
+    if not quiet:
+        print('Updated ' + str(n) + ' rows in ' + table + ' (' + str(np.round(time.time() - s, 1)) + 's)')
+    return n
 
-def process_path(xmlOutputDir, pathMeta, inpath):
+def process_path(xmlOutputDir, pathMeta, inpath, timeout=None):
     """
-    inpath, fn, xmlwritetime, error = process_path(xmlOutputDir, pathMeta, inpath)
+    inpath, fn, xmlwritetime, error, scanDuration, errorCode = process_path(xmlOutputDir, pathMeta, inpath, timeout=None)
 
     Function processes a path by creating an output filename for the xml file,
     creates an xml file for a given directory, and processes any error messages.
+    If another directory with identical files already has an xml file
+    (pathMeta['sourceXml']), it is copied (see copyXml). If the directory
+    has only gained files since its previous xml file was written, the
+    previous xml file is updated instead (see appendXml and reuseXml).
 
     Inputs:
         xmlOutputDir (string): base directory for xml tree
         pathMeta (dictionary): dictionary object containing necesary metadata to create filename (specified below)
         inpath (string): directory which contains the netCDF data to process
+        timeout (optional, float): seconds before a cdscan subprocess is killed (see xmlWrite)
 
     Returns:
         inpath (string): directory which contains the netCDF data to process
         fn (string): filename of xmlfile written out (or None if applicable)
-        xmlwritetime: sql datetime string of xml write time
+        xmlwritetime: xml write time (epoch seconds)
         error: parsed error message
+        scanDuration (float): seconds spent writing the xml file (None if it was copied or appended)
+        errorCode (int): error category (see errorLogic)
 
     pathMeta contains the following keys:
         mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version
@@ -918,161 +2647,224 @@ def process_path(xmlOutputDir, pathMeta, inpath):
     """
     fn = createFilename(xmlOutputDir, pathMeta)
     ensure_dir(fn)
-    out,err = xmlWrite(inpath, fn)
-    # get write time
-    xmlwritetime = toSQLtime(datetime.datetime.now())
+    s = time.time()
+    reused = reuseXml(pathMeta, inpath, fn, timeout=timeout)
+    if reused:
+        err = ''
+    else:
+        out,err = xmlWrite(inpath, fn, timeout=timeout)
+    # get write time (copied and appended xml files are not full scans, so
+    # they have no scan duration, see fitScanCostModel)
+    xmlwritetime = int(time.time())
+    scanDuration = None if reused else time.time() - s
     # get warnings
-    fn, error = errorLogic(fn, inpath, err)
+    fn, error, errorCode = errorLogic(fn, inpath, err)
 
     # update database with xml write
-    return inpath, fn, xmlwritetime, error
+    return inpath, fn, xmlwritetime, error, scanDuration, errorCode
 
-def updateDatabaseHoldings(sqlDB, diskPaths, diskStat, dbPaths, db, invalidPaths, retiredPaths, quiet=False):
+def updateDatabaseHoldings(sqlDB, quiet=False, appendXmls=True):
     """
-    updateDatabaseHoldings(sqlDB, diskPaths, diskStat, dbPaths, db, invalidPaths, retiredPaths, quiet=False)
+    updateDatabaseHoldings(sqlDB, quiet=False, appendXmls=True)
 
-    Function updates all database information based on scan of all disk paths. Functionality includes:
+    Function updates all database information based on scan of all disk paths
+    (stored in the directories table, see parallelFindData). Functionality includes:
         * Will kill job if more than 10% of data isn't in diskPaths
         * Inserts new paths into database (with appropriate metadata)
         * Updates modified times on modified directories
+        * If the crawl recorded file manifests (see scantree), a path is only
+          treated as modified if its manifest has changed (paths that were
+          only touched have their timestamps updated) and files that were
+          changed in place are detected even if the directory mtime is not
         * Updates invalidPaths with new invalid paths
         * Will retire paths that are removed and delete underlying xmls
+          (and any xml that was set aside, see below)
         * Will "un-retire" a path that re-appears on the disk
-        * Will delete xmls where path is modified (for later re-creation)
+        * Will delete xmls where path is modified (for later re-creation); if
+          appendXmls is True, xmls without warnings are instead set aside
+          (renamed to xmlFile + '.prev' and recorded as the prevXmlFile of
+          the path) so that they can be updated if the directory only gained
+          files (see appendXml). The set aside xml is removed when the path
+          is scanned, retired, reset, or ignored (see removePrevXmlFiles)
         * Prints out relevant information and records this information in the database (runs table)
             * Total Scanned, New, Invalid, Modified, Missing, Returned, Deleted
+              (and Touched, which is not recorded)
+
+    The disk paths are loaded into an indexed temporary table and each
+    category of path is determined with a join (or anti-join) against the
+    paths table. All database changes are applied in a single transaction.
+    The temporary tables are dropped when the update is complete.
 
     Inputs:
         sqlDB: string filename
-        diskPaths: keys of all disk paths
-        diskStat: Dictionary of stat information for each path (see findDiskPaths)
-        dbPaths: keys of all paths in the database
-        db: database dictionary object (see getDBPaths)
-        invalidPaths: list of invalid paths (see getInvalidDBPaths)
-        retiredPaths: list of retired paths (see getRetiredDBPaths)
         quiet (optional, boolean): suppress display information if True (default False)
+        appendXmls (optional, boolean): set aside xmls of modified paths (default True)
 
     """
-    # create sets for lists to speed up logic
-    retiredPaths = set(retiredPaths)
-    invalidPaths = set(invalidPaths)
+    session = getSession(sqlDB)
+    c = session.conn.cursor()
+    tempTables = ['disk', 'invalid', 'new_paths', 'modified_paths', 'touched_paths', 'unretired_paths', 'missing_paths']
+    for table in tempTables:
+        c.execute('DROP TABLE IF EXISTS temp.' + table + ';')
+
+    # load disk paths and invalid paths into indexed temporary tables
+    c.execute('''CREATE TEMP TABLE disk AS
+                 SELECT path, CAST(ctime AS INTEGER) AS ctime, CAST(mtime AS INTEGER) AS mtime, CAST(atime AS INTEGER) AS atime, manifestHash
+                 FROM directories WHERE hasFiles = 1;''')
+    c.execute('''CREATE UNIQUE INDEX temp.diskIndex ON disk (path);''')
+    c.execute('''CREATE TEMP TABLE invalid AS SELECT DISTINCT path FROM invalid_paths;''')
+    c.execute('''CREATE UNIQUE INDEX temp.invalidIndex ON invalid (path);''')
+    c.execute('select count(*) from disk;')
+    diskCount = c.fetchone()[0]
+    c.execute('select count(*) from paths where retired = 0;')
+    activeCount = c.fetchone()[0]
 
     # Sanity check to make sure disks aren't unmounted
-    if len(diskPaths) < (len(dbPaths) - len(retiredPaths)) * 0.9:
+    if diskCount < activeCount * 0.9:
+        for table in tempTables:
+            c.execute('DROP TABLE IF EXISTS temp.' + table + ';')
         raise ValueError('A large number of paths are missing - check disks')
 
     # Bin paths into appropriate categories
-    newPaths = []
-    modifiedPaths = []
-    unretirePaths = []
-    for p in diskPaths:
-        if p in retiredPaths:
-            unretirePaths.append(p)
-        if p in invalidPaths:
-            continue
-        if p in dbPaths:
-            if sqltimeToDatetime(diskStat[p]['mtime']) > sqltimeToDatetime(db[p]['modified']):
-                modifiedPaths.append(p)
-        else:
-            newPaths.append(p)
-
-    missingPaths = []
-    for p in dbPaths:
-        if p in retiredPaths:
-            continue
-        if p not in diskPaths:
-            missingPaths.append(p)
+    c.execute('''CREATE TEMP TABLE new_paths AS
+                 SELECT d.path, d.ctime, d.mtime, d.atime, d.manifestHash FROM disk d
+                 WHERE NOT EXISTS (SELECT 1 FROM paths p WHERE p.path = d.path)
+                 AND NOT EXISTS (SELECT 1 FROM invalid i WHERE i.path = d.path);''')
+    # with manifests, a path is modified if its files have changed; otherwise
+    # it is modified if the directory mtime has advanced
+    c.execute('''CREATE TEMP TABLE modified_paths AS
+                 SELECT p.path FROM paths p JOIN disk d ON d.path = p.path
+                 WHERE CASE WHEN d.manifestHash IS NOT NULL AND p.manifestHash IS NOT NULL
+                            THEN d.manifestHash != p.manifestHash
+                            ELSE d.mtime > p.modified END
+                 AND NOT EXISTS (SELECT 1 FROM invalid i WHERE i.path = p.path);''')
+    c.execute('''CREATE TEMP TABLE touched_paths AS
+                 SELECT p.path FROM paths p JOIN disk d ON d.path = p.path
+                 WHERE d.manifestHash = p.manifestHash
+                 AND d.mtime > p.modified
+                 AND NOT EXISTS (SELECT 1 FROM invalid i WHERE i.path = p.path);''')
+    c.execute('''CREATE TEMP TABLE unretired_paths AS
+                 SELECT p.path FROM paths p JOIN disk d ON d.path = p.path
+                 WHERE p.retired = 1;''')
+    c.execute('''CREATE TEMP TABLE missing_paths AS
+                 SELECT p.path FROM paths p
+                 WHERE p.retired = 0
+                 AND NOT EXISTS (SELECT 1 FROM disk d WHERE d.path = p.path);''')
+    counts = {}
+    for table in ['new_paths', 'modified_paths', 'touched_paths', 'unretired_paths', 'missing_paths']:
+        c.execute('CREATE INDEX temp.' + table + 'Index ON ' + table + ' (path);')
+        c.execute('select count(*) from ' + table + ';')
+        counts[table] = c.fetchone()[0]
+
+    # get xml files for modified / missing paths (before they are reset)
+    c.execute('''SELECT xmlFile, path IN (SELECT path FROM modified_paths) FROM paths
+                 WHERE xmlFile IS NOT NULL
+                 AND (path IN (SELECT path FROM modified_paths) OR path IN (SELECT path FROM missing_paths));''')
+    xmlFiles = c.fetchall()
+    c.execute('''SELECT prevXmlFile FROM paths
+                 WHERE prevXmlFile IS NOT NULL
+                 AND path IN (SELECT path FROM missing_paths);''')
+    prevXmlFiles = [row[0] for row in c.fetchall()]
 
     newCount = 0
     invalidCount = 0
-    modifiedCount = len(modifiedPaths)
-    missingCount = len(missingPaths)
-    unretiredCount = len(unretirePaths)
+    modifiedCount = counts['modified_paths']
+    touchedCount = counts['touched_paths']
+    missingCount = counts['missing_paths']
+    unretiredCount = counts['unretired_paths']
     deleteCount = 0
+    appendCount = 0
 
     ## process new records (not in database)
-    if len(newPaths) > 0:
+    if counts['new_paths'] > 0:
         if not quiet:
             print('Parsing data paths not in database')
             print(time.ctime())
             print()
-        # get metadata object
-        dictObj = getCMIPMeta()
         newList = []
         invalidList = []
-        for p in newPaths:
+        c.execute('select path, ctime, mtime, atime, manifestHash from new_paths;')
+        for p, ctime, mtime, atime, manifestHash in c.fetchall():
             try:
-                validPath, keyId, mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version = parsePath(p, dictObj)
+                validPath, keyId, mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version = parsePath(p)
             except:
                 validPath = False
                 ValueError('Bad path:' + p)
             if validPath:
-                litem = [p, keyId, mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version, diskStat[p]['ctime'], diskStat[p]['mtime'], diskStat[p]['atime'], 0, 0]
+                litem = [p, keyId, mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version, ctime, mtime, atime, 0, 0, manifestHash]
                 newList.append(litem)
             else:
-                invalidList.append([p, toSQLtime(datetime.datetime.now())])
+                invalidList.append([p, int(time.time())])
 
         newCount = len(newList)
         invalidCount = len(invalidList)
-
-        # write new paths to database
-        if not quiet:
-            print('Writing new paths')
-            print(time.ctime())
-            print()
-        columns = ['path', 'keyId', 'mip_era', 'activity', 'institute', 'model', 'experiment', 'member', 'cmipTable', 'realm', 'frequency', 'variable', 'grid', 'gridLabel', 'version', 'created', 'modified', 'accessed', 'retired', 'ignored']
-        sqlInsert(sqlDB, 'paths', columns, newList)
-        # write invalid paths to database
-        sqlInsert(sqlDB, 'invalid_paths', ['path', 'datetime'], invalidList)
-
-    ## process paths with modified timestamp
-    if modifiedCount > 0:
         if not quiet:
-            print('Updating modified paths')
-            print(time.ctime())
-            print()
-
-        # update modified paths in database
-        modifiedList = []
-        for p in modifiedPaths:
-            litem = [diskStat[p]['ctime'], diskStat[p]['mtime'], diskStat[p]['atime'], None, None, None, 0, None, 0, None, p]
-            modifiedList.append(litem)
-
-        columns = ['created', 'modified', 'accessed', 'xmlFile', 'xmlwritedatetime', 'error', 'retired', 'retire_datetime', 'ignored', 'ignored_datetime']
-        sqlUpdate(sqlDB, 'paths', columns, 'path', modifiedList)
-
-    ## process retired paths
-    if unretiredCount > 0:
-        if not quiet:
-            print('Unretiring relevant paths')
-            print(time.ctime())
-            print()
-
-        ## update retired paths in database
-        unretiredList = []
-        for p in unretirePaths:
-            litem = [diskStat[p]['ctime'], diskStat[p]['mtime'], diskStat[p]['atime'], None, None, None, 0, None, 0, None, p]
-            unretiredList.append(litem)
-
-        columns = ['created', 'modified', 'accessed', 'xmlFile', 'xmlwritedatetime', 'error', 'retired', 'retire_datetime', 'ignored', 'ignored_datetime']
-        sqlUpdate(sqlDB, 'paths', columns, 'path', unretiredList)
-
-    ## process paths where directory is missing
-    if missingCount > 0:
-        if not quiet:
-            print('Retiring missing data')
-            print(time.ctime())
+            for name, (hits, misses, size) in parseCacheInfo().items():
+                print(name + ': ' + str(hits) + ' hits, ' + str(misses) + ' misses')
             print()
 
-        # update missing paths in database
-
-        columns = ['xmlFile', 'xmlwritedatetime', 'error', 'retired', 'retire_datetime', 'ignored', 'ignored_datetime']
-        missingList = []
-        for p in missingPaths:
-            litem = [None, None, None, 1, toSQLtime(datetime.datetime.now()), 0, None, p]
-            missingList.append(litem)
-
-        sqlUpdate(sqlDB, 'paths', columns, 'path', missingList)
+    # apply all changes in a single transaction
+    with session.transaction():
+        ## write new records
+        if counts['new_paths'] > 0:
+            if not quiet:
+                print('Writing new paths')
+                print(time.ctime())
+                print()
+            columns = ['path', 'keyId', 'mip_era', 'activity', 'institute', 'model', 'experiment', 'member', 'cmipTable', 'realm', 'frequency', 'variable', 'grid', 'gridLabel', 'version', 'created', 'modified', 'accessed', 'retired', 'ignored', 'manifestHash']
+            c.executemany('INSERT INTO paths (' + ', '.join(columns) + ') VALUES(' + '?,' * (len(columns) - 1) + '?);', newList)
+            # write invalid paths to database
+            c.executemany('INSERT INTO invalid_paths (path, datetime) VALUES(?, ?);', invalidList)
+
+        ## process paths with modified timestamp and paths that have returned
+        if (modifiedCount + unretiredCount) > 0:
+            if not quiet:
+                print('Updating modified / returned paths')
+                print(time.ctime())
+                print()
+            c.execute('''UPDATE paths
+                         SET created = (SELECT d.ctime FROM disk d WHERE d.path = paths.path),
+                             modified = (SELECT d.mtime FROM disk d WHERE d.path = paths.path),
+                             accessed = (SELECT d.atime FROM disk d WHERE d.path = paths.path),
+                             manifestHash = (SELECT d.manifestHash FROM disk d WHERE d.path = paths.path),
+                             prevXmlFile = CASE WHEN ? AND xmlFile LIKE '%.0000000.0.xml' THEN xmlFile || '.prev' ELSE prevXmlFile END,
+                             xmlFile = NULL, xmlwritedatetime = NULL, error = NULL, errorCode = NULL, scanAttempts = NULL, nextScan = NULL,
+                             retired = 0, retire_datetime = NULL, ignored = 0, ignored_datetime = NULL
+                         WHERE path IN (SELECT path FROM modified_paths)
+                         OR path IN (SELECT path FROM unretired_paths);''', (bool(appendXmls),))
+
+        ## process paths that were touched, but whose files have not changed
+        if touchedCount > 0:
+            if not quiet:
+                print('Updating touched paths')
+                print(time.ctime())
+                print()
+            c.execute('''UPDATE paths
+                         SET created = (SELECT d.ctime FROM disk d WHERE d.path = paths.path),
+                             modified = (SELECT d.mtime FROM disk d WHERE d.path = paths.path),
+                             accessed = (SELECT d.atime FROM disk d WHERE d.path = paths.path)
+                         WHERE path IN (SELECT path FROM touched_paths)
+                         AND path NOT IN (SELECT path FROM unretired_paths);''')
+
+        ## record manifests for paths that do not have one yet
+        c.execute('''UPDATE paths
+                     SET manifestHash = (SELECT d.manifestHash FROM disk d WHERE d.path = paths.path)
+                     WHERE manifestHash IS NULL
+                     AND path IN (SELECT path FROM disk WHERE manifestHash IS NOT NULL);''')
+
+        ## process paths where directory is missing
+        if missingCount > 0:
+            if not quiet:
+                print('Retiring missing data')
+                print(time.ctime())
+                print()
+            c.execute('''UPDATE paths
+                         SET xmlFile = NULL, xmlwritedatetime = NULL, error = NULL, errorCode = NULL, scanAttempts = NULL, nextScan = NULL,
+                             prevXmlFile = NULL, retired = 1, retire_datetime = ?, ignored = 0, ignored_datetime = NULL
+                         WHERE path IN (SELECT path FROM missing_paths);''', (int(time.time()),))
+
+    for table in tempTables:
+        c.execute('DROP TABLE temp.' + table + ';')
 
     ## Delete retired / modified xml files
     if (missingCount + modifiedCount) > 0:
@@ -1081,110 +2873,299 @@ def updateDatabaseHoldings(sqlDB, diskPaths, diskStat, dbPaths, db, invalidPaths
             print(time.ctime())
             print()
 
-        for p in missingPaths:
-            xfn = db[p]['xmlFile']
-            if xfn is not None:
-                if os.path.exists(xfn):
-                    os.remove(xfn)
-                    deleteCount += 1
-
-        for p in modifiedPaths:
-            xfn = db[p]['xmlFile']
-            if xfn is not None:
-                if os.path.exists(xfn):
-                    os.remove(xfn)
-                    deleteCount += 1
+        for xfn, modified in xmlFiles:
+            if not os.path.exists(xfn):
+                continue
+            if appendXmls and modified and xfn.endswith('.0000000.0.xml'):
+                os.replace(xfn, xfn + '.prev')
+                appendCount += 1
+            else:
+                os.remove(xfn)
+            deleteCount += 1
+        for xfn in prevXmlFiles:
+            if os.path.exists(xfn):
+                os.remove(xfn)
 
     ## Write out
     columns = ['datetime', 'total', 'new', 'invalid', 'modified', 'missing', 'returned', 'deleted']
-    row = [[toSQLtime(datetime.datetime.now()), len(diskPaths), newCount, invalidCount, modifiedCount, missingCount, unretiredCount, deleteCount]]
+    row = [[int(time.time()), diskCount, newCount, invalidCount, modifiedCount, missingCount, unretiredCount, deleteCount]]
     sqlInsert(sqlDB, 'runs', columns, row)
 
     if not quiet:
-        print('Total Scanned   : ' + str(len(diskPaths)))
+        print('Total Scanned   : ' + str(diskCount))
         print('   New          : ' + str(newCount))
         print('   Invalid      : ' + str(invalidCount))
         print('   Modified     : ' + str(modifiedCount))
+        print('   Touched      : ' + str(touchedCount))
         print('   Missing      : ' + str(missingCount))
         print('   Returned     : ' + str(unretiredCount))
         print('   Deleted      : ' + str(deleteCount))
+        print('    (set aside) : ' + str(appendCount))
+        print()
+
+def scanListQuery(variables, experiments, frequencies, retry=False, maxAttempts=5):
+    """
+    q, params = scanListQuery(variables, experiments, frequencies, retry=False, maxAttempts=5)
+
+    Function returns the query (and parameters) that selects one eligible
+    path for each keyid that should be scanned (see getScanList). The query
+    ends with a GROUP BY keyid clause. If retry is True, the query selects
+    paths whose last scan failed with a transient error (see
+    errorCategoryDefaults) instead of paths without errors, if they have
+    failed fewer than maxAttempts times and their backoff has expired (see
+    writeScanResults).
+
+    Inputs:
+        variables (list): list of variables to scan (e.g., ['tas', 'ta', 'ts'])
+        experiments (list): list of experiments to scan (e.g., ['amip', 'historical'])
+        frequencies (list): list of frequencies to scan (e.g., ['mon', 'fx'])
+        retry (optional, boolean): select paths with transient errors (default False)
+        maxAttempts (optional, int): maximum number of scans of a path with transient errors (default 5)
+
+    Returns:
+        q (string): query
+        params (list): query parameters
+
+    """
+    if retry:
+        # paths that failed before attempts were counted have one attempt
+        errorClause = """p.errorCode IN (SELECT code FROM errorCategories WHERE transient = 1)
+           AND coalesce(p.scanAttempts, 1) < ?
+           AND coalesce(p.nextScan, 0) <= ?"""
+        errorParams = [maxAttempts, int(time.time())]
+    else:
+        errorClause = 'p.error IS NULL'
+        errorParams = []
+    q = """FROM paths p
+           WHERE p.xmlFile IS NULL
+           AND """ + errorClause + """
+           AND p.variable IN (""" + ', '.join(['?'] * len(variables)) + """)
+           AND p.experiment IN (""" + ', '.join(['?'] * len(experiments)) + """)
+           AND p.frequency IN (""" + ', '.join(['?'] * len(frequencies)) + """)
+           AND p.retired = 0
+           AND p.ignored = 0
+           AND p.modified < ?
+           AND NOT EXISTS (SELECT 1 FROM paths x WHERE x.keyid = p.keyid AND x.xmlFile IS NOT NULL)"""
+    params = errorParams + list(variables) + list(experiments) + list(frequencies) + [int(time.time()) - 3 * 3600]
+    return q, params
+
+def countScanList(sqlDB, variables, experiments, frequencies, quiet=False, retry=False, maxAttempts=5):
+    """
+    nScan = countScanList(sqlDB, variables, experiments, frequencies, quiet=False, retry=False, maxAttempts=5)
+
+    Function returns the number of paths that getScanList will produce.
+
+    Inputs:
+        sqlDB: string filename
+        variables (list): list of variables to scan (e.g., ['tas', 'ta', 'ts'])
+        experiments (list): list of experiments to scan (e.g., ['amip', 'historical'])
+        frequencies (list): list of frequencies to scan (e.g., ['mon', 'fx'])
+        quiet (optional, boolean): suppress display information if True (default False)
+        retry (optional, boolean): count paths with transient errors (see scanListQuery)
+        maxAttempts (optional, int): maximum number of scans of a path with transient errors (default 5)
+
+    Returns:
+        nScan (int)
+
+    """
+    q, params = scanListQuery(variables, experiments, frequencies, retry=retry, maxAttempts=maxAttempts)
+    nScan = getSession(sqlDB).query('SELECT count(DISTINCT p.keyid) ' + q + ';', params)[0][0]
+    if not quiet:
+        print('Found ' + str(nScan) + ' paths to ' + ('retry' if retry else 'scan'))
+        print(time.ctime())
         print()
+    return nScan
 
-def getScanList(sqlDB, db, variables, experiments, frequencies, quiet=False):
+def getScanList(sqlDB, variables, experiments, frequencies, pageSize=1000, retry=False, maxAttempts=5):
     """
-    getScanList(sqlDB, db, variables, experiments, frequencies, quiet=False)
+    scanList = getScanList(sqlDB, variables, experiments, frequencies, pageSize=1000, retry=False, maxAttempts=5)
 
-    Function will produce a dictionary of paths to scan that includes all of the metadata
-    about each path. The directories included meet this criteria:
+    Function will produce scan tasks for paths that includes the metadata needed
+    to scan each path (see process_path). The directories included meet this criteria:
         * Include the variables, experiments, and frequencies supplied
-        * The path was last modified more than 24 hours ago
+        * The path was last modified more than 3 hours ago
         * Path is not ignored or retired
+        * No path with the same metadata (keyid) already has an xml file
         * If multiple paths have the same metadata, only one is listed for scanning
 
+    If another active path has identical files (the same manifest, see
+    createManifest) and an xml file without warnings, that xml file is
+    listed as the sourceXml of the path so that it can be copied instead of
+    scanning the files again (see copyXml).
+
+    If retry is True, paths whose last scan failed with a transient error
+    are listed instead (see scanListQuery).
+
+    The selection is done in the database (using the keyid index) and the scan
+    tasks are produced lazily: rows are read in pages of pageSize keyids so that
+    no read transaction is held open while scan results are written.
+
     Inputs:
         sqlDB: string filename
-        db: database dictionary object (see getDBPaths)
         variables (list): list of variables to scan (e.g., ['tas', 'ta', 'ts'])
         experiments (list): list of experiments to scan (e.g., ['amip', 'historical'])
         frequencies (list): list of frequencies to scan (e.g., ['mon', 'fx'])
-        quiet (optional, boolean): suppress display information if True (default False)
+        pageSize (optional, int): number of rows read from the database at a time (default 1000)
+        retry (optional, boolean): list paths with transient errors (default False)
+        maxAttempts (optional, int): maximum number of scans of a path with transient errors (default 5)
 
     Returns:
-        scanList[path] = db[path]
+        scanList: generator of [path, pathMeta]
 
+    pathMeta is a PathRow containing:
+        keyid, mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version,
+        nFiles, nBytes (from the last crawl, used to estimate the scan cost, see scanCost),
+        manifestHash, sourceXml
+
+    """
+    columns = ['keyid', 'mip_era', 'activity', 'institute', 'model', 'experiment', 'member', 'cmipTable', 'realm', 'frequency', 'variable', 'grid', 'gridLabel', 'version']
+    selection = ['p.' + col for col in columns]
+    for col in ['nFiles', 'nBytes']:
+        selection.append('(SELECT d.' + col + ' FROM directories d WHERE d.path = p.path)')
+        columns.append(col)
+    selection.append('p.manifestHash')
+    selection.append('''(SELECT x.xmlFile FROM paths x WHERE x.manifestHash = p.manifestHash AND x.path != p.path
+                         AND x.xmlFile LIKE '%.0000000.0.xml' AND x.retired = 0 LIMIT 1)''')
+    columns += ['manifestHash', 'sourceXml']
+    index = {col : i for i, col in enumerate(columns)}
+    q, params = scanListQuery(variables, experiments, frequencies, retry=retry, maxAttempts=maxAttempts)
+    q = 'SELECT p.path, ' + ', '.join(selection) + ' ' + q + ' AND p.keyid > ? GROUP BY p.keyid ORDER BY p.keyid LIMIT ?;'
+    lastKey = ''
+    while True:
+        rows = getSession(sqlDB).query(q, params + [lastKey, pageSize])
+        if len(rows) == 0:
+            break
+        for row in rows:
+            yield [row[0], PathRow(index, row[1:])]
+        lastKey = rows[-1][1]
+
+def getDuplicatePaths(sqlDB):
     """
+    duplicates = getDuplicatePaths(sqlDB)
 
-    # get keys with that have an associated xml file
-    conn = sqlite3.connect(sqlDB)  # connect to db
-    c = conn.cursor()
-    # get keys for which we have an xml file
-    c.execute('select keyid from paths where xmlFile is not NULL;')
-    result = c.fetchall()
-    conn.close() # close connection
-    # create list
-    keyExistList = []
-    for row in result:
-        keyExistList.append(row[0])
-
-    # paths to scan
-    conn = sqlite3.connect(sqlDB)
-    c = conn.cursor()
-    # get list to scan
-    vs = '\'' + '\', \''.join(variables) + '\''
-    es = '\'' + '\', \''.join(experiments) + '\''
-    fs = '\'' + '\', \''.join(frequencies) + '\''
-    q = """SELECT keyid, path
-           FROM paths
-           WHERE xmlfile IS NULL
-           AND error is NULL
-           AND variable IN (""" + vs + """)
-           AND experiment IN (""" + es + """)
-           AND frequency IN (""" + fs + """)
-           AND retired = 0
-           AND ignored = 0
-           AND (strftime(\'%s\', \'now\') - strftime(\'%s\', modified))/3600 > 3
-           GROUP BY keyid;"""
-    c.execute(q)
-    result = c.fetchall()
-    conn.close() # close connection
-    # create scan list
-    scanEligible = []
-    for row in result:
-        scanEligible.append(list(row))
-
-    # get non-duplicate paths to scan
-    scanList = []
-    for i in range(len(scanEligible)):
-        key = scanEligible[i][0]
-        p = scanEligible[i][1]
-        if key not in keyExistList:
-            scanList.append([p, db[p]])
+    Function returns the active paths that have identical files (the same
+    manifest of file names, sizes, and modification times, see
+    createManifest), e.g., copies of a dataset in the scratch and publish
+    trees. Directories without netCDF files are not included.
+
+    Inputs:
+        sqlDB: string filename
+
+    Returns:
+        duplicates (dict): manifestHash -> list of paths (with at least two paths)
+
+    """
+    q = '''SELECT manifestHash, path FROM paths
+           WHERE retired = 0 AND manifestHash IN (SELECT manifestHash FROM paths
+                                                  WHERE retired = 0 AND manifestHash IS NOT NULL AND manifestHash != ?
+                                                  GROUP BY manifestHash HAVING count(*) > 1)
+           ORDER BY manifestHash, path;'''
+    duplicates = {}
+    for manifestHash, p in getSession(sqlDB).query(q, (createManifest([])[1],)):
+        duplicates.setdefault(manifestHash, []).append(p)
+    return duplicates
+
+# default scan cost model coefficients: seconds, seconds per file, seconds per GB
+scanCostDefaults = (1., 0.05, 2.)
+
+def fitScanCostModel(sqlDB, minSamples=20, maxSamples=100000, quiet=False):
+    """
+    costModel = fitScanCostModel(sqlDB, minSamples=20, maxSamples=100000, quiet=False)
+
+    Function fits a linear model of the scan duration (seconds) of a path:
+
+        cost = a + b * nFiles + c * nBytes / 1e9
+
+    using the durations of the most recent maxSamples scans (see
+    process_path) and the number and size of the netCDF files in each
+    directory (see scantree). A separate model is fit for each frequency
+    with at least minSamples scans and a model for all frequencies is used
+    for the rest (or scanCostDefaults if there are too few scans). Negative
+    coefficients are set to zero.
+
+    Inputs:
+        sqlDB: string filename
+        minSamples (optional, int): number of scans needed to fit a model (default 20)
+        maxSamples (optional, int): maximum number of scans used (default 100000)
+        quiet (optional, boolean): suppress display information if True (default False)
+
+    Returns:
+        costModel (dict): frequency (or None for all frequencies) -> (a, b, c)
+
+    """
+    q = '''SELECT p.frequency, d.nFiles, d.nBytes, p.scanDuration
+           FROM paths p JOIN directories d ON d.path = p.path
+           WHERE p.scanDuration IS NOT NULL AND d.nFiles IS NOT NULL
+           ORDER BY p.xmlwritedatetime DESC LIMIT ?;'''
+    rows = getSession(sqlDB).query(q, (maxSamples,))
+
+    def fit(samples):
+        X = np.array([[1., row[1], (row[2] or 0) / 1e9] for row in samples])
+        y = np.array([row[3] for row in samples])
+        coef = np.maximum(np.linalg.lstsq(X, y, rcond=None)[0], 0.)
+        if not np.any(coef > 0):
+            return None
+        return tuple(float(x) for x in coef)
+
+    costModel = {None : scanCostDefaults}
+    if len(rows) >= minSamples:
+        costModel[None] = fit(rows) or scanCostDefaults
+    samples = {}
+    for row in rows:
+        samples.setdefault(row[0], []).append(row)
+    for frequency in samples:
+        if len(samples[frequency]) >= minSamples:
+            coef = fit(samples[frequency])
+            if coef is not None:
+                costModel[frequency] = coef
     if not quiet:
-        print('Found ' + str(len(scanList)) + ' paths to scan')
-        print(time.ctime())
+        print('Fit scan cost model to ' + str(len(rows)) + ' previous scans')
+        for frequency in sorted(costModel, key=str):
+            a, b, c = costModel[frequency]
+            print('  ' + str(frequency) + ': ' + str(np.round(a, 2)) + ' s + ' + str(np.round(b, 3)) + ' s/file + ' + str(np.round(c, 2)) + ' s/GB')
         print()
+    return costModel
+
+def scanCost(pathMeta, costModel):
+    """
+    cost = scanCost(pathMeta, costModel)
+
+    Function returns the estimated scan duration (seconds) of a path using
+    the frequency, nFiles, and nBytes in pathMeta (see getScanList) and a
+    cost model (see fitScanCostModel). Paths without crawl information are
+    treated as a single small file and paths with a sourceXml (which is
+    copied, see copyXml) only cost the fixed overhead.
+
+    """
+    a, b, c = costModel.get(pathMeta['frequency'], costModel[None])
+    if ('sourceXml' in pathMeta) and pathMeta['sourceXml']:
+        return a
+    nFiles = pathMeta['nFiles'] if 'nFiles' in pathMeta else None
+    nBytes = pathMeta['nBytes'] if 'nBytes' in pathMeta else None
+    return a + b * (nFiles or 1) + c * (nBytes or 0) / 1e9
+
+def orderScanList(scanList, costModel):
+    """
+    scanList, costs = orderScanList(scanList, costModel)
+
+    Function orders scan tasks (see getScanList) from the longest to the
+    shortest estimated scan duration (see scanCost). Starting the longest
+    scans first keeps a single slow directory from being the last scan of a
+    run while the other workers sit idle. The estimated costs are also used
+    for the scan progress estimates (see streamScans).
+
+    Inputs:
+        scanList: iterable of [path, pathMeta] (see getScanList)
+        costModel (dict): scan cost model (see fitScanCostModel)
+
+    Returns:
+        scanList (list): list of [path, pathMeta]
+        costs (list): estimated scan duration (seconds) of each path
 
-    return scanList
+    """
+    tasks = [[p, pathMeta, scanCost(pathMeta, costModel)] for p, pathMeta in scanList]
+    tasks.sort(key=lambda task: task[2], reverse=True)
+    return [task[:2] for task in tasks], [task[2] for task in tasks]
 
 def writeStats(sqlDB):
     """
@@ -1197,70 +3178,801 @@ def writeStats(sqlDB):
         * cmip6 xml files
         * undefined vertical grid (cmip5)
         * undefined vertical grid (cmip6)
+        * retracted
+        * paths in each error category (e.g., 'errors: Scan timed out', see errorLogic)
     """
     # define queries
     queries = []
-    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'cmip5 directories\', (select count(*) as n from paths where mip_era = \'CMIP5\' and retired=0), datetime(\'now\'));")
-    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'cmip6 directories\', (select count(*) as n from paths where mip_era = \'CMIP6\' and retired=0), datetime(\'now\'));")
-    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'cmip5 xml files\', (select count(*) as n from paths where mip_era = \'CMIP5\' and xmlFile is NOT NULL and xmlFile != 'None' and retired=0), datetime(\'now\'));")
-    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'cmip6 xml files\', (select count(*) as n from paths where mip_era = \'CMIP6\' and xmlFile is NOT NULL and xmlFile != 'None' and retired=0), datetime(\'now\'));")
-    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'undefined vertical grid (cmip5)\', (select count(*) as n from paths where mip_era = \'CMIP5\' and gridLabel like \'%-%-x-%\' and retired=0), datetime(\'now\'));")
-    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'undefined vertical grid (cmip6)\', (select count(*) as n from paths where mip_era = \'CMIP6\' and gridLabel like \'%-%-x-%\' and retired=0), datetime(\'now\'));")
-    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'retracted\', (select count(*) as n from paths where error = \'retracted\'), datetime(\'now\'));")
+    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'cmip5 directories\', (select count(*) as n from paths where mip_era = \'CMIP5\' and retired=0), strftime(\'%s\', \'now\'));")
+    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'cmip6 directories\', (select count(*) as n from paths where mip_era = \'CMIP6\' and retired=0), strftime(\'%s\', \'now\'));")
+    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'cmip5 xml files\', (select count(*) as n from paths where mip_era = \'CMIP5\' and xmlFile is NOT NULL and xmlFile != 'None' and retired=0), strftime(\'%s\', \'now\'));")
+    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'cmip6 xml files\', (select count(*) as n from paths where mip_era = \'CMIP6\' and xmlFile is NOT NULL and xmlFile != 'None' and retired=0), strftime(\'%s\', \'now\'));")
+    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'undefined vertical grid (cmip5)\', (select count(*) as n from paths where mip_era = \'CMIP5\' and gridLabel like \'%-%-x-%\' and retired=0), strftime(\'%s\', \'now\'));")
+    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'undefined vertical grid (cmip6)\', (select count(*) as n from paths where mip_era = \'CMIP6\' and gridLabel like \'%-%-x-%\' and retired=0), strftime(\'%s\', \'now\'));")
+    queries.append("INSERT INTO stats (indicator, value, datetime) VALUES (\'retracted\', (select count(*) as n from paths where error = \'retracted\'), strftime(\'%s\', \'now\'));")
+    queries.append("INSERT INTO stats (indicator, value, datetime) SELECT \'errors: \' || e.category, count(*), strftime(\'%s\', \'now\') FROM paths p JOIN errorCategories e ON e.code = p.errorCode WHERE p.retired = 0 GROUP BY e.code;")
     # write to database
-    conn = sqlite3.connect(sqlDB)
-    c = conn.cursor()
-    # Create table
-    for q in queries:
-        c.execute(q)
-    # Save (commit) the changes
-    conn.commit()
-    conn.close()
+    session = getSession(sqlDB)
+    with session.transaction():
+        for q in queries:
+            session.execute(q)
 
-def scanChunk(scanList, numProcessors, outputDirectory):
+def processMemory(pid='self'):
     """
-    results = scanChunk(scanList, numProcessors, outputDirectory)
+    rss = processMemory(pid='self')
 
-    Function takes in a scanList (see getScanList) and will pass these directories
-    to scan to process path in parallel.
+    Function returns the resident memory (bytes) of a process (default is
+    the current process) or 0 if it cannot be determined.
 
     Inputs:
-        scanList[path] = db[path] [dictionary of directories containing all directory metadata in database]
-        numProcessors (int): number of processors to use
-        outputDirectory: base directory of output xml tree
+        pid (optional, int): process id
 
     Returns:
-        list of results from process_path in the form: results[:][inpath, fn, xmlwritetime, error]
+        rss (int)
 
     """
-    # Determine number of processors
-    if len(scanList) > numProcessors:
-        nfscan = numProcessors
-    else:
-        nfscan = len(scanList)
+    try:
+        with open('/proc/' + str(pid) + '/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    return 0
+
+def availableMemory():
+    """
+    available = availableMemory()
+
+    Function returns the memory (bytes) available for new processes
+    (MemAvailable in /proc/meminfo) or None if it cannot be determined.
+
+    Returns:
+        available (int)
+
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    return None
+
+def childMemory(pid=None):
+    """
+    rss, n = childMemory(pid=None)
+
+    Function returns the total resident memory (bytes) and number of the
+    descendant processes of a process (default is the current process),
+    e.g., scan workers and the cdscan processes they start.
+
+    Inputs:
+        pid (optional, int): process id
+
+    Returns:
+        rss (int)
+        n (int)
+
+    """
+    if pid is None:
+        pid = os.getpid()
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/' + entry + '/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (IOError, OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    rss = 0
+    n = 0
+    stack = list(children.get(pid, []))
+    while len(stack) > 0:
+        child = stack.pop()
+        rss += processMemory(child)
+        n += 1
+        stack.extend(children.get(child, []))
+    return rss, n
+
+class MemoryGovernor(object):
+    """
+    governor = MemoryGovernor(maxScans, minAvailable=8e9, interval=10., quiet=False)
+
+    Adjusts the number of scans that may run at once (governor.limit) to the
+    memory of the system, so that memory intensive directories (e.g., 3D
+    ocean variables) running together do not exhaust it. At most every
+    interval seconds (see update), the available memory (see
+    availableMemory) and the memory used by the scans (see childMemory) are
+    checked:
+
+        * if less than minAvailable bytes are available, the limit is
+          lowered to one fewer than the number of running scans, so no new
+          scans are started until memory is freed (the limit is at least one)
+        * if there is room for two more scans of average size above
+          minAvailable, the limit is raised by one (up to maxScans)
+
+    Each change is printed (unless quiet) and recorded in governor.changes
+    as (time, old limit, new limit, available memory, scan memory).
+
+    Inputs:
+        maxScans (int): maximum number of concurrent scans
+        minAvailable (optional, float): available memory (bytes) below which scans are throttled (default 8e9)
+        interval (optional, float): minimum seconds between checks (default 10)
+        quiet (optional, boolean): suppress display information if True (default False)
+
+    """
+
+    def __init__(self, maxScans, minAvailable=8e9, interval=10., quiet=False):
+        self.maxScans = maxScans
+        self.minAvailable = minAvailable
+        self.interval = interval
+        self.quiet = quiet
+        self.limit = maxScans
+        self.lastCheck = 0.
+        self.changes = []
+
+    def update(self, nRunning):
+        """
+        limit = governor.update(nRunning)
+
+        Checks the memory (if interval seconds have passed since the last
+        check) and returns the number of scans that may run at once.
+
+        Inputs:
+            nRunning (int): number of scans that are running
+
+        """
+        if time.time() - self.lastCheck < self.interval:
+            return self.limit
+        self.lastCheck = time.time()
+        available = availableMemory()
+        if available is None:
+            return self.limit
+        used, n = childMemory()
+        perScan = used / max(n, 1)
+        limit = self.limit
+        if available < self.minAvailable:
+            limit = max(min(self.limit, nRunning - 1), 1)
+        elif (available - 2 * perScan > self.minAvailable) and (self.limit < self.maxScans):
+            limit = self.limit + 1
+        if limit != self.limit:
+            self.changes.append((self.lastCheck, self.limit, limit, available, used))
+            if not self.quiet:
+                print(time.ctime() + ': scan limit ' + str(self.limit) + ' -> ' + str(limit) + ' (' + str(nRunning) + ' running, ' + str(np.round(available / 1e9, 1)) + ' GB available, ' + str(np.round(used / 1e9, 1)) + ' GB used by scans)')
+            self.limit = limit
+        return self.limit
+
+def scanWorker(conn, maxTasks, maxMemory, timeout=None):
+    """
+    scanWorker(conn, maxTasks, maxMemory, timeout=None)
+
+    Worker process for ScanPool. The worker loads cdscan once (see
+    loadCdscan) and then receives batches (lists) of scan tasks
+    [xmlOutputDir, pathMeta, inpath] from the pool (conn). For each task, in
+    order, it sends back the result of process_path along with a flag that
+    is True if the worker is about to exit. Errors raised while
+    processing a path are returned as a result (with a 'Python Error'
+    message) so that one bad directory does not stop the worker. The worker
+    exits (and is replaced by the pool) at the end of a batch after maxTasks
+    tasks or if its memory use exceeds maxMemory bytes. It also exits when
+    it receives None.
+
+    If cdms2 is not available, cdscan subprocesses are killed after timeout
+    seconds (see xmlWrite). The worker leads its own process group, so that
+    the pool can also kill any cdscan subprocess when it kills the worker.
+
+    Inputs:
+        conn (multiprocessing.Connection): connection to the pool
+        maxTasks (int): number of tasks before the worker is recycled
+        maxMemory (float): memory (bytes) above which the worker is recycled
+        timeout (optional, float): seconds before a cdscan subprocess is killed (default None)
+
+    """
+    os.setpgrp()
+    loadCdscan()
+    nTasks = 0
+    recycle = False
+    while not recycle:
+        batch = conn.recv()
+        if batch is None:
+            break
+        for i, (xmlOutputDir, pathMeta, inpath) in enumerate(batch):
+            s = time.time()
+            try:
+                result = process_path(xmlOutputDir, pathMeta, inpath, timeout=timeout)
+            except Exception:
+                result = (inpath, None, int(time.time()), 'Python Error', time.time() - s, errorClassifier.code('Python Error'))
+            nTasks += 1
+            recycle = (i == len(batch) - 1) and ((nTasks >= maxTasks) or (processMemory() > maxMemory))
+            conn.send((result, recycle))
+    conn.close()
+
+class ScanPool(object):
+    """
+    pool = ScanPool(numProcessors, maxTasks=1000, maxMemory=4e9, timeout=None, governor=None, batchSize=1, batchMaxFiles=4)
+
+    Persistent pool of scan worker processes (see scanWorker). Each worker
+    imports cdms2 once and then writes xml files for many directories. The
+    pool keeps track of the task held by each worker, so if a worker dies
+    (e.g., a segmentation fault in a netCDF library) the task is returned
+    with an error and the worker is replaced. A worker that spends more
+    than timeout seconds on one task is killed (along with any cdscan
+    subprocess it started), so a hung scan is recorded as an error instead
+    of holding up the pool. Workers are also replaced
+    after maxTasks tasks or when their memory exceeds maxMemory (bytes). If
+    a governor is given, fewer workers are given tasks when the system is
+    short of memory (see MemoryGovernor).
+
+    Small directories (at most batchMaxFiles files in the last crawl, or an
+    xml file that can be copied) take little time to scan, so consecutive
+    small tasks are sent to a worker together in batches of up to batchSize
+    tasks. This saves the round trip between the pool and the worker for
+    each task (and the row index of the pathMeta PathRows is pickled once
+    per batch). Results are still returned for each path as it finishes.
+    If a worker dies or times out, only the task it was working on gets
+    the error; the rest of its batch is given to other workers.
+
+        for result in pool.imap(tasks):
+            ...
+        pool.close()
+
+    Inputs:
+        numProcessors (int): number of worker processes
+        maxTasks (optional, int): number of tasks before a worker is recycled (default 1000)
+        maxMemory (optional, float): worker memory (bytes) above which it is recycled (default 4e9)
+        timeout (optional, float): seconds before a worker is killed (default None)
+        governor (optional, MemoryGovernor): limits the number of busy workers (default None)
+        batchSize (optional, int): maximum number of small tasks sent to a worker at once (default 1)
+        batchMaxFiles (optional, int): maximum number of files in a small directory (default 4)
+
+    """
+
+    def __init__(self, numProcessors, maxTasks=1000, maxMemory=4e9, timeout=None, governor=None, batchSize=1, batchMaxFiles=4):
+        self.maxTasks = maxTasks
+        self.maxMemory = maxMemory
+        self.timeout = timeout
+        self.governor = governor
+        self.batchSize = batchSize
+        self.batchMaxFiles = batchMaxFiles
+        self.workers = []
+        for i in range(numProcessors):
+            self.workers.append(self.startWorker())
+
+    def startWorker(self):
+        conn, workerConn = multiprocessing.Pipe()
+        p = multiprocessing.Process(target=scanWorker, args=(workerConn, self.maxTasks, self.maxMemory, self.timeout), daemon=True)
+        p.start()
+        workerConn.close()
+        return {'process' : p, 'conn' : conn, 'tasks' : [], 'started' : None}
+
+    def killWorker(self, worker):
+        # kill the worker and any cdscan subprocess (in its process group)
+        try:
+            os.killpg(worker['process'].pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            # the worker has not started its process group (or has exited)
+            worker['process'].kill()
+
+    def replaceWorker(self, worker):
+        worker['conn'].close()
+        worker['process'].join()
+        self.workers[self.workers.index(worker)] = self.startWorker()
+
+    def failedResult(self, worker, err):
+        # result for the current task of a worker that died or was killed
+        xmlOutputDir, pathMeta, inpath = worker['tasks'][0]
+        fn = createFilename(xmlOutputDir, pathMeta)
+        for f in [fn, fn + '.new', fn + '.prev']:
+            if os.path.exists(f):
+                os.remove(f)
+        fn, error, errorCode = errorLogic(fn, inpath, err)
+        return (inpath, fn, int(time.time()), error, time.time() - worker['started'], errorCode)
+
+    def imap(self, tasks):
+        """
+        results = pool.imap(tasks)
+
+        Generator that scans each task ([xmlOutputDir, pathMeta, inpath]) and
+        yields the results of process_path ([inpath, fn, xmlwritetime, error,
+        scanDuration, errorCode]) in the order they complete. Tasks are
+        dispatched in the order given (see orderScanList).
+
+        """
+        tasks = iter(tasks)
+        # tasks held back from a batch or returned from a failed batch
+        pending = collections.deque()
+        remaining = True
+        while True:
+            # give each idle worker a task or batch (up to the limit of the governor)
+            nBusy = len([worker for worker in self.workers if len(worker['tasks']) > 0])
+            limit = len(self.workers)
+            if self.governor is not None:
+                limit = self.governor.update(nBusy)
+            for worker in self.workers:
+                if remaining and (len(worker['tasks']) == 0) and (nBusy < limit):
+                    batch = self.nextBatch(tasks, pending)
+                    if len(batch) == 0:
+                        remaining = False
+                        break
+                    worker['tasks'] = batch
+                    worker['started'] = time.time()
+                    try:
+                        worker['conn'].send(batch)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # worker was killed while idle (it is replaced below)
+                        pass
+                    nBusy += 1
+            busy = [worker for worker in self.workers if len(worker['tasks']) > 0]
+            if len(busy) == 0:
+                break
+            # wait for a result (or a worker to exit or run out of time)
+            wait = None
+            if self.timeout is not None:
+                wait = max(min([w['started'] for w in busy]) + self.timeout - time.time(), 0)
+            if (self.governor is not None) and remaining:
+                wait = self.governor.interval if wait is None else min(wait, self.governor.interval)
+            ready = multiprocessing.connection.wait([w['conn'] for w in busy] + [w['process'].sentinel for w in busy], timeout=wait)
+            for worker in busy:
+                if (worker['conn'] in ready) or (worker['process'].sentinel in ready):
+                    try:
+                        result, recycle = worker['conn'].recv()
+                    except (EOFError, OSError):
+                        # worker died while processing its task (its cdscan subprocess may still be running)
+                        self.killWorker(worker)
+                        result = self.failedResult(worker, 'Scan worker exited unexpectedly (exit code ' + str(worker['process'].exitcode) + ')')
+                        recycle = True
+                elif (self.timeout is not None) and (time.time() - worker['started'] > self.timeout):
+                    # worker is hung (or the scan is too slow)
+                    self.killWorker(worker)
+                    result = self.failedResult(worker, 'Scan timed out after ' + str(int(self.timeout)) + 's')
+                    recycle = True
+                else:
+                    continue
+                worker['tasks'].pop(0)
+                worker['started'] = time.time()
+                if recycle:
+                    # return the rest of the batch (if any) to the queue
+                    if len(worker['tasks']) > 0:
+                        pending.extendleft(reversed(worker['tasks']))
+                        remaining = True
+                    worker['tasks'] = []
+                    self.replaceWorker(worker)
+                yield result
+
+    def isSmall(self, task):
+        # True if a task can be batched with other small tasks
+        pathMeta = task[1]
+        if ('sourceXml' in pathMeta) and pathMeta['sourceXml']:
+            return True
+        nFiles = pathMeta['nFiles'] if 'nFiles' in pathMeta else None
+        return (nFiles is not None) and (nFiles <= self.batchMaxFiles)
+
+    def nextBatch(self, tasks, pending):
+        # the next task, or the next batch of up to batchSize consecutive
+        # small tasks (an empty list if there are no tasks left)
+        batch = []
+        while len(batch) < self.batchSize:
+            if len(pending) > 0:
+                task = pending.popleft()
+            else:
+                task = next(tasks, None)
+                if task is None:
+                    break
+            small = self.isSmall(task)
+            if (len(batch) > 0) and (not small):
+                pending.appendleft(task)
+                break
+            batch.append(task)
+            if not small:
+                break
+        return batch
 
-    # parallelize scans
-    results = Parallel(n_jobs=nfscan)(delayed(process_path)(outputDirectory, pathMeta, p)\
-           for (p, pathMeta) in scanList)
+    def close(self):
+        """
+        pool.close()
+
+        Stops all of the worker processes.
+
+        """
+        for worker in self.workers:
+            try:
+                worker['conn'].send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self.workers:
+            worker['process'].join()
+            worker['conn'].close()
+        self.workers = []
+
+class ScanSupervisor(object):
+    """
+    pool = ScanSupervisor(numProcessors, timeout=3600, maxMemory=16e9, pollInterval=1., governor=None)
+
+    Alternative to ScanPool that runs every scan as its own cdscan
+    subprocess (see cdscanProcess), with an asyncio event loop that limits
+    the number of concurrent scans to numProcessors (or fewer if a governor
+    is given and the system is short of memory, see MemoryGovernor).
+    The files in each directory are passed to cdscan explicitly (no shell
+    is used) and each scan is killed if it runs for more than timeout
+    seconds or uses more than maxMemory bytes, so a hung scan is recorded
+    as an error (see errorLogic) instead of stalling the run. Xml files that
+    can be copied (see reuseXml) are written in a thread and the new files
+    of xml files that can be appended (see appendFiles) are scanned in a
+    cdscan subprocess with the same limits. The
+    supervisor has the same interface as ScanPool:
+
+        for result in pool.imap(tasks):
+            ...
+        pool.close()
 
-    return results
+    Inputs:
+        numProcessors (int): maximum number of concurrent scans
+        timeout (optional, float): seconds before a scan is killed (default 3600)
+        maxMemory (optional, float): memory (bytes) above which a scan is killed (default 16e9)
+        pollInterval (optional, float): seconds between checks of each scan (default 1)
+        governor (optional, MemoryGovernor): limits the number of concurrent scans (default None)
 
-def writeScanResults(sqlDB, results):
     """
-    writeScanResults(sqlDB, results)
 
-    Function takes results from scanChunk and uses them to update the database.
+    def __init__(self, numProcessors, timeout=3600, maxMemory=16e9, pollInterval=1., governor=None):
+        self.numProcessors = numProcessors
+        self.timeout = timeout
+        self.maxMemory = maxMemory
+        self.pollInterval = pollInterval
+        self.governor = governor
+
+    async def scan(self, task):
+        # write the xml file for one task and return the result (see process_path)
+        xmlOutputDir, pathMeta, inpath = task
+        s = time.time()
+        try:
+            fn = createFilename(xmlOutputDir, pathMeta)
+            ensure_dir(fn)
+            loop = asyncio.get_event_loop()
+            reused = await loop.run_in_executor(None, reuseXml, pathMeta, inpath, fn, self.timeout, False)
+            if not reused:
+                # the new files of an appended xml file are scanned like any
+                # other directory (with the timeout and memory limit)
+                newFiles = await loop.run_in_executor(None, appendFiles, inpath, fn)
+                if newFiles is not None:
+                    appended = len(newFiles) == 0
+                    if not appended:
+                        err = None
+                        try:
+                            out, err = await cdscanProcess(fn + '.new', newFiles, self.timeout, self.maxMemory, self.pollInterval)
+                        finally:
+                            appended = appendMerge(fn, err)
+                    if appended:
+                        reused = 'appended'
+            if reused:
+                err = ''
+            else:
+                files = glob.glob((inpath + '/*.nc').replace('//', '/'))
+                out, err = await cdscanProcess(fn, files, self.timeout, self.maxMemory, self.pollInterval)
+            xmlwritetime = int(time.time())
+            scanDuration = None if reused else time.time() - s
+            fn, error, errorCode = errorLogic(fn, inpath, err)
+            return (inpath, fn, xmlwritetime, error, scanDuration, errorCode)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return (inpath, None, int(time.time()), 'Python Error', time.time() - s, errorClassifier.code('Python Error'))
+
+    async def supervise(self, tasks, results, ready):
+        # scan every task (at most numProcessors at a time, or the limit of
+        # the governor) and append the results as they complete, setting
+        # ready after each one
+        running = set()
+
+        async def run(task):
+            results.append(await self.scan(task))
+            ready.set()
+
+        try:
+            for task in tasks:
+                while True:
+                    running = set([r for r in running if not r.done()])
+                    limit = self.numProcessors
+                    if self.governor is not None:
+                        limit = min(limit, self.governor.update(len(running)))
+                    if len(running) < limit:
+                        break
+                    wait = None if self.governor is None else self.governor.interval
+                    await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                running.add(asyncio.ensure_future(run(task)))
+            if len(running) > 0:
+                await asyncio.wait(running)
+        finally:
+            for r in running:
+                r.cancel()
+            if len(running) > 0:
+                await asyncio.wait(running)
+
+    def imap(self, tasks):
+        """
+        results = pool.imap(tasks)
+
+        Generator that scans each task ([xmlOutputDir, pathMeta, inpath]) and
+        yields the results ([inpath, fn, xmlwritetime, error, scanDuration, errorCode],
+        see process_path) in the order they complete. Tasks are started in
+        the order given (see orderScanList). The event loop runs in the
+        calling thread while the generator waits for a result; if the
+        generator is closed early, running scans are killed.
+
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        results = collections.deque()
+        ready = asyncio.Event()
+        supervisor = loop.create_task(self.supervise(iter(tasks), results, ready))
+        waiter = None
+        try:
+            while True:
+                while len(results) > 0:
+                    yield results.popleft()
+                if supervisor.done():
+                    supervisor.result()
+                    break
+                ready.clear()
+                waiter = loop.create_task(ready.wait())
+                loop.run_until_complete(asyncio.wait([supervisor, waiter], return_when=asyncio.FIRST_COMPLETED))
+        finally:
+            for t in [supervisor, waiter]:
+                if (t is not None) and (not t.done()):
+                    t.cancel()
+                    try:
+                        loop.run_until_complete(t)
+                    except asyncio.CancelledError:
+                        pass
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+            asyncio.set_event_loop(None)
+
+    def close(self):
+        """
+        pool.close()
+
+        Provided for compatibility with ScanPool (the supervisor does not
+        keep any processes between calls to imap).
+
+        """
+        pass
+
+def writeScanResults(sqlDB, results, retryBackoff=3600):
+    """
+    writeScanResults(sqlDB, results, retryBackoff=3600)
+
+    Function takes scan results (see process_path), which resultWriter
+    passes in batches during streamScans, and uses them to update the
+    database. For each path whose xml file was not written, the number of
+    failed scans (scanAttempts) is incremented and the path is not scanned
+    again (see scanListQuery) for retryBackoff seconds, doubled for each
+    earlier failure (paths that failed before attempts were counted have
+    failed once). Paths whose xml file was written have their scanAttempts
+    and nextScan cleared. Scans remove any xml file that was set aside for the path (see
+    reuseXml), so the prevXmlFile of each path is cleared.
 
     Inputs:
         sqlDB: string filename
-        results: results list from scanChunk
+        results: results list from process_path (see resultWriter)
+        retryBackoff (optional, float): seconds before a failed path is scanned again (default 3600)
 
     """
     outputList = []
     for row in results:
-        outputList.append(list([row[1], row[2], row[3], row[0]]))
+        outputList.append(list([row[1], row[2], row[3], row[4], row[5], None, row[0]]))
+    now = int(time.time())
+    failed = [[now, retryBackoff, row[0]] for row in results if row[1] is None]
+    succeeded = [[None, None, row[0]] for row in results if row[1] is not None]
+
+    session = getSession(sqlDB)
+    with session.transaction():
+        if len(failed) > 0:
+            session.executemany('''UPDATE paths
+                                   SET scanAttempts = coalesce(scanAttempts, CASE WHEN error IS NULL THEN 0 ELSE 1 END) + 1,
+                                       nextScan = ? + ? * (1 << min(coalesce(scanAttempts, CASE WHEN error IS NULL THEN 0 ELSE 1 END), 16))
+                                   WHERE path = ?;''', failed)
+        sqlMerge(sqlDB, 'paths', ['xmlFile', 'xmlwritedatetime', 'error', 'scanDuration', 'errorCode', 'prevXmlFile'], 'path', outputList)
+        if len(succeeded) > 0:
+            sqlMerge(sqlDB, 'paths', ['scanAttempts', 'nextScan'], 'path', succeeded)
+
+def resultWriter(sqlDB, resultQueue, batchSize=1000, maxWait=60, errors=[], retryBackoff=3600):
+    """
+    resultWriter(sqlDB, resultQueue, batchSize=1000, maxWait=60, errors=[], retryBackoff=3600)
+
+    Function (run in a background thread by streamScans) that takes scan
+    results from resultQueue and writes them to the database (see
+    writeScanResults) in batches of batchSize results, or whenever maxWait
+    seconds have passed since the last write. The function returns when it
+    receives None. Any exception is appended to errors.
+
+    Inputs:
+        sqlDB: string filename
+        resultQueue (queue.Queue): scan results (see process_path)
+        batchSize (optional, int): number of results per database write (default 1000)
+        maxWait (optional, float): maximum seconds between database writes (default 60)
+        errors (optional, list): list to record exceptions
+        retryBackoff (optional, float): seconds before a failed path is scanned again (see writeScanResults)
+
+    """
+    try:
+        batch = []
+        lastWrite = time.time()
+        while True:
+            try:
+                result = resultQueue.get(timeout=1)
+            except queue.Empty:
+                result = False
+            if result is None:
+                break
+            if result:
+                batch.append(result)
+            if (len(batch) >= batchSize) or ((len(batch) > 0) and (time.time() - lastWrite > maxWait)):
+                writeScanResults(sqlDB, batch, retryBackoff)
+                batch = []
+                lastWrite = time.time()
+        if len(batch) > 0:
+            writeScanResults(sqlDB, batch, retryBackoff)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        closeSessions()
+
+def streamScans(sqlDB, scanList, pool, outputDirectory, nScan=None, costs=None, batchSize=1000, reportInterval=60, retryBackoff=3600):
+    """
+    nScanned = streamScans(sqlDB, scanList, pool, outputDirectory, nScan=None, costs=None, batchSize=1000, reportInterval=60, retryBackoff=3600)
+
+    Function scans every path in scanList (see getScanList) with a pool of
+    scan workers (see ScanPool). Each worker is given a new path as soon as
+    it finishes the last one (so a slow directory never holds up the other
+    workers) and the results are written to the database by a background
+    thread (see resultWriter) while the scans continue. Progress (with the
+    scan rate and estimated time remaining) is printed every reportInterval
+    seconds. If the estimated cost of each path is provided (see
+    orderScanList), the time remaining is based on the fraction of the
+    estimated work that has been done rather than the number of paths.
+
+    Paths with the same files (manifest) as an earlier path in scanList are
+    held back until all other paths have been scanned and then copy the xml
+    file of the earlier path (see copyXml), if it was written without
+    warnings.
+
+    Inputs:
+        sqlDB: string filename
+        scanList: iterable of [path, pathMeta] (see getScanList)
+        pool (ScanPool): pool of scan workers
+        outputDirectory: base directory of output xml tree
+        nScan (optional, int): number of paths in scanList (used for progress)
+        costs (optional, list): estimated scan duration of each path in scanList (used for progress, scanList is read into a list)
+        batchSize (optional, int): number of results per database write (default 1000)
+        reportInterval (optional, float): seconds between progress updates (default 60)
+        retryBackoff (optional, float): seconds before a failed path is scanned again (see writeScanResults)
+
+    Returns:
+        nScanned (int): number of paths scanned
+
+    """
+    resultQueue = queue.Queue()
+    errors = []
+    writer = threading.Thread(target=resultWriter, args=(sqlDB, resultQueue, batchSize, reportInterval, errors, retryBackoff))
+    writer.start()
+    start = time.time()
+    lastReport = start
+    nScanned = 0
+    pathCosts = None
+    fractionDone = None
+    if costs is not None:
+        # costs are aligned with scanList, which is read again below
+        scanList = list(scanList)
+        pathCosts = {p : cost for (p, pathMeta), cost in zip(scanList, costs)}
+        totalCost = max(sum(costs), 1e-9)
+        fractionDone = 0.
+    # paths with the same manifest as an earlier path are scanned last
+    firstPaths = {}
+    deferred = []
+    xmlFiles = {}
+
+    def tasks():
+        for p, pathMeta in scanList:
+            manifestHash = pathMeta['manifestHash'] if 'manifestHash' in pathMeta else None
+            if (manifestHash is not None) and not (('sourceXml' in pathMeta) and pathMeta['sourceXml']):
+                if manifestHash in firstPaths:
+                    deferred.append([p, pathMeta, firstPaths[manifestHash]])
+                    continue
+                firstPaths[manifestHash] = p
+            yield [outputDirectory, pathMeta, p]
+
+    def deferredTasks():
+        for p, pathMeta, firstPath in deferred:
+            pathMeta = dict(pathMeta._asdict() if isinstance(pathMeta, PathRow) else pathMeta)
+            pathMeta['sourceXml'] = xmlFiles.get(firstPath)
+            yield [outputDirectory, pathMeta, p]
+
+    try:
+        for phase in [tasks(), deferredTasks()]:
+            for result in pool.imap(phase):
+                resultQueue.put(result)
+                nScanned += 1
+                if (result[1] is not None) and (result[3] is None) and result[1].endswith('.0000000.0.xml'):
+                    xmlFiles[result[0]] = result[1]
+                if pathCosts is not None:
+                    fractionDone += pathCosts.get(result[0], 0.) / totalCost
+                if not writer.is_alive():
+                    break
+                if time.time() - lastReport > reportInterval:
+                    lastReport = time.time()
+                    printScanProgress(nScanned, nScan, lastReport - start, fractionDone)
+            if not writer.is_alive():
+                break
+    finally:
+        resultQueue.put(None)
+        writer.join()
+    if len(errors) > 0:
+        raise errors[0]
+    printScanProgress(nScanned, nScan, time.time() - start, fractionDone)
+    return nScanned
+
+def printScanProgress(nScanned, nScan, elapsed, fractionDone=None):
+    """
+    printScanProgress(nScanned, nScan, elapsed, fractionDone=None)
+
+    Function prints a progress line for streamScans with the number of paths
+    scanned, the scan rate, and the estimated time remaining. The time
+    remaining is based on fractionDone (the fraction of the estimated scan
+    work that is complete) if it is provided, otherwise on the number of
+    paths remaining.
+
+    Inputs:
+        nScanned (int): number of paths scanned
+        nScan (int): total number of paths to scan (or None if unknown)
+        elapsed (float): seconds since the scans started
+        fractionDone (optional, float): fraction of the estimated scan work done
+
+    """
+    rate = nScanned / max(elapsed, 1.)
+    line = time.ctime() + ': ' + str(nScanned)
+    if nScan:
+        line += '/' + str(nScan) + ' (' + str(np.round(nScanned / nScan * 100, 1)) + '%)'
+    line += ' - ' + str(np.round(rate * 60, 1)) + ' paths/min'
+    if fractionDone:
+        line += ' - ' + str(np.round(min(fractionDone, 1.) * 100, 1)) + '% of work'
+        line += ' - ETA ' + str(datetime.timedelta(seconds=int(elapsed * max(1. - fractionDone, 0.) / fractionDone)))
+    elif nScan and (rate > 0):
+        line += ' - ETA ' + str(datetime.timedelta(seconds=int(max(nScan - nScanned, 0) / rate)))
+    print(line)
+
+def removePrevXmlFiles(sqlDB, paths):
+    """
+    nRemoved = removePrevXmlFiles(sqlDB, paths)
+
+    Function deletes the xml files that were set aside for a list of paths
+    (their prevXmlFile, see updateDatabaseHoldings and appendXml) and clears
+    their prevXmlFile. This is used when paths are reset, ignored, or
+    removed, so that set aside xml files are not left behind.
+
+    Inputs:
+        sqlDB: string filename
+        paths (list): list of paths
+
+    Returns:
+        nRemoved (int): number of xml files removed
 
-    sqlUpdate(sqlDB, 'paths', ['xmlFile', 'xmlwritedatetime', 'error'], 'path', outputList)
+    """
+    session = getSession(sqlDB)
+    paths = set(paths)
+    rows = [row for row in session.query('SELECT path, prevXmlFile FROM paths WHERE prevXmlFile IS NOT NULL;') if row[0] in paths]
+    with session.transaction():
+        session.executemany('UPDATE paths SET prevXmlFile = NULL WHERE path = ?;', [(row[0],) for row in rows])
+    nRemoved = 0
+    for path, xfn in rows:
+        if os.path.exists(xfn):
+            os.remove(xfn)
+            nRemoved += 1
+    return nRemoved
 
 def resetXmlsByQuery(sqlDB, q):
     """
@@ -1279,19 +3991,14 @@ def resetXmlsByQuery(sqlDB, q):
         q: string query, e.g., "select path, xmlFile from paths where error is not null and xmlFile is not null;"
 
     """
-    conn = sqlite3.connect(sqlDB)
-    c = conn.cursor()
-    c.execute(q)
-    a = c.fetchall()
+    a = getSession(sqlDB).query(q)
     dfiles = []
     plist = []
     for row in a:
-        plist.append([None, None, None, 0, None, row[0]])
+        plist.append([None, None, None, None, None, None, 0, None, row[0]])
         dfiles.append(row[1])
-    conn.close()
-    n = len(dfiles)
-    sqlUpdate(sqlDB, 'paths', ['xmlFile', 'xmlwritedatetime', 'error', 'ignored', 'ignored_datetime'], 'path', plist)
-    print('Reset ' + str(len(plist)) + ' records in database')
+    removePrevXmlFiles(sqlDB, [row[-1] for row in plist])
+    sqlMerge(sqlDB, 'paths', ['xmlFile', 'xmlwritedatetime', 'error', 'errorCode', 'scanAttempts', 'nextScan', 'ignored', 'ignored_datetime'], 'path', plist, quiet=False)
     deleteCount = 0
     for xfn in dfiles:
         if xfn is None:
@@ -1319,22 +4026,17 @@ def ignoreXmlsByQuery(sqlDB, q):
         q: string query, e.g., "select path, xmlFile from paths where path = '/a/b/c/';"
 
     """
-    conn = sqlite3.connect(sqlDB)
-    c = conn.cursor()
-    c.execute(q)
-    a = c.fetchall()
+    a = getSession(sqlDB).query(q)
     dfiles = []
     plist = []
     for row in a:
-        ignoretime = toSQLtime(datetime.datetime.now())
-        plist.append([None, None, None,1,ignoretime,row[0]])
+        ignoretime = int(time.time())
+        plist.append([None, None, None, None, None, None, 1, ignoretime, row[0]])
         fn = row[1]
         if fn:
             dfiles.append(fn)
-    conn.close()
-    n = len(dfiles)
-    sqlUpdate(sqlDB, 'paths', ['xmlFile', 'xmlwritedatetime', 'error', 'ignored', 'ignored_datetime'], 'path', plist)
-    print('Reset ' + str(len(plist)) + ' records in database')
+    removePrevXmlFiles(sqlDB, [row[-1] for row in plist])
+    sqlMerge(sqlDB, 'paths', ['xmlFile', 'xmlwritedatetime', 'error', 'errorCode', 'scanAttempts', 'nextScan', 'ignored', 'ignored_datetime'], 'path', plist, quiet=False)
     deleteCount = 0
     for xfn in dfiles:
         print(xfn)
@@ -1360,19 +4062,17 @@ def removeDatabasePathsByQuery(sqlDB, q):
         q: string query, e.g., "select path, xmlFile from paths where error is not null and xmlFile is not null;"
 
     """
-    conn = sqlite3.connect(sqlDB)
-    c = conn.cursor()
-    c.execute(q)
-    a = c.fetchall()
+    session = getSession(sqlDB)
+    a = session.query(q)
     dfiles = []
     plist = []
     for row in a:
         plist.append((row[0],))
         if row[1] is not None:
             dfiles.append(row[1])
+    removePrevXmlFiles(sqlDB, [row[0] for row in plist])
     q = 'DELETE FROM paths WHERE path = ?;'
-    c.executemany(q, [plist,])
-    conn.close()
+    session.executemany(q, plist)
     n = len(plist)
     print('Removed ' + str(n) + ' records in database')
     deleteCount = 0
@@ -12,8 +12,8 @@ Script to remove xmls linked to retracted data.
 
 import os
 import sqlite3
+import numpy as np
 import fx
-import datetime
 import time
 import glob
 
@@ -32,7 +32,6 @@ def execQuery(sqlDb, q):
 # specify databases
 sqlDb = '/p/css03/painter/db/sdt6.db'
 xaggDb = 'xml.db'
-cmipMeta = 'data/cmipMeta.pkl'
 retractDir = '/p/user_pub/xclim/retracted/'
 testDir = '/p/user_pub/xclim/CMIP6/CMIP/amip/atmos/mon/tas/'
 
@@ -48,6 +47,10 @@ if fx.runLock('check'):
 else:
     fx.runLock('on')
 
+# ensure database schema is up to date
+fx.migrateDB(xaggDb)
+retractedCode = fx.loadErrorCategories(xaggDb).code('retracted')
+
 # get retracted files
 print('Get retracted files')
 print(time.ctime())
@@ -59,35 +62,15 @@ names, retractedSet = execQuery(sqlDb, q)
 print('Get xagg files')
 print(time.ctime())
 print()
-q = 'select keyid, path, xmlfile from paths where retired = 0 and ignored = 0;'
-x, allKeys = execQuery(xaggDb, q)
-xaggKeys = {}
-for row in allKeys:
-    key = row[0]
-    path = row[1]
-    xmlfile = row[2]
-    if key not in xaggKeys.keys():
-        xaggKeys[key] = {}
-        xaggKeys[key][path] = xmlfile
-    else:
-        xaggKeys[key][path] = xmlfile
+xaggActive = fx.loadPathStore(xaggDb, ['keyid', 'xmlFile'], ['S', object],
+                              facets={'retired': 0, 'ignored': 0})
 
 # get xagg paths that are retracted
 print('Get xagg retracted files')
 print(time.ctime())
 print()
-q = 'select keyid, path, xmlfile from paths where ignored = 1 and error = "retracted";'
-x, allKeys = execQuery(xaggDb, q)
-xaggRetractedKeys = {}
-for row in allKeys:
-    key = row[0]
-    path = row[1]
-    xmlfile = row[2]
-    if key not in xaggRetractedKeys.keys():
-        xaggRetractedKeys[key] = {}
-        xaggRetractedKeys[key][path] = xmlfile
-    else:
-        xaggRetractedKeys[key][path] = xmlfile
+xaggRetracted = fx.loadPathStore(xaggDb, ['keyid', 'xmlFile'], ['S', object],
+                                 facets={'ignored': 1, 'error': 'retracted'})
 
 # get paths that need to be retracted
 print('Get paths to ignore')
@@ -97,7 +80,7 @@ retractList = []
 deleteList = {}
 datalist = []
 datalistXml = []
-esgfRetractedKeys = []
+esgfRetractedKeys = set()
 for i, row in enumerate(retractedSet):
     # get metadata
     meta = row[1].split('.')
@@ -114,8 +97,7 @@ for i, row in enumerate(retractedSet):
     gridLabel = '*'
     try:
         frequency, realm, dimensions = fx.lookupCMIPMetadata(mip, table,
-                                                             variableId,
-                                                             dictObj=cmipMeta)
+                                                             variableId)
         gridLabel = fx.createGridLabel(mip, realm, table,
                                        grid, dimensions)
     except:
@@ -127,29 +109,35 @@ for i, row in enumerate(retractedSet):
     key = [mip, activity, institution, model, experiment, realization, table,
            realm, frequency, variableId, grid, gridLabel, version]
     key = '.'.join(key)
-    esgfRetractedKeys.append(key)
-    if key in xaggKeys.keys():
-        for rpath in xaggKeys[key].keys():
-            fn = xaggKeys[key][rpath]
-            ignoretime = fx.toSQLtime(datetime.datetime.now())
-            if fn is None:
-                datalist.append([None, None, 'retracted', 1, ignoretime, rpath])
-            else:
-                xfnn = retractDir + fn.split('/')[-1]
-                deleteList[fn] = xfnn
-                datalistXml.append([xfnn, 'retracted', 1, ignoretime, rpath])
+    esgfRetractedKeys.add(key.encode('utf-8'))
+esgfRetracted = fx.PathStore(np.array(sorted(esgfRetractedKeys), dtype='S'))
+
+# active xagg paths with a retracted key
+ignoretime = int(time.time())
+for i in np.where(esgfRetracted.contains(xaggActive.keyid))[0]:
+    rpath = xaggActive.paths[i].decode('utf-8')
+    fn = xaggActive.xmlFile[i]
+    if fn is None:
+        datalist.append([None, None, 'retracted', retractedCode, 1, ignoretime, rpath])
+    else:
+        xfnn = retractDir + fn.split('/')[-1]
+        deleteList[fn] = xfnn
+        datalistXml.append([xfnn, 'retracted', retractedCode, 1, ignoretime, rpath])
 
 print('Retract files')
 print(time.ctime())
 print()
 
 # Ignore paths without an xml file
-columns = ['xmlFile', 'xmlwritedatetime', 'error', 'ignored', 'ignored_datetime']
-fx.sqlUpdate(xaggDb, 'paths', columns, 'path', datalist)
+columns = ['xmlFile', 'xmlwritedatetime', 'error', 'errorCode', 'ignored', 'ignored_datetime']
+fx.sqlMerge(xaggDb, 'paths', columns, 'path', datalist, quiet=False)
 
 # Update paths with an xml file
-columnsXml = ['xmlFile', 'error', 'ignored', 'ignored_datetime']
-fx.sqlUpdate(xaggDb, 'paths', columnsXml, 'path', datalistXml)
+columnsXml = ['xmlFile', 'error', 'errorCode', 'ignored', 'ignored_datetime']
+fx.sqlMerge(xaggDb, 'paths', columnsXml, 'path', datalistXml, quiet=False)
+
+# Remove xml files that were set aside for ignored paths (see fx.appendXml)
+fx.removePrevXmlFiles(xaggDb, [row[-1] for row in datalist + datalistXml])
 
 print('Archive files')
 print(time.ctime())
@@ -165,26 +153,23 @@ for fn in deleteList:
 print('Find data that should be un-retracted')
 print(time.ctime())
 print()
-esgfRetractedKeys = set(esgfRetractedKeys)
 deleteList = []
 unretract = []
 unretractCount = 0
-for key in xaggRetractedKeys.keys():
-    if key not in esgfRetractedKeys:
-        dpaths = list(xaggRetractedKeys[key].keys())
-        for dpath in dpaths:
-            fn = xaggRetractedKeys[key][dpath]
-            unretract.append([None, None, None, 0, None, dpath])
-            unretractCount += 1
-            if fn is not None:
-                deleteList.append(fn)
+for i in np.where(~esgfRetracted.contains(xaggRetracted.keyid))[0]:
+    dpath = xaggRetracted.paths[i].decode('utf-8')
+    fn = xaggRetracted.xmlFile[i]
+    unretract.append([None, None, None, None, 0, None, dpath])
+    unretractCount += 1
+    if fn is not None:
+        deleteList.append(fn)
 
 # mark paths as not retracted
 print('Un-retract data')
 print(time.ctime())
 print()
-columns = ['xmlFile', 'xmlwritedatetime', 'error', 'ignored', 'ignored_datetime']
-fx.sqlUpdate(xaggDb, 'paths', columns, 'path', unretract)
+columns = ['xmlFile', 'xmlwritedatetime', 'error', 'errorCode', 'ignored', 'ignored_datetime']
+fx.sqlMerge(xaggDb, 'paths', columns, 'path', unretract, quiet=False)
 # remove xmls
 for fn in deleteList:
     if os.path.exists(fn):
@@ -196,4 +181,5 @@ print('Un-ignored ' + str(unretractCount) + ' paths')
 print(time.ctime())
 print()
 
+fx.closeSessions()
 fx.runLock('off')  # remove run lock
@@ -1,8 +1,21 @@
 # file contains standard xagg run information
 
 sqlDB = 'xml.db' # sqlite database path
-cmipMetaFile = 'data/cmipMeta.pkl' # CMIP metadata pickle file
-chunkSize = 1000 # Chunk size (number of directories to scan in a given parallelization)
+chunkSize = 1000 # Number of scan results written to the database at a time
+fullCrawlInterval = 7 # Walk every directory every N runs (other runs do not read directories with unchanged mtimes)
+crawlManifest = True # Record the name, size, and mtime of every netCDF file so only directories with changed files are rescanned
+scanWorkerMaxTasks = 1000 # Number of directories a scan worker processes before it is restarted
+scanWorkerMaxMemory = 4e9 # Memory (bytes) above which a scan worker is restarted
+scanBatchSize = 16 # Number of small directories sent to a scan worker at once (1 to send one directory at a time)
+scanBatchMaxFiles = 4 # Directories with at most this many files (or with an xml that can be copied) are batched
+appendXmls = True # Update the xmls of modified directories that only gained files (instead of rescanning every file)
+scanBackend = 'pool' # 'pool' (persistent workers that import cdms2 once) or 'subprocess' (one cdscan process per directory)
+scanTimeout = 3600 # Seconds before a scan is killed and recorded as an error (None for no limit)
+scanMemoryLimit = 16e9 # Memory (bytes) above which a cdscan subprocess is killed (scanBackend = 'subprocess' and retries)
+scanRetries = 5 # Maximum number of scans of a path that fails with a transient error (e.g., Cannot allocate memory)
+scanRetryBackoff = 6 * 3600 # Seconds before a failed path is scanned again (doubled after each failure)
+scanRetryProcessors = 4 # Number of concurrent retries (each in its own cdscan process, limited to scanMemoryLimit)
+scanMinAvailableMemory = 8e9 # Available system memory (bytes) below which fewer scans are run at once (None to always run numProcessors scans)
 
 # parent directories to scan
 data_directories = ['/p/css03/cmip5_css01/data/cmip5/output1/',
@@ -19,26 +32,13 @@ data_directories = ['/p/css03/cmip5_css01/data/cmip5/output1/',
                     '/p/css03/scratch/unknown-dset/cmip5/',
                     '/p/css03/scratch/unknown-status/cmip5/',
                     '/p/user_pub/xclim/extension/',
-                    '/p/user_pub/work/CMIP6/']
+                    '/p/user_pub/work/CMIP6/',
+                    '/p/css03/esgf_publish/CMIP6/',
+                    '/p/css03/scratch/cmip6/']
 #data_directories = ['/p/css03/scratch/cmip6/DAMIP/'] ; # Test
 
-# parent directories to scan (split these up for parallelization)
-split_directories = ['/p/css03/esgf_publish/CMIP6/',
-                     '/p/css03/scratch/cmip6/',
-                     '/p/css03/esgf_publish/CMIP6/DCPP/',
-                     '/p/css03/esgf_publish/CMIP6/PAMIP/',
-                     '/p/css03/esgf_publish/CMIP6/CMIP/',
-                     '/p/css03/esgf_publish/CMIP6/ScenarioMIP/',
-                     '/p/css03/esgf_publish/CMIP6/DAMIP/']
-#split_directories = [] ; # Test
-
 # directories to ignore
-rm_directories = ['/p/css03/esgf_publish/CMIP6/input4MIPs/',
-                  '/p/css03/esgf_publish/CMIP6/DCPP/',
-                  '/p/css03/esgf_publish/CMIP6/PAMIP/',
-                  '/p/css03/esgf_publish/CMIP6/CMIP/',
-                  '/p/css03/esgf_publish/CMIP6/ScenarioMIP/',
-                  '/p/css03/esgf_publish/CMIP6/DAMIP/']
+rm_directories = ['/p/css03/esgf_publish/CMIP6/input4MIPs/']
 #rm_directories = [] ; # Test
 
 # variables to scan
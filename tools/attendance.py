@@ -39,7 +39,7 @@ for i, row in enumerate(a):
 
 if removeFromDB:
 	ps = '\'' + '\', \''.join(missing) + '\''
-	q = 'UPDATE paths SET xmlFile = NULL, xmlwritedatetime = NULL, error = NULL WHERE xmlFile in (' + ps + ');'
+	q = 'UPDATE paths SET xmlFile = NULL, xmlwritedatetime = NULL, error = NULL, errorCode = NULL, scanAttempts = NULL, nextScan = NULL WHERE xmlFile in (' + ps + ');'
 	conn = sqlite3.connect(sqlDB)
 	c = conn.cursor()
 	c.execute(q) 
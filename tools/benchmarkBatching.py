@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+Script to measure the scan throughput (tasks per second) of fx.ScanPool for
+small directories with and without batching. A sample of paths in the
+database with at most batchMaxFiles netCDF files is scanned (into a
+temporary directory) once with one task sent to a worker at a time and
+once with batches of batchSize tasks. The number of paths that were
+scanned without an error is reported for each run, so that both runs can
+be checked to produce the same xml files.
+
+Usage (from the tools directory):
+    ./benchmarkBatching.py ../xml.db [nPaths] [numProcessors] [batchSize] [batchMaxFiles]
+"""
+
+import sys
+sys.path.insert(0, '..')
+import fx
+import tempfile
+import shutil
+import random
+import glob
+import time
+
+sqlDB = sys.argv[1]
+nPaths = 1000
+numProcessors = 4
+batchSize = 16
+batchMaxFiles = 4
+if len(sys.argv) > 2:
+    nPaths = int(sys.argv[2])
+if len(sys.argv) > 3:
+    numProcessors = int(sys.argv[3])
+if len(sys.argv) > 4:
+    batchSize = int(sys.argv[4])
+if len(sys.argv) > 5:
+    batchMaxFiles = int(sys.argv[5])
+
+if fx.loadCdscan() is None:
+    print('cdms2 is not available, the cdscan script will be called for each xml file')
+    print()
+
+# sample small directories (as counted by the last crawl, or by listing the directory)
+q = '''SELECT p.path, d.nFiles, p.mip_era, p.activity, p.institute, p.model, p.experiment, p.member,
+              p.cmipTable, p.realm, p.frequency, p.variable, p.grid, p.gridLabel, p.version
+       FROM paths p LEFT JOIN directories d ON p.path = d.path
+       WHERE p.retired = 0;'''
+columns = ['nFiles', 'mip_era', 'activity', 'institute', 'model', 'experiment', 'member',
+           'cmipTable', 'realm', 'frequency', 'variable', 'grid', 'gridLabel', 'version']
+rows = fx.getSession(sqlDB).query(q)
+random.shuffle(rows)
+tasks = []
+for row in rows:
+    if len(tasks) >= nPaths:
+        break
+    path = row[0]
+    pathMeta = dict(zip(columns, row[1:]))
+    if pathMeta['nFiles'] is None:
+        pathMeta['nFiles'] = len(glob.glob((path + '/*.nc').replace('//', '/')))
+    if (pathMeta['nFiles'] == 0) or (pathMeta['nFiles'] > batchMaxFiles):
+        continue
+    tasks.append([path, pathMeta])
+if len(tasks) == 0:
+    print('No paths with 1 - ' + str(batchMaxFiles) + ' files')
+    sys.exit(1)
+
+print('Paths           : ' + str(len(tasks)))
+print('Processors      : ' + str(numProcessors))
+print()
+rates = {}
+for size in [1, batchSize]:
+    tmpDir = tempfile.mkdtemp(prefix='benchmarkBatching_')
+    pool = fx.ScanPool(numProcessors, batchSize=size, batchMaxFiles=batchMaxFiles)
+    s = time.time()
+    nScanned = 0
+    for inpath, fn, xmlwritetime, error, scanDuration, errorCode in pool.imap([tmpDir, pathMeta, path] for (path, pathMeta) in tasks):
+        if fn and not error:
+            nScanned += 1
+    elapsed = time.time() - s
+    pool.close()
+    shutil.rmtree(tmpDir)
+    rates[size] = len(tasks) / elapsed
+    print('Batch size ' + str(size).rjust(4) + ': ' + str(round(elapsed, 1)) + 's, '
+          + str(round(rates[size], 1)) + ' tasks/s (' + str(nScanned) + ' scanned without error)')
+
+print()
+print('Speedup         : ' + str(round(rates[batchSize] / rates[1], 2)) + 'x')
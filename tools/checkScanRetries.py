@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+Script to check that paths whose scan worker crashes (or is killed, e.g.,
+by the kernel when the system is out of memory) are scanned again later.
+A temporary database with one path is created, the scan worker of a
+ScanPool is killed, and the path is scanned. The path must be recorded
+with a transient error (see fx.errorCategoryDefaults), one failed scan
+(scanAttempts), and a backoff (nextScan), and it must be in the retry scan
+list once the backoff has passed (see fx.scanListQuery). Once the path is
+scanned successfully, its failed scans and backoff must be cleared (see
+fx.writeScanResults).
+
+Usage (from the tools directory):
+    ./checkScanRetries.py
+"""
+
+import sys
+sys.path.insert(0, '..')
+import fx
+import tempfile
+import shutil
+import signal
+import time
+import os
+
+tmpDir = tempfile.mkdtemp(prefix='checkScanRetries_')
+sqlDB = tmpDir + '/xml.db'
+path = tmpDir + '/CMIP6/CMIP/NCAR/CESM2/historical/r1i1p1f1/Amon/tas/gn/v20190308/'
+os.makedirs(path)
+with open(path + 'tas_Amon_CESM2_historical_r1i1p1f1_gn_185001-201412.nc', 'w') as f:
+    f.write('not a netCDF file')
+fx.initializeDB(sqlDB)
+fx.loadErrorCategories(sqlDB)
+validPath, keyId, mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version = fx.parsePath(path)
+session = fx.getSession(sqlDB)
+with session.transaction():
+    session.execute('''INSERT INTO paths (path, keyid, mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version, created, modified, accessed, retired, ignored)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0, 0, 0, 0);''',
+                    (path, keyId, mip_era, activity, institute, model, experiment, member, cmipTable, realm, frequency, variable, grid, gridLabel, version))
+scanList = list(fx.getScanList(sqlDB, [variable], [experiment], [frequency]))
+
+# kill the scan worker (as the kernel would when the system is out of memory)
+pool = fx.ScanPool(1)
+os.kill(pool.workers[0]['process'].pid, signal.SIGKILL)
+pool.workers[0]['process'].join()
+start = int(time.time())
+fx.streamScans(sqlDB, scanList, pool, tmpDir + '/xmls', nScan=len(scanList), retryBackoff=60)
+pool.close()
+
+error, errorCode, scanAttempts, nextScan = session.query('SELECT error, errorCode, scanAttempts, nextScan FROM paths;')[0]
+transient = fx.errorClassifier.transient(errorCode)
+nRetry = fx.countScanList(sqlDB, [variable], [experiment], [frequency], quiet=True, retry=True)
+with session.transaction():
+    session.execute('UPDATE paths SET nextScan = ?;', (start,))
+nRetryLater = fx.countScanList(sqlDB, [variable], [experiment], [frequency], quiet=True, retry=True)
+
+# a successful scan (the xml file is not read, so any filename will do)
+fx.writeScanResults(sqlDB, [[path, tmpDir + '/xmls/tas.0000000.0.xml', int(time.time()), None, 1., None]])
+scanAttemptsAfter, nextScanAfter = session.query('SELECT scanAttempts, nextScan FROM paths;')[0]
+nRetryAfter = fx.countScanList(sqlDB, [variable], [experiment], [frequency], quiet=True, retry=True)
+fx.closeSessions()
+shutil.rmtree(tmpDir)
+
+checks = [('error is ' + repr(error), error == 'Scan worker exited unexpectedly'),
+          ('error is transient', bool(transient)),
+          ('scanAttempts is ' + str(scanAttempts), scanAttempts == 1),
+          ('nextScan is after the backoff', (nextScan is not None) and (nextScan >= start + 60)),
+          ('not retried before the backoff', nRetry == 0),
+          ('retried after the backoff', nRetryLater == 1),
+          ('scanAttempts and nextScan cleared after a successful scan', (scanAttemptsAfter is None) and (nextScanAfter is None)),
+          ('not retried after a successful scan', nRetryAfter == 0)]
+print()
+for name, passed in checks:
+    print(('ok   ' if passed else 'FAIL ') + name)
+if not all(passed for name, passed in checks):
+    sys.exit(1)
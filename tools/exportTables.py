@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+Script to write a copy of the paths, invalid_paths, stats, and runs tables
+for the MySQL mirror (see migrateDatabase.sh). The database stores
+timestamps as integer epoch seconds (see fx.migrationEpochTimes), but the
+mirror (and the tools that read it) use SQL-like datestrings in DATETIME
+columns. In the copy, the timestamp columns (fx.epochColumns) are DATETIME
+columns with datestrings in the time zone they were written in before the
+epoch migration (local time, except for stats, which are in UTC).
+
+Usage (from the tools directory):
+    ./exportTables.py ../xml.db export.db
+"""
+
+import sys
+sys.path.insert(0, '..')
+import fx
+import sqlite3
+import os
+
+sqlDB = sys.argv[1]
+exportDB = sys.argv[2]
+
+if os.path.exists(exportDB):
+    os.remove(exportDB)
+conn = sqlite3.connect('file:' + sqlDB + '?mode=ro', uri=True)
+conn.execute('ATTACH DATABASE ? AS export;', (exportDB,))
+for table, columns in fx.epochColumns.items():
+    modifier = '' if table == 'stats' else ", 'localtime'"
+    definitions = []
+    selection = []
+    for row in conn.execute('PRAGMA main.table_info(' + table + ');').fetchall():
+        if row[1] in columns:
+            definitions.append(row[1] + ' DATETIME')
+            selection.append('datetime(' + row[1] + ", 'unixepoch'" + modifier + ')')
+        else:
+            definitions.append(row[1] + ' ' + row[2])
+            selection.append(row[1])
+    conn.execute('CREATE TABLE export.' + table + ' (' + ', '.join(definitions) + ');')
+    conn.execute('INSERT INTO export.' + table + ' SELECT ' + ', '.join(selection) + ' FROM main.' + table + ';')
+conn.commit()
+conn.close()
@@ -5,8 +5,12 @@
 source config
 
 echo "Export sqlite3 database"
-sqlite3 ../xml.db .dump | python sqlite3-to-mysql.py > mysql.sql
-sed -i '1d' mysql.sql
+# copy the tables with timestamps as datestrings (see exportTables.py)
+python exportTables.py ../xml.db export.db
+for table in paths invalid_paths runs stats; do
+    sqlite3 export.db ".dump $table"
+done | grep -v '^PRAGMA' | python sqlite3-to-mysql.py > mysql.sql
+rm export.db
 sed -i '1 s/^/DROP TABLE IF EXISTS paths; DROP TABLE IF EXISTS invalid_paths;  DROP TABLE IF EXISTS runs; DROP TABLE IF EXISTS stats;\n/' mysql.sql
 sed -i '1 s/^/SET autocommit=0;\n/' mysql.sql
 echo 'COMMIT;' >> mysql.sql
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+Script to check schema migrations against a copy of a production database.
+The database is copied, rolled back to schema version 1 (if needed), and
+the query plans and timings for the hot queries (scan list, writeStats,
+and retract.py) are printed before and after running fx.migrateDB.
+
+Usage (from the tools directory):
+    ./queryPlans.py ../xml.db
+"""
+
+import sys
+sys.path.insert(0, '..')
+import fx
+import runSettings
+import sqlite3
+import tempfile
+import shutil
+import time
+import os
+
+sqlDB = sys.argv[1]
+
+# queries to check
+q, params = fx.scanListQuery(runSettings.variables, runSettings.experiments, runSettings.frequencies)
+queries = {'scan list' : ('SELECT count(DISTINCT p.keyid) ' + q + ';', params),
+           'stats: cmip6 directories' : ("select count(*) as n from paths where mip_era = 'CMIP6' and retired=0;", []),
+           'stats: cmip6 xml files' : ("select count(*) as n from paths where mip_era = 'CMIP6' and xmlFile is NOT NULL and xmlFile != 'None' and retired=0;", []),
+           'stats: retracted' : ("select count(*) as n from paths where error = 'retracted';", []),
+           'retract: active keys' : ('select keyid, path, xmlfile from paths where retired = 0 and ignored = 0;', []),
+           'retract: retracted keys' : ('select keyid, path, xmlfile from paths where ignored = 1 and error = "retracted";', [])}
+
+def report(dbFile):
+    conn = sqlite3.connect(dbFile)
+    c = conn.cursor()
+    for name, (query, p) in queries.items():
+        c.execute('EXPLAIN QUERY PLAN ' + query, p)
+        plan = [row[-1] for row in c.fetchall()]
+        s = time.time()
+        c.execute(query, p)
+        c.fetchall()
+        e = time.time()
+        print(name + ': ' + str(round(e - s, 3)) + 's')
+        for line in plan:
+            print('    ' + line)
+    conn.close()
+    print()
+
+# copy database
+tmpDir = tempfile.mkdtemp(prefix='queryPlans_')
+dbCopy = tmpDir + '/' + os.path.basename(sqlDB)
+shutil.copy(sqlDB, dbCopy)
+
+# roll the copy back to schema version 1
+conn = sqlite3.connect(dbCopy)
+c = conn.cursor()
+c.execute('PRAGMA user_version;')
+if c.fetchone()[0] >= 2:
+    for index in ['keyIdIndex', 'scanIndex', 'xmlFileIndex', 'errorIndex']:
+        c.execute('DROP INDEX IF EXISTS ' + index + ';')
+    c.execute('PRAGMA user_version = 1;')
+    conn.commit()
+conn.close()
+
+print('Before migration')
+print()
+report(dbCopy)
+
+s = time.time()
+fx.migrateDB(dbCopy)
+e = time.time()
+print('Migration time: ' + str(round(e - s, 1)) + 's')
+print()
+
+print('After migration')
+print()
+report(dbCopy)
+
+shutil.rmtree(tmpDir)
@@ -18,5 +18,9 @@ mkdir cmip5
 mv cmip5-cmor-tables/Tables/* cmip5
 rm -rf cmip5-cmor-tables
 
+# compile table index (see fx.compileCMIPTables)
+cd ..
+python -c "import fx; fx.compileCMIPTables()"
+
 # move back to script directory
-cd ../tools
\ No newline at end of file
+cd tools
\ No newline at end of file
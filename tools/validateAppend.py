@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+Script to validate append-mode xml updates (see fx.appendXml) against full
+rescans. For a sample of paths in the database with at least nNew + 1
+netCDF files, an xml file is written for all but the last nNew files, the
+last nNew files are appended (fx.appendXml), and the result is compared
+with an xml file written from all of the files. The datasets, axes (values
+are compared numerically), variables, and file maps must match.
+
+Usage (from the tools directory):
+    ./validateAppend.py ../xml.db [nPaths] [nNew]
+"""
+
+import sys
+sys.path.insert(0, '..')
+import fx
+import numpy as np
+import xml.etree.ElementTree as ElementTree
+import tempfile
+import shutil
+import random
+import glob
+import time
+import os
+
+sqlDB = sys.argv[1]
+nPaths = 100
+nNew = 1
+if len(sys.argv) > 2:
+    nPaths = int(sys.argv[2])
+if len(sys.argv) > 3:
+    nNew = int(sys.argv[3])
+
+def canonical(fn):
+    # xml elements keyed by tag and id (axis values are returned separately)
+    root = ElementTree.parse(fn).getroot()
+    attrs = dict(root.attrib)
+    attrs['cdms_filemap'] = fx.parseFilemap(attrs.get('cdms_filemap', '[]'))
+    elements = {'dataset' : sorted(attrs.items())}
+    values = {}
+    for child in root:
+        key = child.tag + ' ' + str(child.get('id'))
+        if child.tag == 'axis':
+            attrib = dict(child.attrib)
+            if 'partition' in attrib:
+                attrib['partition'] = [int(p) for p in attrib['partition'].strip('[]').split()]
+            elements[key] = (sorted(attrib.items()), [fx.elementSignature(c) for c in child if c.tag != 'linear'])
+            values[key] = np.array([float(v) for v in fx.getAxisValues(child)])
+        else:
+            elements[key] = fx.elementSignature(child)
+    return elements, values
+
+def compare(fullFile, appendedFile):
+    # list the elements that differ between two xml files
+    fullElements, fullValues = canonical(fullFile)
+    appendedElements, appendedValues = canonical(appendedFile)
+    differences = []
+    for key in sorted(set(fullElements) | set(appendedElements)):
+        if fullElements.get(key) != appendedElements.get(key):
+            differences.append(key)
+    for key in sorted(set(fullValues) & set(appendedValues)):
+        if (len(fullValues[key]) != len(appendedValues[key])) or (not np.allclose(fullValues[key], appendedValues[key])):
+            differences.append(key + ' values')
+    return differences
+
+if fx.loadCdscan() is None:
+    print('cdms2 is not available, the cdscan script will be called for each xml file')
+    print()
+
+rows = fx.getSession(sqlDB).query('SELECT path FROM paths WHERE xmlFile IS NOT NULL AND retired = 0;')
+random.shuffle(rows)
+tmpDir = tempfile.mkdtemp(prefix='validateAppend_')
+fullFile = tmpDir + '/full.xml'
+appendedFile = tmpDir + '/appended.xml'
+counts = {'identical' : 0, 'different' : 0, 'not appended' : 0}
+fullTime = 0.
+appendTime = 0.
+n = 0
+for (path,) in rows:
+    if n >= nPaths:
+        break
+    files = sorted(glob.glob((path + '/*.nc').replace('//', '/')))
+    if len(files) < nNew + 1:
+        continue
+    for fn in [fullFile, appendedFile]:
+        if os.path.exists(fn):
+            os.remove(fn)
+    s = time.time()
+    fx.xmlWrite(path, fullFile)
+    e = time.time()
+    fx.xmlWrite(path, appendedFile + '.prev', files=files[:-nNew])
+    if (not os.path.exists(fullFile)) or (not os.path.exists(appendedFile + '.prev')):
+        continue
+    n += 1
+    fullTime += e - s
+    s = time.time()
+    appended = fx.appendXml(path, appendedFile)
+    appendTime += time.time() - s
+    if not appended:
+        counts['not appended'] += 1
+        print('Not appended: ' + path)
+        continue
+    differences = compare(fullFile, appendedFile)
+    if len(differences) > 0:
+        counts['different'] += 1
+        print('Different: ' + path)
+        print('    ' + ', '.join(differences))
+    else:
+        counts['identical'] += 1
+shutil.rmtree(tmpDir)
+
+print()
+print('Paths checked   : ' + str(n))
+for key, value in counts.items():
+    print('   ' + key.ljust(13) + ': ' + str(value))
+print('Full scan time  : ' + str(round(fullTime, 1)) + 's')
+print('Append time     : ' + str(round(appendTime, 1)) + 's')
@@ -12,19 +12,19 @@ This is a wrapper for runing xagg software. It makes use of:
 There are a number of command line options. These can be viewed using:
     ./xagg.py --help
 
-The environment was created / implemented using:
+The environment was created / implemented using (see README.md):
 
-    conda create -n cdat81 -c cdat/label/v81 -c conda-forge cdat scandir joblib
-    conda activate cdat81
+    conda create -y -n xagg -c conda-forge -c cdat/label/v8.2.1 "libnetcdf=*=mpi_openmpi_*" "mesalib=18.3.1" "python=3.7" cdat cdms2 scandir scipy
+    conda activate xagg
 
 @author: pochedls
 """
 
 import fx
 import time
+import datetime
 import os
 from runSettings import *
-import numpy as np
 import argparse
 try:
     __IPYTHON__
@@ -130,78 +130,84 @@ if not os.path.exists(sqlDB):
     print()
     fx.initializeDB(sqlDB)
 
+# ensure database schema is up to date
+fx.migrateDB(sqlDB)
+fx.loadErrorCategories(sqlDB)
+
 # get all paths
 if updatePaths:
     print('Checking disk paths')
     print(time.ctime())
     print()
-    diskStat = fx.parallelFindData(data_directories, split=split_directories,
-                                   rmDir=rm_directories)
-    diskPaths = diskStat.keys()
+    fullCrawl = fx.checkFullCrawl(sqlDB, fullCrawlInterval)
+    fx.parallelFindData(sqlDB, data_directories, rmDir=rm_directories,
+                        fullCrawl=fullCrawl, manifest=crawlManifest)
 
-# ensure there is a cmip metadata file
-if not os.path.exists(cmipMetaFile):
-    print('Initializing CMIP Meta File')
+# ensure the CMIP table index is up to date
+if not fx.checkCMIPTableIndex():
+    print('Updating CMIP table index')
     print(time.ctime())
     print()
-    fx.createLookupDictionary(diskPaths, outfile=cmipMetaFile)
-
-# get paths in database
-print()
-print('Get existing xml metadata')
-print(time.ctime())
-print()
-db = fx.getDBPaths(sqlDB)
-dbPaths = db.keys()
-invalidPaths = fx.getInvalidDBPaths(sqlDB)
-retiredPaths = fx.getRetiredDBPaths(sqlDB)
+    fx.compileCMIPTables()
 
 # compare paths on disk to those in database
 if updatePaths:
     print('Comparing disk paths with database')
     print(time.ctime())
     print()
-    fx.updateDatabaseHoldings(sqlDB, diskPaths, diskStat, dbPaths, db,
-                              invalidPaths, retiredPaths)
-    del diskStat, diskPaths
-
-del db, invalidPaths, retiredPaths, dbPaths
+    fx.updateDatabaseHoldings(sqlDB, appendXmls=appendXmls)
 
 # get paths to scan
 if updateScans:
     print('Getting paths to scan')
     print(time.ctime())
     print()
-    db = fx.getDBPaths(sqlDB)  # get updated database
-    scanList = fx.getScanList(sqlDB, db, variables, experiments, frequencies)
-    del db
+    nScan = fx.countScanList(sqlDB, variables, experiments, frequencies)
+    scanList = fx.getScanList(sqlDB, variables, experiments, frequencies)
+    costModel = fx.fitScanCostModel(sqlDB)
+    scanList, costs = fx.orderScanList(scanList, costModel)
+    print('Estimated scan work: ' + str(datetime.timedelta(seconds=int(sum(costs)))) + ' (' + str(numProcessors) + ' processors: ' + str(datetime.timedelta(seconds=int(sum(costs) / numProcessors))) + ')')
+    print()
 
     print('Start scans')
     print(time.ctime())
     print()
 
-    nChunks = int(np.ceil(len(scanList)/chunkSize))
-    nTotal = 0
-    for i in range(nChunks):
-        # get a chunk of the scanList
-        Idx = np.arange(i * chunkSize, i*chunkSize + chunkSize)
-        if Idx[-1] > len(scanList):
-            Idx = np.arange(i * chunkSize, len(scanList))
-        inList = [scanList[i] for i in Idx]
-        nTotal += len(inList)
-        print(time.ctime() + ': ' + str(nTotal) + '/' + str(len(scanList)) +
-              ' (' + str(np.round(nTotal/len(scanList)*100, 1)) + '%) ',
-              end='')
-        # scan chunk
-        s = time.time()
-        results = fx.scanChunk(inList, numProcessors, outputDirectory)
-        e = time.time()
-        print('- ' + str(int(e-s)) + 's ', end='')
-        # write results to database
-        s = time.time()
-        fx.writeScanResults(sqlDB, results)
-        e = time.time()
-        print('- ' + str(int(e-s)) + 's ')
+    governor = None
+    if scanMinAvailableMemory:
+        governor = fx.MemoryGovernor(numProcessors, minAvailable=scanMinAvailableMemory)
+    if scanBackend == 'subprocess':
+        pool = fx.ScanSupervisor(numProcessors, timeout=scanTimeout,
+                                 maxMemory=scanMemoryLimit, governor=governor)
+    else:
+        pool = fx.ScanPool(numProcessors, maxTasks=scanWorkerMaxTasks,
+                           maxMemory=scanWorkerMaxMemory, timeout=scanTimeout,
+                           governor=governor, batchSize=scanBatchSize,
+                           batchMaxFiles=scanBatchMaxFiles)
+    fx.streamScans(sqlDB, scanList, pool, outputDirectory, nScan=nScan,
+                   costs=costs, batchSize=chunkSize, retryBackoff=scanRetryBackoff)
+    pool.close()
+
+    # retry paths that failed with transient errors (in separate cdscan
+    # processes with a memory limit, with fewer scans at a time)
+    nRetry = fx.countScanList(sqlDB, variables, experiments, frequencies,
+                              retry=True, maxAttempts=scanRetries)
+    if nRetry > 0:
+        print('Retry failed scans')
+        print(time.ctime())
+        print()
+        retryList = fx.getScanList(sqlDB, variables, experiments, frequencies,
+                                   retry=True, maxAttempts=scanRetries)
+        governor = None
+        if scanMinAvailableMemory:
+            governor = fx.MemoryGovernor(min(scanRetryProcessors, numProcessors),
+                                         minAvailable=scanMinAvailableMemory)
+        pool = fx.ScanSupervisor(min(scanRetryProcessors, numProcessors),
+                                 timeout=scanTimeout, maxMemory=scanMemoryLimit,
+                                 governor=governor)
+        fx.streamScans(sqlDB, retryList, pool, outputDirectory, nScan=nRetry,
+                       batchSize=chunkSize, retryBackoff=scanRetryBackoff)
+        pool.close()
 
 if countStats:
     print()
@@ -210,6 +216,7 @@ if countStats:
     print()
     fx.writeStats(sqlDB)
 
+fx.closeSessions()
 fx.runLock('off')  # remove run lock
 
 print('Finished run')